@@ -0,0 +1,240 @@
+"""
+edge_benchmark.py
+Benchmarks the edge agent's hot paths as the local database grows and the reading rate rises.
+
+Run from the repository root:
+    python -m benchmarks.edge_benchmark --table-sizes 0 10000 100000 --rate 50 --out bench.json
+
+For each table size, a fresh SQLite file is pre-filled with that many rows, and then:
+- save_data: synthetic SensorManager readings are saved at the target rate.
+- save_batch: the same readings are saved as ReadingBatches of BATCH_READINGS with one
+  executemany each.
+- fetch_unsent_data / fetch_unsent_page: one full unsent scan and one keyset page.
+- analyze_recent_trends / TrendWindow: the SQLite trend query and the in-memory engine.
+- send_data_http: readings are posted to a local MockBackend with injected latency and
+  failures.
+- alert_fast_lane: alerts are raised through the AlertChannel while the backlog drainer
+  works through the unsent rows, and their end-to-end latency is reported.
+
+Every benchmark reports throughput, p50/p99/max latency in milliseconds, the process's
+peak RSS, and how much the SQLite files (database plus WAL) grew. The results are written
+as one JSON document so runs from different releases can be diffed.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from benchmarks.mock_backend import MockBackend
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_collection.sensor_manager import SensorManager
+from src.data_processing.data_analyzer import analyze_recent_trends
+from src.data_processing.data_converter import convert_to_backend_format
+from src.data_processing.database_manager import DatabaseManager, INSERT_SENSOR_DATA_SQL
+from src.data_processing.trend_window import TrendWindow
+from src.data_transmission.alert_channel import AlertChannel
+from src.data_transmission.transmitter import Transmitter
+from src.utils.timestamps import utc_now_epoch_ms, epoch_ms_to_iso
+
+DEVICE_ID = "BENCH-DEVICE"
+PATIENT_ID = "bench-patient"
+BATCH_READINGS = 50  # Readings per ReadingBatch in the save_batch benchmark
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies_ms, elapsed_seconds):
+    """Turn raw per-operation latencies into the reported figures."""
+    ordered = sorted(latencies_ms)
+    return {
+        "operations": len(ordered),
+        "throughput_per_s": round(len(ordered) / elapsed_seconds, 2) if elapsed_seconds > 0 else 0.0,
+        "mean_ms": round(statistics.fmean(ordered), 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50), 4),
+        "p99_ms": round(percentile(ordered, 0.99), 4),
+        "max_ms": round(ordered[-1], 4) if ordered else 0.0
+    }
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB (Linux reports ru_maxrss in KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def sqlite_bytes(db_path):
+    """Size of the database file plus its WAL."""
+    return sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+
+def timed(operation, count, rate_hz=None):
+    """
+    Call operation(i) count times, paced at rate_hz when given, and time each call.
+
+    Pacing uses fixed deadlines so a slow call does not shift later ones. If the operation
+    cannot keep up, it simply runs back-to-back and the throughput shows the shortfall.
+    """
+    latencies = []
+    period = 1.0 / rate_hz if rate_hz else 0.0
+    start = time.perf_counter()
+    for i in range(count):
+        if period:
+            delay = start + i * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        began = time.perf_counter()
+        operation(i)
+        latencies.append((time.perf_counter() - began) * 1000)
+    return summarize(latencies, time.perf_counter() - start)
+
+def prefill(db_manager, rows, unsent_fraction, interval_ms=1000):
+    """Insert rows of synthetic history, one per interval_ms, ending now."""
+    sensor_manager = SensorManager(use_synthetic=True)
+    now = utc_now_epoch_ms()
+    unsent_every = max(1, round(1 / unsent_fraction)) if unsent_fraction > 0 else 0
+    batch = []
+    for i in range(rows):
+        reading = sensor_manager.generate_synthetic_data()
+        ts = now - (rows - i) * interval_ms
+        status = "unsent" if unsent_every and i % unsent_every == 0 else "sent"
+        batch.append((
+            DEVICE_ID, PATIENT_ID, epoch_ms_to_iso(ts), ts, reading["heart_rate"], reading["temperature"],
+            reading["oxygen_level"], None, None, None, None, "active", status
+        ))
+        if len(batch) >= 5000:
+            db_manager.conn.executemany(INSERT_SENSOR_DATA_SQL, batch)
+            batch = []
+    if batch:
+        db_manager.conn.executemany(INSERT_SENSOR_DATA_SQL, batch)
+    db_manager.flush()
+
+def bench_table_size(table_size, args, backend):
+    """Run every benchmark against a database pre-filled with table_size rows."""
+    workdir = tempfile.mkdtemp(prefix="vitaledge-bench-")
+    db_path = os.path.join(workdir, "sensor_data.db")
+    db_manager = DatabaseManager(db_path=db_path)
+    prefill(db_manager, table_size, args.unsent_fraction)
+    sensor_manager = SensorManager(use_synthetic=True)
+    results = {}
+
+    size_before = sqlite_bytes(db_path)
+    results["save_data"] = timed(
+        lambda i: db_manager.save_data(DEVICE_ID, PATIENT_ID, sensor_manager.generate_synthetic_data()),
+        args.readings, args.rate
+    )
+    db_manager.flush()
+    results["save_data"]["sqlite_growth_bytes"] = sqlite_bytes(db_path) - size_before
+
+    def save_batch(i):
+        batch = ReadingBatch(sensor_manager.generate_synthetic_data() for _ in range(BATCH_READINGS))
+        db_manager.save_batch(DEVICE_ID, PATIENT_ID, batch)
+    results["save_batch"] = timed(save_batch, max(1, args.readings // BATCH_READINGS))
+    db_manager.flush()
+    results["save_batch"]["readings_per_s"] = round(results["save_batch"]["throughput_per_s"] * BATCH_READINGS, 2)
+
+    results["fetch_unsent_data"] = timed(lambda i: db_manager.fetch_unsent_data(), args.queries)
+    results["fetch_unsent_page"] = timed(lambda i: db_manager.fetch_unsent_page(limit=100), args.queries)
+    results["analyze_recent_trends"] = timed(
+        lambda i: analyze_recent_trends(db_path, patient_id=PATIENT_ID), args.queries
+    )
+
+    trend_window = TrendWindow()
+    trend_window.rebuild_from_db(db_manager, PATIENT_ID)
+
+    def push_and_analyze(i):
+        trend_window.push(PATIENT_ID, sensor_manager.generate_synthetic_data())
+        trend_window.analyze(PATIENT_ID)
+    results["trend_window"] = timed(push_and_analyze, args.readings)
+
+    transmitter = Transmitter(backend_url=backend.url, auth_endpoint=f"{backend.url}/authenticate",
+                              db_manager=db_manager, token_cache_path=None)
+    before = backend.snapshot()
+
+    def send(i):
+        reading = sensor_manager.generate_synthetic_data()
+        record_id = db_manager.save_data(DEVICE_ID, PATIENT_ID, reading)
+        transmitter.send_data_http(convert_to_backend_format(reading, DEVICE_ID, PATIENT_ID, record_id), PATIENT_ID, record_id)
+    results["send_data_http"] = timed(send, args.sends, args.rate)
+    after = backend.snapshot()
+    results["send_data_http"]["backend"] = {key: after[key] - before[key] for key in after}
+
+    results["alert_fast_lane"] = bench_alert_lane(args, transmitter, db_manager, sensor_manager)
+
+    transmitter.session.close()
+    db_manager.close()
+    results["sqlite_file_bytes"] = sqlite_bytes(db_path)
+    results["peak_rss_kb"] = peak_rss_kb()
+    return results
+
+def bench_alert_lane(args, transmitter, db_manager, sensor_manager):
+    """Raise alerts while the backlog drains on another thread and report their latency."""
+    channel = AlertChannel(transmitter, db_manager, device_id=DEVICE_ID)
+    channel.start()
+    draining = threading.Event()
+    draining.set()
+
+    def drain():
+        while draining.is_set():
+            if not transmitter.retry_unsent_data():
+                time.sleep(0.01)
+    drainer = threading.Thread(target=drain, name="bench-drain", daemon=True)
+    drainer.start()
+
+    for _ in range(args.alerts):
+        channel.raise_alert(PATIENT_ID, "High heart rate alert", {**sensor_manager.generate_synthetic_data().as_dict(), "heart_rate": 150})
+        time.sleep(0.05)
+    deadline = time.monotonic() + 10
+    while channel.queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    draining.clear()
+    drainer.join()
+    channel.stop()
+    return channel.metrics()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the VitalEdge edge pipeline.")
+    parser.add_argument("--table-sizes", type=int, nargs="+", default=[0, 10000, 100000],
+                        help="Rows pre-filled in sensor_data before each run.")
+    parser.add_argument("--unsent-fraction", type=float, default=0.1,
+                        help="Fraction of pre-filled rows left 'unsent'.")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Target readings per second for paced benchmarks; default is unpaced.")
+    parser.add_argument("--readings", type=int, default=2000, help="Readings per save/trend benchmark.")
+    parser.add_argument("--queries", type=int, default=20, help="Calls per query benchmark.")
+    parser.add_argument("--sends", type=int, default=200, help="Uploads per transmit benchmark.")
+    parser.add_argument("--alerts", type=int, default=20, help="Alerts raised during the fast-lane benchmark.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Mock backend response delay.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of uploads failed with 503.")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    backend = MockBackend(latency_ms=args.latency_ms, failure_rate=args.failure_rate).start()
+    try:
+        runs = {str(size): bench_table_size(size, args, backend) for size in args.table_sizes}
+    finally:
+        backend.stop()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+        "parameters": vars(args),
+        "runs": runs
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+mock_backend.py
+Local stand-in for the VitalEdge backend, used by the benchmarks.
+
+Serves the endpoints the Pi talks to:
+- POST /authenticate: returns a JWT-like token as plain text.
+- POST /api/patients/{patient_id}/device-data: accepts one record.
+- POST /api/patients/{patient_id}/device-data/batch: accepts a list and returns one
+  result per item.
+- POST /api/patients/{patient_id}/alerts: accepts one alert from the alert fast lane.
+
+Request bodies are decoded with payload_codec, so every upload encoding can be exercised.
+Each request can be delayed (latency_ms) or failed with a 503 (failure_rate) to simulate a
+slow or flaky link. Counters for requests (bulk uploads also under "batch_requests"), records
+and body bytes are kept for reports.
+Records are deduplicated on their idempotency key, as the real backend does; records seen
+before are acknowledged again but counted under "duplicates" instead of "records".
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.data_transmission.payload_codec import decode_payload
+
+DEVICE_DATA_PATH = re.compile(r"^/api/patients/[^/]+/(device-data(/batch)?|alerts)$")
+
+class MockBackend:
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, failure_rate=0.0, token="bench-token"):
+        """
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free port.
+            latency_ms (float): Delay added before every response.
+            failure_rate (float): Fraction of device-data requests answered with 503.
+            token (str): Token issued by /authenticate and required on uploads.
+        """
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.token = token
+        self._lock = threading.Lock()
+        self.counters = {"auth_requests": 0, "requests": 0, "batch_requests": 0, "records": 0, "duplicates": 0,
+                         "alerts": 0, "failures": 0, "body_bytes": 0}
+        self._seen_keys = set()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-backend", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+    def _accept_records(self, records, header_key=None):
+        """Count records by idempotency key. Returns (new, duplicate) counts."""
+        fresh = duplicates = 0
+        with self._lock:
+            for record in records:
+                key = record.get("idempotencyKey", header_key) if isinstance(record, dict) else None
+                if key is not None and key in self._seen_keys:
+                    duplicates += 1
+                    continue
+                if key is not None:
+                    self._seen_keys.add(key)
+                fresh += 1
+        return fresh, duplicates
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _handler_class(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real backend
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if backend.latency_ms:
+                    time.sleep(backend.latency_ms / 1000)
+
+                if self.path == "/authenticate":
+                    backend._count(auth_requests=1)
+                    return self._reply(200, backend.token, "text/plain")
+
+                match = DEVICE_DATA_PATH.match(self.path)
+                if not match:
+                    return self._reply(404, "Not found", "text/plain")
+                if self.headers.get("Authorization") != f"Bearer {backend.token}":
+                    return self._reply(401, "Unauthorized", "text/plain")
+                if random.random() < backend.failure_rate:
+                    backend._count(requests=1, failures=1, body_bytes=len(body))
+                    return self._reply(503, "Unavailable", "text/plain")
+
+                try:
+                    payload = decode_payload(body, dict(self.headers))
+                except (ValueError, OSError):
+                    return self._reply(415, "Unsupported Media Type", "text/plain")
+
+                if match.group(2):
+                    fresh, duplicates = backend._accept_records(payload)
+                    backend._count(requests=1, batch_requests=1, records=fresh, duplicates=duplicates,
+                                   body_bytes=len(body))
+                    return self._reply(200, json.dumps({"results": [{"status": 201}] * len(payload)}))
+                if match.group(1) == "alerts":
+                    backend._count(requests=1, alerts=1, body_bytes=len(body))
+                else:
+                    fresh, duplicates = backend._accept_records([payload], self.headers.get("Idempotency-Key"))
+                    backend._count(requests=1, records=fresh, duplicates=duplicates, body_bytes=len(body))
+                return self._reply(201, json.dumps(payload))
+
+            def _reply(self, status, text, content_type="application/json"):
+                data = text.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,176 @@
+"""
+mock_broker.py
+Minimal in-process MQTT 3.1.1 broker for exercising MqttTransport without a real broker.
+
+Supports what the edge agent and a test subscriber need: CONNECT/CONNACK, PUBLISH at QoS 0
+and 1 with PUBACK, SUBSCRIBE/SUBACK with '+' and '#' wildcards, PINGREQ/PINGRESP and
+DISCONNECT. Every published message is kept in `messages` as (topic, payload, qos), and a
+PUBACK can be delayed (puback_delay_ms) or withheld (drop_pubacks) to exercise in-flight
+windowing and redelivery. Sessions are not persisted across broker restarts.
+"""
+import socketserver
+import struct
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK, PINGREQ, PINGRESP, DISCONNECT = 1, 2, 3, 4, 8, 9, 12, 13, 14
+
+def topic_matches(pattern, topic):
+    """Match a topic against a subscription filter with MQTT wildcards."""
+    pattern_levels, topic_levels = pattern.split("/"), topic.split("/")
+    for index, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or (level != "+" and level != topic_levels[index]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+def encode_packet(packet_type, flags, body):
+    """Frame a packet: fixed header byte, variable-length remaining length, body."""
+    length, encoded = len(body), bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            break
+    return bytes([(packet_type << 4) | flags]) + bytes(encoded) + body
+
+class MockBroker:
+    def __init__(self, host="127.0.0.1", port=0, puback_delay_ms=0.0, drop_pubacks=False):
+        """
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free port.
+            puback_delay_ms (float): Delay before each PUBACK is sent.
+            drop_pubacks (bool): Never acknowledge QoS 1 messages.
+        """
+        self.puback_delay_ms = puback_delay_ms
+        self.drop_pubacks = drop_pubacks
+        self.messages = []
+        self.client_ids = []
+        self._lock = threading.Lock()
+        self._subscribers = []  # (filter, handler)
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-broker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _route(self, topic, payload, qos):
+        with self._lock:
+            self.messages.append((topic, payload, qos))
+            subscribers = [handler for pattern, handler in self._subscribers if topic_matches(pattern, topic)]
+        for handler in subscribers:
+            handler.deliver(topic, payload)
+
+    def _handler_class(self):
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def setup(self):
+                self.write_lock = threading.Lock()
+
+            def handle(self):
+                while True:
+                    header = self._read(1)
+                    if not header:
+                        return
+                    packet_type, flags = header[0] >> 4, header[0] & 0x0F
+                    body = self._read(self._read_length())
+                    if body is None:
+                        return
+                    if packet_type == CONNECT:
+                        self._on_connect(body)
+                    elif packet_type == PUBLISH:
+                        self._on_publish(flags, body)
+                    elif packet_type == SUBSCRIBE:
+                        self._on_subscribe(body)
+                    elif packet_type == PINGREQ:
+                        self._send(encode_packet(PINGRESP, 0, b""))
+                    elif packet_type == DISCONNECT:
+                        return
+
+            def finish(self):
+                with broker._lock:
+                    broker._subscribers = [(p, h) for p, h in broker._subscribers if h is not self]
+
+            def _read(self, count):
+                data = b""
+                while len(data) < count:
+                    chunk = self.request.recv(count - len(data))
+                    if not chunk:
+                        return None
+                    data += chunk
+                return data
+
+            def _read_length(self):
+                multiplier, length = 1, 0
+                while True:
+                    byte = self._read(1)
+                    if not byte:
+                        return 0
+                    length += (byte[0] & 0x7F) * multiplier
+                    if not byte[0] & 0x80:
+                        return length
+                    multiplier *= 128
+
+            def _send(self, packet):
+                with self.write_lock:
+                    self.request.sendall(packet)
+
+            def _on_connect(self, body):
+                name_length = struct.unpack("!H", body[0:2])[0]
+                offset = 2 + name_length + 4  # protocol name, level, flags, keep-alive
+                client_id_length = struct.unpack("!H", body[offset:offset + 2])[0]
+                broker.client_ids.append(body[offset + 2:offset + 2 + client_id_length].decode())
+                self._send(encode_packet(CONNACK, 0, b"\x00\x00"))
+
+            def _on_publish(self, flags, body):
+                qos = (flags >> 1) & 0x03
+                topic_length = struct.unpack("!H", body[0:2])[0]
+                topic = body[2:2 + topic_length].decode()
+                offset = 2 + topic_length
+                mid = None
+                if qos:
+                    mid = struct.unpack("!H", body[offset:offset + 2])[0]
+                    offset += 2
+                broker._route(topic, body[offset:], qos)
+                if qos and not broker.drop_pubacks:
+                    if broker.puback_delay_ms:
+                        time.sleep(broker.puback_delay_ms / 1000)
+                    self._send(encode_packet(PUBACK, 0, struct.pack("!H", mid)))
+
+            def _on_subscribe(self, body):
+                mid = body[0:2]
+                offset, granted = 2, bytearray()
+                while offset < len(body):
+                    length = struct.unpack("!H", body[offset:offset + 2])[0]
+                    pattern = body[offset + 2:offset + 2 + length].decode()
+                    offset += 2 + length + 1
+                    with broker._lock:
+                        broker._subscribers.append((pattern, self))
+                    granted.append(0)
+                self._send(encode_packet(SUBACK, 0, mid + bytes(granted)))
+
+            def deliver(self, topic, payload):
+                encoded_topic = topic.encode()
+                body = struct.pack("!H", len(encoded_topic)) + encoded_topic + payload
+                try:
+                    self._send(encode_packet(PUBLISH, 0, body))
+                except OSError:
+                    pass
+
+        return Handler
@@ -0,0 +1,263 @@
+"""
+replay_benchmark.py
+Replays a recorded sensor stream through the full agent to measure end-to-end throughput.
+
+Run from the repository root:
+    python -m benchmarks.replay_benchmark --recording sensor_data.db --speeds 0 10 --out replay.json
+    python -m benchmarks.replay_benchmark --patients 20 --minutes 30 --find-max-speed
+
+Recording:
+--recording takes a sensor_data database written by the agent, or a CSV written by
+`python -m src.data_processing.history_export --format csv`. Without one, a synthetic
+recording of --patients patients at 1 Hz over --minutes is written first, from a fixed
+seed, so runs are repeatable.
+
+Replay:
+Each run stores into a fresh SQLite file and sends to its own local MockBackend. Readings go
+through the same process_batch the live loop uses (--runtime loop) or through the
+EdgePipeline (--runtime pipeline). A ReplayHub paces the recording at each of --speeds, with
+0 meaning unthrottled, and the trend window runs on the replay's virtual clock. Retention
+does not run. After the last tick the backlog is drained, so every run ends with the whole
+recording stored and accepted by the backend.
+
+Maximum sustainable rate:
+The unthrottled run shows the fastest the agent gets through the recording. With
+--find-max-speed, paced runs then bisect below that speed for the highest one the agent
+keeps up with. A run keeps up when no tick is collected more than --lag-tolerance-ms late
+and processing ends within that tolerance of the recording's paced duration. The result is
+reported as a speed and in readings per second.
+
+Each run reports the replay's readings, speedup and tick lag, the processing and drain
+times, alert and report filter counts, the backend's counters, and the process's peak RSS.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from benchmarks.edge_benchmark import peak_rss_kb, sqlite_bytes
+from benchmarks.mock_backend import MockBackend
+from main import process_batch
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_collection.replay_source import ReplayClock, ReplayHub, open_recording
+from src.data_collection.sensor_manager import SensorManager
+from src.data_processing.alert_rules import AlertRuleEngine
+from src.data_processing.database_manager import DatabaseManager
+from src.data_processing.history_query import parse_time_ms
+from src.data_processing.report_filter import ReportFilter
+from src.data_processing.trend_window import TrendWindow
+from src.data_transmission.alert_channel import AlertChannel
+from src.data_transmission.transmitter import Transmitter
+from src.utils.config import TRANSMIT_MODE, REPLAY_TICK_MS
+
+RECORDING_START_MS = 1_700_000_000_000  # Fixed start of synthetic recordings, so reruns match
+DRAIN_TIMEOUT_SECONDS = 120  # Longest wait for the backlog to empty after a run
+
+def record_synthetic(db_path, patients, minutes, seed, interval_ms=1000):
+    """
+    Write a recording of synthetic readings, one per interval_ms per patient.
+
+    Returns:
+        int: Number of readings recorded.
+    """
+    random.seed(seed)
+    sensor_manager = SensorManager(use_synthetic=True)
+    db_manager = DatabaseManager(db_path=db_path)
+    count = int(minutes * 60 * 1000 // interval_ms)
+    for patient in range(patients):
+        batch = ReadingBatch()
+        for i in range(count):
+            reading = sensor_manager.generate_synthetic_data()
+            reading.ts = RECORDING_START_MS + i * interval_ms
+            batch.append(reading)
+            if len(batch) >= 5000:
+                db_manager.save_batch(f"REPLAY-{patient:03d}", f"replay-patient-{patient:03d}", batch)
+                batch.clear()
+        if len(batch):
+            db_manager.save_batch(f"REPLAY-{patient:03d}", f"replay-patient-{patient:03d}", batch)
+    db_manager.close()
+    return patients * count
+
+def replay_loop(hub, transmitter, db_manager, trend_window, alert_engine, alert_channel, report_filter):
+    """run_loop for a replay: returns at the end of the recording and never runs retention."""
+    while True:
+        for channel, batch in hub.collect_due_batches():
+            process_batch(channel, batch, transmitter, db_manager, trend_window, alert_engine, alert_channel,
+                          None, report_filter)
+        transmitter.retry_unsent_data()
+        if hub.finished:
+            return
+        time.sleep(hub.seconds_until_due())
+
+def drain_backlog(transmitter, db_manager, timeout_seconds=DRAIN_TIMEOUT_SECONDS):
+    """Send whatever is still unsent. Returns (seconds taken, readings left unsent)."""
+    started = time.monotonic()
+    if TRANSMIT_MODE == "batch":
+        transmitter.flush_batch()
+    db_manager.flush()
+    while db_manager.count_unsent() and time.monotonic() - started < timeout_seconds:
+        if not transmitter.retry_unsent_data():
+            time.sleep(0.05)
+    return round(time.monotonic() - started, 3), db_manager.count_unsent()
+
+def run_replay(args, recording, speed):
+    """Replay the recording once at speed into a fresh database and backend and return the run's figures."""
+    from_ms = parse_time_ms(args.from_time) if args.from_time else None
+    to_ms = parse_time_ms(args.to_time) if args.to_time else None
+    workdir = tempfile.mkdtemp(prefix="vitaledge-replay-")
+    db_path = os.path.join(workdir, "sensor_data.db")
+    # A backend per run, so records a previous run sent are not counted as duplicates
+    backend = MockBackend(latency_ms=args.latency_ms, failure_rate=args.failure_rate).start()
+    db_manager = DatabaseManager(db_path=db_path)
+    transmitter = Transmitter(backend_url=backend.url, auth_endpoint=f"{backend.url}/authenticate",
+                              db_manager=db_manager, token_cache_path=None)
+    clock = ReplayClock()
+    trend_window = TrendWindow(clock=clock.now_ms)
+    alert_engine = AlertRuleEngine()
+    alert_channel = AlertChannel(transmitter, db_manager)
+    alert_channel.start()
+    report_filter = ReportFilter() if args.report_filter else None
+    hub = ReplayHub(open_recording(recording, args.patient_id, from_ms, to_ms), clock, speed, args.tick_ms)
+
+    started = time.monotonic()
+    hub.start()
+    try:
+        if args.runtime == "pipeline":
+            # Imported here so loop runs do not load the pipeline's thread pool
+            from src.pipeline.edge_pipeline import EdgePipeline
+            pipeline = EdgePipeline(hub, db_manager, trend_window, transmitter, alert_engine=alert_engine,
+                                    alert_channel=alert_channel, report_filter=report_filter)
+            pipeline.start()
+            while not hub.finished:
+                time.sleep(0.01)
+            pipeline.stop()
+        else:
+            replay_loop(hub, transmitter, db_manager, trend_window, alert_engine, alert_channel, report_filter)
+        processed_seconds = time.monotonic() - started
+        drain_seconds, left_unsent = drain_backlog(transmitter, db_manager)
+    finally:
+        hub.stop()
+        alert_channel.stop()
+        transmitter.close()
+        db_manager.close()
+        backend.stop()
+
+    result = {"speed": speed, **hub.replay_stats.as_dict()}
+    result["processed_seconds"] = round(processed_seconds, 3)
+    result["processed_readings_per_s"] = round(result["readings"] / processed_seconds, 2) if processed_seconds > 0 else 0.0
+    if speed:
+        # Ticks run from the start of the first one to the end of the last one
+        paced_ms = (result["recorded_seconds"] * 1000 + args.tick_ms) / speed
+        result["finish_lag_ms"] = round(max(0.0, processed_seconds * 1000 - paced_ms), 3)
+        result["sustained"] = (result["max_lag_ms"] <= args.lag_tolerance_ms
+                               and result["finish_lag_ms"] <= args.lag_tolerance_ms)
+    result["drain_seconds"] = drain_seconds
+    result["left_unsent"] = left_unsent
+    result["alerts"] = sum(channel.stats.alerts for channel in hub.channels)
+    result["report_filter"] = report_filter.stats.as_dict() if report_filter is not None else None
+    result["backend"] = backend.snapshot()
+    result["sqlite_file_bytes"] = sqlite_bytes(db_path)
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+def find_max_speed(args, recording, ceiling, runs):
+    """
+    Bisect for the highest speed the agent keeps up with, below the unthrottled speedup.
+
+    Starts at a quarter of the ceiling, halving until a run is sustained, then narrows the
+    gap with --search-steps geometric bisections. Every run is added to runs.
+
+    Returns:
+        float: The highest sustained speed found, or None if not even 1x was sustained.
+    """
+    def attempt(speed):
+        result = run_replay(args, recording, speed)
+        runs[f"{speed:g}x"] = result
+        return result["sustained"]
+
+    low, high = max(1.0, round(ceiling / 4, 2)), ceiling
+    while not attempt(low):
+        if low <= 1.0:
+            return None
+        low, high = max(1.0, round(low / 2, 2)), low
+    for _ in range(args.search_steps):
+        speed = round(math.sqrt(low * high), 2)
+        if not low < speed < high:
+            break
+        if attempt(speed):
+            low = speed
+        else:
+            high = speed
+    return low
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded sensor stream through the VitalEdge agent.")
+    parser.add_argument("--recording", help="sensor_data database or history export CSV; default is synthetic.")
+    parser.add_argument("--patients", type=int, default=10, help="Patients in a synthetic recording.")
+    parser.add_argument("--minutes", type=float, default=10, help="Length of a synthetic recording.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of a synthetic recording.")
+    parser.add_argument("--patient-id", help="Replay one patient of the recording.")
+    parser.add_argument("--from", dest="from_time", help="Replay from this time, ISO 8601 or epoch ms.")
+    parser.add_argument("--to", dest="to_time", help="Replay up to this time, ISO 8601 or epoch ms.")
+    parser.add_argument("--speeds", type=float, nargs="+", default=[0.0],
+                        help="Replay speeds to run; 0 is unthrottled.")
+    parser.add_argument("--tick-ms", type=int, default=REPLAY_TICK_MS, help="Recorded time released per tick.")
+    parser.add_argument("--runtime", choices=["loop", "pipeline"], default="loop")
+    parser.add_argument("--report-filter", action="store_true", help="Run the send-on-change report filter.")
+    parser.add_argument("--find-max-speed", action="store_true",
+                        help="Search for the highest speed the agent keeps up with.")
+    parser.add_argument("--search-steps", type=int, default=4, help="Bisections of the max speed search.")
+    parser.add_argument("--lag-tolerance-ms", type=float, default=REPLAY_TICK_MS,
+                        help="Largest tick lag a sustained run may show.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Mock backend response delay.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of uploads failed with 503.")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+    if args.recording and not os.path.isfile(args.recording):
+        parser.error(f"No recording at {args.recording}")
+
+    logging.getLogger().setLevel(logging.WARNING)
+    recording = args.recording
+    if recording is None:
+        recording = os.path.join(tempfile.mkdtemp(prefix="vitaledge-recording-"), "recording.db")
+        record_synthetic(recording, args.patients, args.minutes, args.seed)
+    speeds = list(args.speeds)
+    if args.find_max_speed and 0 not in speeds:
+        speeds.insert(0, 0.0)
+
+    runs = {}
+    for speed in speeds:
+        runs[f"{speed:g}x" if speed else "unthrottled"] = run_replay(args, recording, speed)
+    max_sustainable = None
+    if args.find_max_speed:
+        unthrottled = runs["unthrottled"]
+        # The pipeline collects ahead of its stages, so the ceiling comes from processing time
+        ceiling = unthrottled["recorded_seconds"] / unthrottled["processed_seconds"] if unthrottled["processed_seconds"] else 0.0
+        speed = find_max_speed(args, recording, ceiling, runs)
+        recorded_rate = unthrottled["readings"] / unthrottled["recorded_seconds"] if unthrottled["recorded_seconds"] else 0.0
+        max_sustainable = {
+            "speed": speed,
+            "readings_per_s": round(speed * recorded_rate, 2) if speed else None
+        }
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+        "parameters": {**vars(args), "recording": recording},
+        "runs": runs,
+        "max_sustainable": max_sustainable
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
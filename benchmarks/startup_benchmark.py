@@ -0,0 +1,187 @@
+"""
+startup_benchmark.py
+Measures the edge agent's cold-start time and resident memory under each runtime profile.
+
+Run from the repository root:
+    python -m benchmarks.startup_benchmark --profiles standard lean --readings 500 --out startup.json
+
+Each profile runs in a fresh Python process (VITALEDGE_RUNTIME_PROFILE selects it) that
+imports main, builds the agent against a new SQLite file and a local MockBackend, and then
+pushes readings through main.process_batch back-to-back, one single-reading ReadingBatch
+at a time, as the live loop collects them. For each profile it reports:
+- import_ms: time to import main and everything it loads at startup.
+- first_reading_ms: time from the start of the imports until the first reading has been
+  stored and sent.
+- cold_start_ms: wall time from spawning the process until the first reading was sent,
+  including interpreter startup, as seen by this parent process.
+- rss_startup_kb / rss_steady_kb: VmRSS after the first reading and after all readings.
+- peak_rss_kb: the child's ru_maxrss.
+- modules: number of modules loaded after startup.
+
+--max-startup-ms and --max-rss-kb set bounds on cold_start_ms and rss_steady_kb; the
+command exits with status 1 if any profile exceeds them, so a CI job can keep both in check.
+The results are written as one JSON document, like edge_benchmark.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def current_rss_kb():
+    """Resident set size of this process in KiB, or its peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_child(backend_url, db_path, readings):
+    """Start the agent in this process, send readings and print two JSON lines."""
+    started = time.perf_counter()
+    # Imported here so the measured imports are the agent's, not the benchmark's
+    import main
+    from src.data_collection.channel_hub import SensorChannel
+    from src.data_collection.sensor_manager import SensorManager
+    from src.data_processing.alert_rules import AlertRuleEngine
+    from src.data_processing.database_manager import DatabaseManager
+    from src.data_processing.trend_window import TrendWindow
+    from src.data_transmission.alert_channel import AlertChannel
+    from src.data_transmission.transmitter import Transmitter
+    from src.utils import config
+    import_ms = (time.perf_counter() - started) * 1000
+    logging.getLogger().setLevel(logging.WARNING)
+
+    db_manager = DatabaseManager(db_path)
+    transmitter = Transmitter(backend_url=backend_url, auth_endpoint=f"{backend_url}/authenticate",
+                              db_manager=db_manager, token_cache_path=None)
+    channel = SensorChannel(config.DEVICE_ID, config.PATIENT_ID, SensorManager(use_synthetic=True))
+    trend_window = TrendWindow()
+    alert_engine = AlertRuleEngine()
+    alert_channel = AlertChannel(transmitter, db_manager)
+    alert_channel.start()
+    vector_analyzer = main.create_vector_analyzer()
+    metrics_server = main.MetricsServer(port=0).start() if config.METRICS_ENABLED else None
+
+    def process_one():
+        main.process_batch(channel, channel.collect_batch(), transmitter, db_manager, trend_window, alert_engine,
+                           alert_channel, vector_analyzer)
+
+    process_one()
+    startup = {
+        "profile": config.RUNTIME_PROFILE,
+        "import_ms": round(import_ms, 2),
+        "first_reading_ms": round((time.perf_counter() - started) * 1000, 2),
+        "rss_startup_kb": current_rss_kb(),
+        "modules": len(sys.modules)
+    }
+    print(json.dumps(startup), flush=True)
+
+    began = time.perf_counter()
+    for _ in range(readings - 1):
+        process_one()
+    elapsed = time.perf_counter() - began
+    db_manager.flush()
+    steady = {
+        "readings": readings,
+        "throughput_per_s": round((readings - 1) / elapsed, 2) if elapsed > 0 else 0.0,
+        "rss_steady_kb": current_rss_kb(),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+    print(json.dumps(steady), flush=True)
+
+    if metrics_server is not None:
+        metrics_server.stop()
+    alert_channel.stop()
+    transmitter.close()
+    db_manager.close()
+
+def measure_profile(profile, backend, readings):
+    """Run one profile in a child process and merge what it reports."""
+    workdir = tempfile.mkdtemp(prefix="vitaledge-startup-")
+    env = dict(os.environ, VITALEDGE_RUNTIME_PROFILE=profile)
+    command = [sys.executable, "-m", "benchmarks.startup_benchmark", "--child",
+               "--backend-url", backend.url, "--db", os.path.join(workdir, "sensor_data.db"),
+               "--readings", str(readings)]
+    spawned = time.perf_counter()
+    child = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, text=True)
+    startup_line = child.stdout.readline()
+    cold_start_ms = (time.perf_counter() - spawned) * 1000
+    steady_line = child.stdout.readline()
+    child.wait()
+    if child.returncode != 0 or not steady_line:
+        raise RuntimeError(f"Profile '{profile}' exited with status {child.returncode}")
+    result = json.loads(startup_line)
+    result["cold_start_ms"] = round(cold_start_ms, 2)
+    result.update(json.loads(steady_line))
+    return result
+
+def check_bounds(results, max_startup_ms, max_rss_kb):
+    """Return a message for every profile that is over a bound."""
+    violations = []
+    for profile, result in results.items():
+        if max_startup_ms is not None and result["cold_start_ms"] > max_startup_ms:
+            violations.append(f"{profile}: cold start {result['cold_start_ms']} ms > {max_startup_ms} ms")
+        if max_rss_kb is not None and result["rss_steady_kb"] > max_rss_kb:
+            violations.append(f"{profile}: steady RSS {result['rss_steady_kb']} KiB > {max_rss_kb} KiB")
+    return violations
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark VitalEdge cold start and memory per runtime profile.")
+    parser.add_argument("--profiles", nargs="+", default=["standard", "lean"], help="Runtime profiles to measure.")
+    parser.add_argument("--readings", type=int, default=500, help="Readings processed by each profile.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mock backend response delay.")
+    parser.add_argument("--max-startup-ms", type=float, default=None,
+                        help="Fail if any profile's cold start takes longer.")
+    parser.add_argument("--max-rss-kb", type=int, default=None,
+                        help="Fail if any profile's steady-state RSS is larger.")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend-url", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.backend_url, args.db, max(1, args.readings))
+        return 0
+
+    # Imported here so child processes do not load the mock backend's HTTP server
+    from benchmarks.mock_backend import MockBackend
+
+    logging.getLogger().setLevel(logging.WARNING)
+    backend = MockBackend(latency_ms=args.latency_ms).start()
+    try:
+        results = {profile: measure_profile(profile, backend, max(1, args.readings)) for profile in args.profiles}
+    finally:
+        backend.stop()
+
+    violations = check_bounds(results, args.max_startup_ms, args.max_rss_kb)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("child", "backend_url", "db")},
+        "profiles": results,
+        "violations": violations
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if violations else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,54 +4,173 @@ This script will manage the flow, including sensor data collection, processing,
 alerting, and transmission.
 """
 # main.py
-from src.data_collection.sensor_manager import SensorManager
-from src.data_processing.data_converter import convert_to_backend_format
-from src.data_processing.data_analyzer import check_alert_conditions, analyze_recent_trends
+from src.data_collection.channel_hub import ChannelHub, build_channels
+from src.data_processing.data_converter import convert_batch_to_backend_format
+from src.data_processing.alert_rules import AlertRuleEngine
+from src.data_processing.trend_window import TrendWindow
 from src.data_processing.database_manager import DatabaseManager
+from src.data_processing.retention import RetentionManager
+from src.data_processing.report_filter import ReportFilter
 from src.data_transmission.transmitter import Transmitter
-from src.utils.config import DEVICE_ID, PATIENT_ID, DB_PATH
-from src.utils.logger import log_info, log_error
+from src.data_transmission.alert_channel import AlertChannel, PRIORITY_THRESHOLD, PRIORITY_TREND
+from src.utils.config import (
+    TRANSMIT_MODE, BATCH_MAX_WAIT_MS, TRANSMIT_TRANSPORT, TRANSMIT_BACKEND, RUNTIME_MODE, VECTOR_ANALYTICS_ENABLED, METRICS_ENABLED,
+    REPORT_FILTER_ENABLED, HISTORY_API_ENABLED
+)
+from src.utils.logger import log_info, log_error, log_sampled
+from src.utils.metrics import MetricsServer, BACKLOG_DEPTH, ALERT_QUEUE_DEPTH
 import time
 
 def main():
-    sensor_manager = SensorManager(use_synthetic=False)
-    transmitter = Transmitter()
+    # Every channel shares one storage writer, trend engine, alert lane and transmitter;
+    # the transmitter records its ledger through the same SQLite connection
+    hub = ChannelHub(build_channels())
     db_manager = DatabaseManager()
+    transmitter = create_transmitter(db_manager)
+    trend_window = TrendWindow()
+    for patient_id in hub.patient_ids():
+        trend_window.rebuild_from_db(db_manager, patient_id)
+    retention = RetentionManager(db_manager)
+    alert_engine = AlertRuleEngine()
+    alert_channel = AlertChannel(transmitter, db_manager)
+    alert_channel.start()
+    vector_analyzer = create_vector_analyzer()
+    report_filter = ReportFilter() if REPORT_FILTER_ENABLED else None
+    # Queue depths are only computed when the endpoint is scraped
+    BACKLOG_DEPTH.set_function(db_manager.count_unsent)
+    ALERT_QUEUE_DEPTH.set_function(alert_channel.queue.qsize)
+    metrics_server = MetricsServer().start() if METRICS_ENABLED else None
+    history_server = create_history_server(db_manager)
+    hub.start()
 
-    while True:
-        # Step 1: Collect data from sensors
-        sensor_data = sensor_manager.collect_data()
-
-        # Step 2: Save raw sensor data to SQLite
-        record_id = db_manager.save_data(DEVICE_ID, PATIENT_ID, sensor_data)
-        if record_id is None:
-            log_error(f"!!ASSERT!! Unexpectedly null returned for record_id")
-
-        # Step 3: Check for alerts based on the collected sensor data
-        alert_message = check_alert_conditions(sensor_data)
-        if alert_message:
-            log_info(f"Alert: {alert_message}")
-
-        # Assume db_path is already defined as the path to your SQLite database
-        trend_alert = analyze_recent_trends(db_path=DB_PATH, time_window_minutes=5)
-        if trend_alert:
-            print(f"Alert: {trend_alert}")
-
-        # Step 4: Convert sensor data to backend format
-        backend_data = convert_to_backend_format(sensor_data)
-
-        # Step 5: Attempt to send backend-formatted data to backend
-        # if transmitter.send_data_http(backend_data):
-        if transmitter.send_data_http(backend_data, PATIENT_ID, record_id):
-            log_info("Data sent successfully to the backend.")
+    try:
+        if RUNTIME_MODE == "pipeline":
+            # Imported here so the loop runtime does not load the pipeline's thread pool
+            from src.pipeline.edge_pipeline import EdgePipeline
+            EdgePipeline(
+                hub, db_manager, trend_window, transmitter, retention, vector_analyzer, alert_engine, alert_channel,
+                report_filter
+            ).run_forever()
         else:
-            log_error("Data transmission failed. Retrying will occur in the next cycle.")
+            run_loop(hub, transmitter, db_manager, trend_window, retention, vector_analyzer, alert_engine,
+                     alert_channel, report_filter)
+    finally:
+        hub.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if history_server is not None:
+            history_server.stop()
+        alert_channel.stop()
+        transmitter.close()
+        db_manager.close()
+
+def create_transmitter(db_manager=None):
+    if TRANSMIT_TRANSPORT == "mqtt":
+        # Imported here so HTTP-only devices do not need paho-mqtt installed
+        from src.data_transmission.mqtt_transport import MqttTransport
+        return Transmitter(db_manager=db_manager, transport=MqttTransport())
+    if TRANSMIT_BACKEND == "async":
+        # Imported here so the synchronous backend does not need aiohttp installed
+        from src.data_transmission.async_transmitter import AsyncTransmitter
+        return AsyncTransmitter(db_manager=db_manager)
+    return Transmitter(db_manager=db_manager)
+
+def create_vector_analyzer():
+    if not VECTOR_ANALYTICS_ENABLED:
+        return None
+    # Imported here so devices without numpy can run the default analytics
+    from src.data_processing.vector_analytics import VectorAnalyzer
+    return VectorAnalyzer()
+
+def create_history_server(db_manager):
+    if not HISTORY_API_ENABLED:
+        return None
+    # Imported here so agents without the history endpoint do not load http.server
+    from src.data_processing.history_export import HistoryServer
+    return HistoryServer(db_path=db_manager.db_path, flush=db_manager.flush).start()
 
-        # Step 6: Retry sending any unsent data
+def run_loop(hub, transmitter, db_manager, trend_window, retention, vector_analyzer, alert_engine,
+             alert_channel, report_filter=None):
+    while True:
+        # Step 1: Collect data from every channel that is due, one columnar batch per channel
+        for channel, batch in hub.collect_due_batches():
+            process_batch(channel, batch, transmitter, db_manager, trend_window, alert_engine, alert_channel,
+                          vector_analyzer, report_filter)
+
+        # Step 6: Upload a batch that has waited long enough, then retry any unsent data
+        if TRANSMIT_MODE == "batch":
+            transmitter.flush_batch_if_due()
         transmitter.retry_unsent_data()
 
-        # Step 7: Wait before the next reading
-        time.sleep(5)  # Adjustable delay between readings
+        # Compact old rows into rollups, a bounded chunk at a time
+        retention.run_if_due()
+
+        # Step 7: Wait until the next channel is due, waking in time to honour BATCH_MAX_WAIT_MS
+        wait_seconds = hub.seconds_until_due()
+        if TRANSMIT_MODE == "batch":
+            wait_seconds = min(wait_seconds, BATCH_MAX_WAIT_MS / 1000)
+        time.sleep(wait_seconds)
+
+def process_batch(channel, batch, transmitter, db_manager, trend_window, alert_engine, alert_channel,
+                  vector_analyzer=None, report_filter=None):
+    """Store, analyze and send one channel's ReadingBatch, column by column."""
+    device_id, patient_id = channel.device_id, channel.patient_id
+
+    # Step 2: Save the raw readings to SQLite with one executemany, and waveforms as chunks
+    record_ids = db_manager.save_batch(device_id, patient_id, batch)
+    for block in batch.waveforms:
+        db_manager.save_waveform(device_id, patient_id, block)
+    if not len(batch):
+        return
+
+    # Step 3: Check every reading for alerts, and the trend window once for the batch
+    alerts = [(message, PRIORITY_THRESHOLD, index) for index, message in alert_engine.evaluate_batch(patient_id, batch)]
+    # Trend and vector conditions are reported on every run while they last, so they go
+    # through the engine's active/renotify state like threshold alerts
+    trend_window.push_batch(patient_id, batch)
+    last = len(batch) - 1
+    ts_ms = batch.ts[last]
+    trend_alert = trend_window.analyze(patient_id)
+    trend_conditions = {trend_alert: trend_alert} if trend_alert else {}
+    alerts += [(message, PRIORITY_TREND, last)
+               for message in alert_engine.evaluate_conditions(patient_id, "trend", trend_conditions, ts_ms)]
+    if vector_analyzer is not None:
+        detected = vector_analyzer.run_if_due(trend_window, patient_id)
+        if detected is not None:
+            alerts += [(message, PRIORITY_TREND, last)
+                       for message in alert_engine.evaluate_conditions(patient_id, "vector", detected, ts_ms)]
+
+    for alert_message, priority, index in alerts:
+        log_info(f"Alert: {alert_message} ({channel.name})")
+        alert_channel.raise_alert(patient_id, alert_message, batch.reading(index), record_ids[index], priority,
+                                  device_id)
+    channel.stats.alerts += len(alerts)
+
+    # Send every reading of a flagged patient; otherwise only those that add something new.
+    # Readings that are not sent stay in SQLite, marked 'suppressed'.
+    indexes = None
+    if report_filter is not None:
+        indexes = report_filter.filter_stored_batch(
+            db_manager, patient_id, batch, record_ids, flagged=[index for _, _, index in alerts],
+            still_flagged=bool(alert_engine.active_alerts(patient_id))
+        )
+
+    # Step 4: Convert the batch to backend format straight from its columns
+    records = convert_batch_to_backend_format(batch, device_id=device_id, patient_id=patient_id,
+                                              record_ids=record_ids, indexes=indexes)
+    if indexes is not None:
+        record_ids = [record_ids[index] for index in indexes]
+
+    # Step 5: Attempt to send backend-formatted data to backend
+    for backend_data, record_id in zip(records, record_ids):
+        if TRANSMIT_MODE == "batch":
+            transmitter.queue_for_batch(backend_data, patient_id, record_id)
+        elif transmitter.send_data(backend_data, patient_id, record_id):
+            log_sampled("data-sent", "Data sent successfully to the backend.")
+        else:
+            # The rest of the batch is already stored as 'unsent' and goes out with the backlog
+            log_error("Data transmission failed. Retrying will occur in the next cycle.")
+            break
 
 if __name__ == "__main__":
     main()
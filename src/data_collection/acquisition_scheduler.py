@@ -0,0 +1,147 @@
+"""
+acquisition_scheduler.py
+Polls each registered SensorInterface at its own frequency, so a slow sensor no longer
+delays the others and fast and slow sensors can share one device.
+
+Scheduling:
+Every sensor runs on its own daemon thread. Deadlines are computed from a fixed start time
+on the monotonic clock (start + n * period) rather than by sleeping one period after each
+read, so the schedule never drifts. A read that finishes after its next deadline counts as
+an overrun, and the missed slots are skipped instead of being read back-to-back.
+
+Queue:
+Readings go into a bounded collections.deque. Appends and pops are atomic in CPython, so
+producers and the consumer never take a lock. When the queue is full the oldest reading is
+discarded and counted as dropped. Waveform sensors put whole WaveformBlocks on the queue.
+"""
+import threading
+import time
+from collections import deque
+from src.utils.config import ACQUISITION_QUEUE_CAPACITY
+from src.utils.logger import log_info, log_error
+from src.data_collection.reading import Reading
+from src.data_collection.waveform import WaveformBlock
+
+class SensorStats:
+    """Per-sensor counters kept by the scheduler."""
+    __slots__ = ("reads", "errors", "overruns", "dropped", "max_jitter_ms", "total_jitter_ms")
+
+    def __init__(self):
+        self.reads = 0
+        self.errors = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.max_jitter_ms = 0.0
+        self.total_jitter_ms = 0.0
+
+    def as_dict(self):
+        return {
+            "reads": self.reads,
+            "errors": self.errors,
+            "overruns": self.overruns,
+            "dropped": self.dropped,
+            "max_jitter_ms": round(self.max_jitter_ms, 3),
+            "mean_jitter_ms": round(self.total_jitter_ms / self.reads, 3) if self.reads else 0.0
+        }
+
+class AcquisitionScheduler:
+    def __init__(self, queue_capacity=ACQUISITION_QUEUE_CAPACITY):
+        self.queue = deque(maxlen=queue_capacity)
+        self._sensors = {}  # name -> (sensor, period_seconds)
+        self._stats = {}
+        self._threads = []
+        self._stop = threading.Event()
+
+    def register(self, sensor, rate_hz=None, name=None):
+        """
+        Register a sensor to be polled once started.
+
+        Args:
+            sensor (SensorInterface): Sensor to poll.
+            rate_hz (float): Polling frequency; defaults to sensor.sample_rate_hz.
+            name (str): Key for stats and readings; defaults to sensor.name.
+        """
+        name = name or sensor.name
+        rate_hz = rate_hz or sensor.sample_rate_hz
+        if rate_hz <= 0:
+            raise ValueError(f"Polling rate for sensor '{name}' must be positive.")
+        self._sensors[name] = (sensor, 1.0 / rate_hz)
+        self._stats[name] = SensorStats()
+
+    def start(self):
+        """Start one polling thread per registered sensor."""
+        self._stop.clear()
+        start = time.monotonic()
+        for name, (sensor, period) in self._sensors.items():
+            thread = threading.Thread(
+                target=self._poll, args=(name, sensor, period, start), name=f"poll-{name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        log_info(f"Acquisition scheduler started for sensors: {', '.join(self._sensors)}")
+
+    def stop(self, timeout=None):
+        """Stop all polling threads and wait for them to exit."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _poll(self, name, sensor, period, start):
+        """Read one sensor on a drift-free schedule until stopped."""
+        stats = self._stats[name]
+        slot = 0
+        while True:
+            due = start + slot * period
+            delay = due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                return
+            if self._stop.is_set():
+                return
+
+            began = time.monotonic()
+            jitter_ms = (began - due) * 1000
+            try:
+                reading = sensor.read_data()
+            except Exception as e:
+                stats.errors += 1
+                log_error(f"Error reading sensor '{name}': {e}")
+                reading = None
+
+            if reading is not None:
+                if not isinstance(reading, WaveformBlock):
+                    reading = Reading.from_mapping(reading)  # Stamped now unless the sensor set a timestamp
+                if len(self.queue) == self.queue.maxlen:
+                    stats.dropped += 1
+                self.queue.append((name, reading))
+                stats.reads += 1
+                stats.total_jitter_ms += jitter_ms
+                stats.max_jitter_ms = max(stats.max_jitter_ms, jitter_ms)
+
+            # Skip any slots the read overran instead of bursting to catch up
+            next_slot = int((time.monotonic() - start) / period) + 1
+            if next_slot > slot + 1:
+                stats.overruns += next_slot - slot - 1
+            slot = max(slot + 1, next_slot)
+
+    def drain(self, max_items=None):
+        """
+        Remove buffered readings in arrival order.
+
+        Args:
+            max_items (int): Upper bound on readings returned; None drains everything.
+
+        Returns:
+            list: (sensor_name, reading) tuples.
+        """
+        items = []
+        while self.queue and (max_items is None or len(items) < max_items):
+            try:
+                items.append(self.queue.popleft())
+            except IndexError:
+                break
+        return items
+
+    def stats(self):
+        """Return a dict of per-sensor counters keyed by sensor name."""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
@@ -0,0 +1,210 @@
+"""
+channel_hub.py
+Hosts many sensor channels in one process, so a gateway Pi can serve a whole ward.
+
+Channels:
+A SensorChannel pairs a device/patient identity with the SensorManager that reads its
+sensors. Every reading it produces is tagged with that identity, and storage, trend
+analysis, alerting and transmission use it instead of the global DEVICE_ID/PATIENT_ID.
+
+Scheduling:
+The hub keeps channels in a heap ordered by their next deadline. collect_due reads only
+the channels that are due, and deadlines advance on a fixed grid (start + n * interval),
+so hundreds of channels share one thread without drifting. Channels that use scheduled
+acquisition already buffer readings on their own threads; the hub just drains them at a
+short poll interval. collect_due_batches returns each channel's readings as one columnar
+ReadingBatch, so a burst of scheduled samples moves through the agent as a single item.
+
+Metrics:
+Each channel counts its readings, collection errors, collection time and alerts.
+stats() reports these per channel, along with its reading rate. Read times and reading
+counts are also recorded in the metrics registry.
+"""
+import heapq
+import itertools
+import time
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_collection.sensor_manager import SensorManager
+from src.utils.config import (
+    DEVICE_ID, PATIENT_ID, SENSOR_CHANNELS, ACQUISITION_MODE, LOOP_INTERVAL_SECONDS
+)
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import SENSOR_READ_SECONDS, READINGS_TOTAL
+
+SCHEDULED_POLL_SECONDS = 0.05  # How often buffered readings from scheduled channels are drained
+
+class ChannelStats:
+    """Per-channel counters kept by the hub."""
+    __slots__ = ("readings", "errors", "alerts", "total_collect_ms", "max_collect_ms", "started_at")
+
+    def __init__(self):
+        self.readings = 0
+        self.errors = 0
+        self.alerts = 0
+        self.total_collect_ms = 0.0
+        self.max_collect_ms = 0.0
+        self.started_at = time.monotonic()
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started_at
+        collections = self.readings + self.errors
+        return {
+            "readings": self.readings,
+            "errors": self.errors,
+            "alerts": self.alerts,
+            "readings_per_s": round(self.readings / elapsed, 3) if elapsed > 0 else 0.0,
+            "mean_collect_ms": round(self.total_collect_ms / collections, 3) if collections else 0.0,
+            "max_collect_ms": round(self.max_collect_ms, 3)
+        }
+
+class SensorChannel:
+    def __init__(self, device_id, patient_id, sensor_manager, interval_seconds=LOOP_INTERVAL_SECONDS,
+                 scheduled=False):
+        """
+        Args:
+            device_id (str): Unique identifier for the channel's device.
+            patient_id (str): Unique identifier for the channel's patient.
+            sensor_manager (SensorManager): Reads the channel's sensors.
+            interval_seconds (float): Time between reads.
+            scheduled (bool): The sensor manager runs scheduled acquisition; its buffered
+                readings are drained every SCHEDULED_POLL_SECONDS instead.
+        """
+        self.device_id = device_id
+        self.patient_id = patient_id
+        self.sensor_manager = sensor_manager
+        self.scheduled = scheduled
+        self.interval_seconds = SCHEDULED_POLL_SECONDS if scheduled else interval_seconds
+        self.stats = ChannelStats()
+        self._readings_total = READINGS_TOTAL.labels(self.name)
+
+    @property
+    def name(self):
+        return f"{self.device_id}/{self.patient_id}"
+
+    def collect(self):
+        """Read the channel's sensors and return a list of readings."""
+        started = time.monotonic()
+        try:
+            if self.scheduled:
+                readings = self.sensor_manager.collect_scheduled()
+            else:
+                readings = [self.sensor_manager.collect_data()]
+            readings = [reading for reading in readings if reading]
+            self.stats.readings += len(readings)
+            self._readings_total.inc(len(readings))
+        except Exception as e:
+            self.stats.errors += 1
+            log_error(f"Collection failed on channel {self.name}: {e}")
+            readings = []
+        elapsed_ms = (time.monotonic() - started) * 1000
+        SENSOR_READ_SECONDS.observe(elapsed_ms / 1000)
+        self.stats.total_collect_ms += elapsed_ms
+        self.stats.max_collect_ms = max(self.stats.max_collect_ms, elapsed_ms)
+        return readings
+
+    def collect_batch(self):
+        """Read the channel's sensors into a ReadingBatch, with any waveform blocks they captured."""
+        readings = self.collect()
+        waveforms = self.sensor_manager.collect_waveforms() if self.scheduled else None
+        return ReadingBatch(readings, waveforms)
+
+    def start(self):
+        if self.scheduled:
+            self.sensor_manager.start_scheduled_acquisition()
+
+    def stop(self):
+        self.sensor_manager.stop()
+
+class ChannelHub:
+    def __init__(self, channels):
+        """
+        Args:
+            channels (list): SensorChannel instances to host.
+        """
+        self.channels = list(channels)
+        self._heap = []
+        self._tiebreak = itertools.count()
+
+    def start(self):
+        """Start each channel and schedule its first read for now."""
+        now = time.monotonic()
+        for channel in self.channels:
+            channel.start()
+            heapq.heappush(self._heap, (now, next(self._tiebreak), channel))
+        log_info(f"Channel hub started with {len(self.channels)} channels.")
+
+    def stop(self):
+        for channel in self.channels:
+            channel.stop()
+
+    def patient_ids(self):
+        return sorted({channel.patient_id for channel in self.channels})
+
+    def collect_due(self, now=None):
+        """
+        Read every channel whose deadline has passed.
+
+        Returns:
+            list: (channel, reading) tuples.
+        """
+        return [(channel, reading) for channel in self._pop_due(now) for reading in channel.collect()]
+
+    def collect_due_batches(self, now=None):
+        """
+        Read every channel whose deadline has passed, one ReadingBatch per channel.
+
+        Returns:
+            list: (channel, batch) tuples for the channels that produced readings or waveforms.
+        """
+        collected = []
+        for channel in self._pop_due(now):
+            batch = channel.collect_batch()
+            if len(batch) or batch.waveforms:
+                collected.append((channel, batch))
+        return collected
+
+    def _pop_due(self, now=None):
+        """Return the channels whose deadline has passed, rescheduling each one."""
+        now = time.monotonic() if now is None else now
+        due_channels = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, channel = heapq.heappop(self._heap)
+            due_channels.append(channel)
+            # Advance on the fixed grid, skipping slots the hub fell behind on
+            missed = int((now - due) / channel.interval_seconds)
+            heapq.heappush(self._heap, (due + (missed + 1) * channel.interval_seconds, next(self._tiebreak), channel))
+        return due_channels
+
+    def seconds_until_due(self, cap=LOOP_INTERVAL_SECONDS):
+        """Time until the next channel is due, capped at cap seconds."""
+        if not self._heap:
+            return cap
+        return max(0.0, min(cap, self._heap[0][0] - time.monotonic()))
+
+    def stats(self):
+        """Return a dict of per-channel counters keyed by channel name."""
+        return {channel.name: channel.stats.as_dict() for channel in self.channels}
+
+def build_channels(channel_configs=SENSOR_CHANNELS):
+    """
+    Create the channels described in config.
+
+    Args:
+        channel_configs (list): Dicts with device_id, patient_id and optional use_synthetic
+            and interval_seconds. An empty list runs one channel for DEVICE_ID/PATIENT_ID.
+
+    Returns:
+        list: SensorChannel instances.
+    """
+    if not channel_configs:
+        channel_configs = [{"device_id": DEVICE_ID, "patient_id": PATIENT_ID}]
+    scheduled = ACQUISITION_MODE == "scheduled"
+    return [
+        SensorChannel(
+            config["device_id"], config["patient_id"],
+            SensorManager(use_synthetic=config.get("use_synthetic", False)),
+            interval_seconds=config.get("interval_seconds", LOOP_INTERVAL_SECONDS),
+            scheduled=scheduled
+        )
+        for config in channel_configs
+    ]
@@ -13,7 +13,6 @@ class MockTemperatureSensor:
     def read_temperature(self):
         """Simulate reading temperature."""
         temp = round(random.uniform(self.min_temp, self.max_temp), 1)
-        print(f"Mock Temperature Reading: {temp}°C")  # For debugging
         return temp
 
 class MockHeartRateSensor:
@@ -25,5 +24,4 @@ class MockHeartRateSensor:
     def read_heart_rate(self):
         """Simulate reading heart rate."""
         heart_rate = random.randint(self.min_heart_rate, self.max_heart_rate)
-        print(f"Mock Heart Rate Reading: {heart_rate} bpm")  # For debugging
         return heart_rate
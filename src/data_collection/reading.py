@@ -0,0 +1,93 @@
+"""
+reading.py
+Compact, fixed-schema record for one sensor reading.
+
+A Reading keeps its fields in __slots__ instead of a per-instance dict, and its capture
+time as integer epoch milliseconds (ts) instead of ISO text, so collecting a reading
+allocates one small object and no timestamp string. The ISO form is produced only when
+something asks for "timestamp".
+
+Readings also answer the read-only dict calls used across the agent (get, [], items), so
+code written against plain dict readings keeps working. items() yields only the metrics
+that were actually read.
+"""
+from src.utils.timestamps import utc_now_epoch_ms, iso_to_epoch_ms, epoch_ms_to_iso
+
+# Metric fields, in sensor_data column order
+READING_FIELDS = (
+    "heart_rate", "temperature", "oxygen_level", "steps_count", "calories_burned",
+    "battery_level", "signal_strength"
+)
+_FIELD_SET = frozenset(READING_FIELDS)
+
+class Reading:
+    __slots__ = ("ts",) + READING_FIELDS + ("status",)
+
+    def __init__(self, ts=None, heart_rate=None, temperature=None, oxygen_level=None, steps_count=None,
+                 calories_burned=None, battery_level=None, signal_strength=None, status="active"):
+        """
+        Args:
+            ts (int): Capture time in epoch milliseconds; defaults to now.
+            heart_rate, temperature, ...: Metric values; None when not read.
+            status (str): Status of the device or reading.
+        """
+        self.ts = ts if ts is not None else utc_now_epoch_ms()
+        self.heart_rate = heart_rate
+        self.temperature = temperature
+        self.oxygen_level = oxygen_level
+        self.steps_count = steps_count
+        self.calories_burned = calories_burned
+        self.battery_level = battery_level
+        self.signal_strength = signal_strength
+        self.status = status
+
+    @classmethod
+    def from_mapping(cls, data):
+        """Build a Reading from a dict reading with an optional ISO "timestamp"."""
+        if isinstance(data, cls):
+            return data
+        reading = cls(iso_to_epoch_ms(data.get("timestamp")), status=data.get("status", "active"))
+        for field in READING_FIELDS:
+            value = data.get(field)
+            if value is not None:
+                setattr(reading, field, value)
+        return reading
+
+    def get(self, key, default=None):
+        if key == "timestamp":
+            return epoch_ms_to_iso(self.ts)
+        if key in _FIELD_SET or key == "status":
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def items(self):
+        """Yield (metric, value) for every metric that was read."""
+        for field in READING_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                yield field, value
+
+    def as_dict(self):
+        """Return the reading as a plain dict with an ISO timestamp."""
+        data = dict(self.items())
+        data["timestamp"] = epoch_ms_to_iso(self.ts)
+        return data
+
+    def __repr__(self):
+        return f"Reading({self.as_dict()})"
+
+def reading_ts_ms(data):
+    """Capture time of a Reading or dict reading in epoch milliseconds, or now if it has none."""
+    if isinstance(data, Reading):
+        return data.ts
+    return iso_to_epoch_ms(data.get("timestamp")) or utc_now_epoch_ms()
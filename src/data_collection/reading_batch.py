@@ -0,0 +1,102 @@
+"""
+reading_batch.py
+Columnar buffer that carries many readings of one channel through the agent at once.
+
+Layout:
+A ReadingBatch keeps one array.array per field instead of one object per reading: capture
+times as signed 64-bit epoch milliseconds and every metric as a C double, with NaN
+marking a metric that was not read. Appending a reading copies its values into the arrays,
+so the Reading itself can be dropped right away, and a batch of any size costs a handful
+of Python objects. This is what lets high-frequency, waveform-like sampling run without
+per-reading garbage.
+
+Consumers:
+- Storage passes rows() straight to executemany (DatabaseManager.save_batch).
+- The trend window and alert rules walk the columns directly (TrendWindow.push_batch,
+  AlertRuleEngine.evaluate_batch).
+- The converter builds backend records from the columns (convert_batch_to_backend_format).
+- NumPy can wrap a column without copying: numpy.frombuffer(batch.column("heart_rate")).
+
+A batch also carries the WaveformBlocks its channel captured in the same tick; they are
+stored as waveform chunks next to the readings (DatabaseManager.save_waveform).
+
+reading(i) and iteration rebuild Reading objects for the rare callers that need one, such
+as raising an alert for a single row.
+"""
+from array import array
+from src.data_collection.reading import Reading, READING_FIELDS
+from src.utils.timestamps import epoch_ms_to_iso
+
+MISSING = float("nan")  # Stored for a metric that was not read
+
+class ReadingBatch:
+    __slots__ = ("ts", "_columns", "statuses", "waveforms")
+
+    def __init__(self, readings=(), waveforms=None):
+        """
+        Args:
+            readings (iterable): Reading objects to append, oldest first.
+            waveforms (list): WaveformBlocks collected along with the readings.
+        """
+        self.ts = array("q")
+        self._columns = {field: array("d") for field in READING_FIELDS}
+        self.statuses = []
+        self.waveforms = waveforms or []
+        self.extend(readings)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, reading):
+        """Copy one Reading's values onto the end of the batch."""
+        self.ts.append(reading.ts)
+        for field, column in self._columns.items():
+            value = getattr(reading, field)
+            column.append(MISSING if value is None else value)
+        self.statuses.append(reading.status)
+
+    def extend(self, readings):
+        for reading in readings:
+            self.append(reading)
+
+    def clear(self):
+        """Empty the batch so it can be refilled."""
+        del self.ts[:]
+        for column in self._columns.values():
+            del column[:]
+        del self.statuses[:]
+        self.waveforms = []
+
+    def column(self, field):
+        """Return a metric's array itself (NaN where not read); do not resize it."""
+        return self._columns[field]
+
+    def values(self, field):
+        """Return a metric's values as a list, with None where not read."""
+        return [None if value != value else value for value in self._columns[field]]
+
+    def reading(self, index):
+        """Rebuild the Reading at one position."""
+        reading = Reading(self.ts[index], status=self.statuses[index])
+        for field, column in self._columns.items():
+            value = column[index]
+            if value == value:
+                setattr(reading, field, value)
+        return reading
+
+    def __iter__(self):
+        for index in range(len(self.ts)):
+            yield self.reading(index)
+
+    def rows(self, device_id, patient_id, transmit_status="unsent"):
+        """
+        Yield sensor_data rows in INSERT_SENSOR_DATA_SQL column order, for executemany.
+
+        Args:
+            device_id (str): Unique identifier for the device.
+            patient_id (str): Unique identifier for the patient.
+            transmit_status (str): Ledger state the rows start in.
+        """
+        metric_columns = [self.values(field) for field in READING_FIELDS]
+        for ts, status, *metrics in zip(self.ts, self.statuses, *metric_columns):
+            yield (device_id, patient_id, epoch_ms_to_iso(ts), ts, *metrics, status, transmit_status)
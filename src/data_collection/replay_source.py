@@ -0,0 +1,332 @@
+"""
+replay_source.py
+Replays recorded sensor streams through the agent in place of live sensors.
+
+Recordings:
+- A sensor_data database written by the agent (read_database_stream). Each patient's rows
+  are streamed through HistoryQuery on a read-only connection and merged by capture time,
+  so a recording of any length replays in bounded memory. Only raw rows are replayed;
+  ranges that retention has already rolled up are skipped.
+- A CSV file in the raw history export format (read_csv_stream): patient_id, device_id,
+  timestamp, ts and one column per metric, with empty cells for metrics that were not
+  read. The export orders rows by patient first, so the file is loaded and sorted by ts.
+
+Virtual clock:
+Replayed readings keep their recorded capture times. ReplayClock holds the recorded time
+the replay has reached, and anything that windows on "now" takes its time from the clock
+instead of the wall clock (TrendWindow's clock, analyze_recent_trends' now_ms). Trend
+results therefore match the recording at any replay speed.
+
+Pacing:
+ReplayHub stands in for ChannelHub in run_loop or EdgePipeline. It releases the recording
+in ticks of tick_ms recorded time, as one ReadingBatch per channel per tick. At speed 1 a
+tick is released once its recorded time has passed on the wall clock, at speed N N times
+sooner, and at speed 0 (unthrottled) as soon as the caller asks for it. Batches are cut
+on the same tick grid at every speed, so each replay feeds the pipeline the same batches
+in the same order. The lag of a tick is how long after its due time the caller collected
+it; a paced replay the agent keeps up with stays near zero lag.
+"""
+import csv
+import heapq
+import os
+import time
+from src.data_collection.channel_hub import ChannelStats
+from src.data_collection.reading import Reading, READING_FIELDS
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_processing.history_query import HistoryQuery
+from src.utils.config import DEVICE_ID, PATIENT_ID, HISTORY_CHUNK_ROWS, REPLAY_TICK_MS, LOOP_INTERVAL_SECONDS
+from src.utils.logger import log_info
+from src.utils.metrics import READINGS_TOTAL
+from src.utils.timestamps import iso_to_epoch_ms
+
+END_OF_TIME_MS = 2 ** 63 - 1  # Upper bound for an open-ended range
+
+def _item_ts(item):
+    return item[2].ts
+
+def _number(text):
+    """Parse a CSV cell as int or float; an empty cell is a metric that was not read."""
+    if text is None or text == "":
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def read_database_stream(db_path, patient_id=None, from_ms=None, to_ms=None, chunk_rows=HISTORY_CHUNK_ROWS):
+    """
+    Stream the raw readings of a sensor_data database in capture order.
+
+    Args:
+        db_path (str): SQLite database written by the agent.
+        patient_id (str): Replay one patient; None replays every patient.
+        from_ms (int): Start of the range in epoch milliseconds; None starts at the first reading.
+        to_ms (int): Exclusive end of the range in epoch milliseconds; None runs to the last one.
+        chunk_rows (int): Rows fetched per patient at a time.
+
+    Returns:
+        iterator: (device_id, patient_id, Reading) tuples ordered by capture time.
+    """
+    history = HistoryQuery(db_path, chunk_rows)
+    patient_ids = [patient_id] if patient_id is not None else history.patient_ids()
+    from_ms = 0 if from_ms is None else from_ms
+    to_ms = END_OF_TIME_MS if to_ms is None else to_ms
+    streams = [
+        ((row[1], row[0], Reading(*row[3:])) for row in history.rows(from_ms, to_ms, pid))
+        for pid in patient_ids
+    ]
+    return heapq.merge(*streams, key=_item_ts)
+
+def read_csv_stream(path, patient_id=None, from_ms=None, to_ms=None):
+    """
+    Load the readings of a raw history export CSV in capture order.
+
+    Rows without a patient_id or device_id column are replayed as PATIENT_ID / DEVICE_ID.
+    Capture times come from the ts column, or from timestamp when there is no ts.
+
+    Args:
+        path (str): CSV file with a header line.
+        patient_id (str): Replay one patient; None replays every patient.
+        from_ms (int): Start of the range in epoch milliseconds; None starts at the first reading.
+        to_ms (int): Exclusive end of the range in epoch milliseconds; None runs to the last one.
+
+    Returns:
+        iterator: (device_id, patient_id, Reading) tuples ordered by capture time.
+
+    Raises:
+        ValueError: If the file is not a raw reading export or a row has no readable time.
+    """
+    from_ms = 0 if from_ms is None else from_ms
+    to_ms = END_OF_TIME_MS if to_ms is None else to_ms
+    items = []
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        metrics = [name for name in READING_FIELDS if name in fields]
+        if not metrics or ("ts" not in fields and "timestamp" not in fields):
+            raise ValueError(f"{path} is not a raw reading export; it needs a ts or timestamp column "
+                             f"and at least one of {list(READING_FIELDS)}.")
+        for line, row in enumerate(reader, start=2):
+            ts = _number(row["ts"]) if row.get("ts") else iso_to_epoch_ms(row.get("timestamp"))
+            if ts is None:
+                raise ValueError(f"{path}:{line}: no readable ts or timestamp.")
+            row_patient_id = row.get("patient_id") or PATIENT_ID
+            if (patient_id is not None and row_patient_id != patient_id) or not from_ms <= ts < to_ms:
+                continue
+            reading = Reading(int(ts), **{metric: _number(row[metric]) for metric in metrics})
+            items.append((row.get("device_id") or DEVICE_ID, row_patient_id, reading))
+    items.sort(key=_item_ts)
+    return iter(items)
+
+def open_recording(path, patient_id=None, from_ms=None, to_ms=None):
+    """
+    Open a recording for replay: a .csv export, or otherwise a sensor_data database.
+
+    Returns:
+        iterator: (device_id, patient_id, Reading) tuples ordered by capture time.
+
+    Raises:
+        ValueError: If there is no recording at path or it cannot be replayed.
+    """
+    if not os.path.isfile(path):
+        raise ValueError(f"No recording at {path}.")
+    if path.lower().endswith(".csv"):
+        return read_csv_stream(path, patient_id, from_ms, to_ms)
+    return read_database_stream(path, patient_id, from_ms, to_ms)
+
+class ReplayClock:
+    """Recorded time a replay has reached, in epoch milliseconds; never moves backwards."""
+
+    def __init__(self, start_ms=0):
+        self._now_ms = start_ms
+
+    def now_ms(self):
+        return self._now_ms
+
+    def advance(self, ts_ms):
+        if ts_ms > self._now_ms:
+            self._now_ms = ts_ms
+
+class ReplayStats:
+    """Progress of a replay and how far the caller fell behind its schedule."""
+    __slots__ = ("readings", "ticks", "total_lag_ms", "max_lag_ms", "first_ts", "last_ts", "started_at",
+                 "finished_at")
+
+    def __init__(self):
+        self.readings = 0
+        self.ticks = 0
+        self.total_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.first_ts = None
+        self.last_ts = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def as_dict(self):
+        wall_seconds = (self.finished_at or time.monotonic()) - self.started_at
+        recorded_seconds = (self.last_ts - self.first_ts) / 1000 if self.readings else 0.0
+        return {
+            "readings": self.readings,
+            "ticks": self.ticks,
+            "recorded_seconds": round(recorded_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "readings_per_s": round(self.readings / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+            "speedup": round(recorded_seconds / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+            "mean_lag_ms": round(self.total_lag_ms / self.ticks, 3) if self.ticks else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 3)
+        }
+
+class ReplayChannel:
+    """A recorded device/patient stream, with the SensorChannel attributes the agent uses."""
+
+    def __init__(self, device_id, patient_id):
+        self.device_id = device_id
+        self.patient_id = patient_id
+        self.stats = ChannelStats()
+        self._readings_total = READINGS_TOTAL.labels(self.name)
+
+    @property
+    def name(self):
+        return f"{self.device_id}/{self.patient_id}"
+
+class ReplayHub:
+    def __init__(self, stream, clock=None, speed=1.0, tick_ms=REPLAY_TICK_MS):
+        """
+        Args:
+            stream (iterable): (device_id, patient_id, Reading) tuples ordered by capture
+                time, as returned by open_recording.
+            clock (ReplayClock): Advanced to the end of each released tick; give the same
+                clock to the TrendWindow. Defaults to a new clock.
+            speed (float): Recorded seconds replayed per wall second; 0 is unthrottled.
+            tick_ms (int): Recorded time released per tick.
+
+        Raises:
+            ValueError: If speed is negative or tick_ms is not positive.
+        """
+        if speed < 0:
+            raise ValueError(f"Replay speed must be 0 (unthrottled) or positive, not {speed}.")
+        if tick_ms <= 0:
+            raise ValueError(f"Replay tick must be positive, not {tick_ms} ms.")
+        self.clock = clock or ReplayClock()
+        self.speed = speed
+        self.tick_ms = tick_ms
+        self.channels = []
+        self.replay_stats = ReplayStats()
+        self.finished = False
+        self._stream = iter(stream)
+        self._channels = {}  # (device_id, patient_id) -> ReplayChannel
+        self._next = None  # First item not released yet
+        self._origin_ms = None  # Recorded start of the tick grid
+        self._tick_end = None  # Exclusive recorded end of the next tick
+        self._started_at = None  # time.monotonic() when the first tick started
+
+    def start(self):
+        """Read the first reading and start the replay's schedule."""
+        self.replay_stats = ReplayStats()
+        self._started_at = self.replay_stats.started_at
+        self._next = next(self._stream, None)
+        if self._next is None:
+            self._finish()
+            log_info("Replay recording is empty.")
+            return
+        first_ts = _item_ts(self._next)
+        self._origin_ms = first_ts - first_ts % self.tick_ms
+        self._tick_end = self._origin_ms + self.tick_ms
+        self.clock.advance(self._origin_ms)
+        log_info(f"Replay started at {f'{self.speed}x' if self.speed else 'full'} speed.")
+
+    def stop(self):
+        """Release the recording, closing any database connections it holds."""
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+    def patient_ids(self):
+        return sorted({channel.patient_id for channel in self.channels})
+
+    def collect_due_batches(self, now=None):
+        """
+        Release the next tick of the recording if it is due.
+
+        Args:
+            now (float): time.monotonic() to judge the schedule by; defaults to now.
+
+        Returns:
+            list: (channel, batch) tuples, one per channel with readings in the tick.
+        """
+        if self.finished:
+            return []
+        lag_ms = 0.0
+        if self.speed:
+            now = time.monotonic() if now is None else now
+            due = self._due_at(self._tick_end)
+            if now < due:
+                return []
+            lag_ms = (now - due) * 1000
+
+        batches = {}
+        item = self._next
+        while item is not None and _item_ts(item) < self._tick_end:
+            device_id, patient_id, reading = item
+            batch = batches.get((device_id, patient_id))
+            if batch is None:
+                batch = batches[(device_id, patient_id)] = ReadingBatch()
+            batch.append(reading)
+            item = next(self._stream, None)
+        self._next = item
+        self.clock.advance(self._tick_end)
+        self._record_tick(batches.values(), lag_ms)
+
+        if item is None:
+            self._finish()
+        else:
+            # Skip ticks with nothing recorded; when paced, the gap still takes its wall time
+            next_ts = _item_ts(item)
+            self._tick_end = next_ts - next_ts % self.tick_ms + self.tick_ms
+
+        collected = []
+        for (device_id, patient_id), batch in batches.items():
+            channel = self._channel(device_id, patient_id)
+            channel.stats.readings += len(batch)
+            channel._readings_total.inc(len(batch))
+            collected.append((channel, batch))
+        return collected
+
+    def seconds_until_due(self, cap=LOOP_INTERVAL_SECONDS):
+        """Time until the next tick is due, capped at cap seconds; 0 when unthrottled."""
+        if self.finished:
+            return cap
+        if not self.speed:
+            return 0.0
+        return max(0.0, min(cap, self._due_at(self._tick_end) - time.monotonic()))
+
+    def stats(self):
+        """Return a dict of per-channel counters keyed by channel name."""
+        return {channel.name: channel.stats.as_dict() for channel in self.channels}
+
+    def _due_at(self, tick_end):
+        """Wall time (time.monotonic()) at which the tick ending at tick_end is due."""
+        return self._started_at + (tick_end - self._origin_ms) / 1000 / self.speed
+
+    def _channel(self, device_id, patient_id):
+        channel = self._channels.get((device_id, patient_id))
+        if channel is None:
+            channel = self._channels[(device_id, patient_id)] = ReplayChannel(device_id, patient_id)
+            self.channels.append(channel)
+        return channel
+
+    def _record_tick(self, batches, lag_ms):
+        stats = self.replay_stats
+        stats.ticks += 1
+        stats.total_lag_ms += lag_ms
+        stats.max_lag_ms = max(stats.max_lag_ms, lag_ms)
+        for batch in batches:
+            stats.readings += len(batch)
+            if stats.first_ts is None or batch.ts[0] < stats.first_ts:
+                stats.first_ts = batch.ts[0]
+            if stats.last_ts is None or batch.ts[-1] > stats.last_ts:
+                stats.last_ts = batch.ts[-1]
+
+    def _finish(self):
+        self.finished = True
+        self.replay_stats.finished_at = time.monotonic()
@@ -2,19 +2,90 @@
 sensor_interface.py
 Defines abstract interfaces for sensors, which can be implemented as real or mocked sensors.
 For now, implement mock classes that simulate the data generation pattern of actual sensors.
+
+Waveform mode:
+A WaveformSensor samples a signal such as ECG or PPG at hundreds of Hz. Each read_data
+call returns a WaveformBlock with every sample since the previous call, instead of one
+reading, so the scheduler polls it at the block rate (sample_rate_hz) while the signal
+itself runs at waveform_rate_hz. Scalars the sensor derives from the block, such as the
+heart rate, travel with it and are stored as ordinary readings.
 """
 from abc import ABC, abstractmethod
+from array import array
+import math
 import random, datetime
+from src.data_collection.waveform import WaveformBlock, estimate_heart_rate
+from src.utils.timestamps import utc_now_epoch_ms
 
 class SensorInterface(ABC):
+    # Name used for scheduling and stats, and default polling frequency in Hz;
+    # the acquisition scheduler can override the rate per registration.
+    name = "sensor"
+    sample_rate_hz = 1.0
+
     @abstractmethod
     def read_data(self):
         pass
 
 class MockHeartRateSensor(SensorInterface):
+    name = "heart_rate"
+
     def read_data(self):
         return {"heart_rate": random.uniform(60, 100), "timestamp": datetime.datetime.utcnow().isoformat() + "Z"}
 
 class MockTemperatureSensor(SensorInterface):
+    name = "temperature"
+    sample_rate_hz = 0.1
+
     def read_data(self):
         return {"temperature": random.uniform(36.5, 37.5), "timestamp": datetime.datetime.utcnow().isoformat() + "Z"}
+
+class WaveformSensor(SensorInterface):
+    # Signal name, samples per second of the signal, and quantization step used for storage
+    signal = "waveform"
+    waveform_rate_hz = 250.0
+    resolution = 1.0
+
+    @abstractmethod
+    def read_data(self):
+        """Return a WaveformBlock with the samples captured since the previous call."""
+
+class MockEcgSensor(WaveformSensor):
+    name = "ecg"
+    signal = "ecg"
+    sample_rate_hz = 1.0  # One block per second
+    waveform_rate_hz = 250.0
+    resolution = 0.001  # mV; ECG front ends resolve a few microvolts
+    heart_rate_window_seconds = 5  # Recent signal the heart rate is estimated over
+
+    def __init__(self, heart_rate=72):
+        self.heart_rate = heart_rate
+        self._next_start_ts = None
+        self._phase = 0.0  # Seconds into the current beat
+        self._recent = array("d")  # Last heart_rate_window_seconds of samples
+
+    def read_data(self):
+        now = utc_now_epoch_ms()
+        start_ts = self._next_start_ts if self._next_start_ts is not None else now - 1000
+        count = max(1, round((now - start_ts) * self.waveform_rate_hz / 1000))
+        self.heart_rate = min(110, max(55, self.heart_rate + random.uniform(-2, 2)))
+        period = 60 / self.heart_rate
+        samples = []
+        for _ in range(count):
+            # P wave, QRS spike and T wave as Gaussian bumps, plus noise
+            t = self._phase
+            samples.append(
+                0.1 * math.exp(-((t - 0.1) / 0.025) ** 2)
+                + 1.2 * math.exp(-((t - 0.25) / 0.01) ** 2)
+                + 0.3 * math.exp(-((t - 0.5) / 0.04) ** 2)
+                + random.gauss(0, 0.01)
+            )
+            self._phase = (t + 1 / self.waveform_rate_hz) % period
+        block = WaveformBlock(self.signal, start_ts, self.waveform_rate_hz, samples, self.resolution)
+        self._next_start_ts = block.end_ts
+        self._recent.extend(block.samples)
+        del self._recent[:-int(self.heart_rate_window_seconds * self.waveform_rate_hz)]
+        heart_rate = estimate_heart_rate(self._recent, self.waveform_rate_hz)
+        if heart_rate is not None:
+            block.derived = {"heart_rate": round(heart_rate, 1)}
+        return block
@@ -10,44 +10,106 @@ MockHeartRateSensor: Generates a random heart rate within a realistic range for
 
 The SensorManager includes the collect_from_sensors method, which uses MockTemperatureSensor
 and MockHeartRateSensor to produce sensor-like data.
+
+For per-sensor polling frequencies, start_scheduled_acquisition registers SensorInterface
+sensors with an AcquisitionScheduler, and collect_scheduled returns whatever they produced.
+The scheduler and sensor interface modules are only imported when scheduled acquisition
+is started, so agents that never use it do not pay for them at startup.
+
+Readings are returned as compact Reading objects stamped with their capture time.
+Waveform sensors (WAVEFORM_ENABLED) produce sample blocks; collect_scheduled returns the
+scalars derived from them and collect_waveforms the blocks themselves.
 """
 import random
 from src.data_collection.mock_sensors import MockTemperatureSensor, MockHeartRateSensor
-from src.utils.logger import log_info, log_error
+from src.data_collection.reading import Reading
+from src.data_collection.waveform import WaveformBlock
+from src.utils.config import SENSOR_POLL_RATES_HZ, WAVEFORM_ENABLED
+from src.utils.logger import log_sampled, log_error
 
 class SensorManager:
     def __init__(self, use_synthetic=False):
         self.use_synthetic = use_synthetic
         self.temp_sensor = MockTemperatureSensor()
         self.heart_rate_sensor = MockHeartRateSensor()
+        self.scheduler = None
+        self._waveforms = []  # WaveformBlocks drained by collect_scheduled, not yet collected
 
     def collect_data(self):
-        """Collect data from sensors or synthetic data."""
+        """Collect a Reading from sensors or synthetic data, or None if collection failed."""
         try:
             if self.use_synthetic:
                 return self.generate_synthetic_data()
-            log_info("Collecting data from actual sensors.")
+            log_sampled("sensor-read", "Collecting data from actual sensors.")
             return self.collect_from_sensors()
         except Exception as e:
             log_error(f"Error collecting data: {e}")
-            return {}
+            return None
 
     def collect_from_sensors(self):
         """Collect data from mock sensors for testing."""
-        data = {
-            "temperature": self.temp_sensor.read_temperature(),
-            "heart_rate": self.heart_rate_sensor.read_heart_rate(),
-            "oxygen_level": None  # Placeholder; add mock or actual data for oxygen level
-        }
-        log_info(f"Collected data from sensors: {data}")
+        data = Reading(
+            temperature=self.temp_sensor.read_temperature(),
+            heart_rate=self.heart_rate_sensor.read_heart_rate(),
+            oxygen_level=None  # Placeholder; add mock or actual data for oxygen level
+        )
+        log_sampled("sensor-data", lambda: f"Collected data from sensors: {data}")
         return data
 
     def generate_synthetic_data(self):
         """Generate synthetic sensor data."""
-        data = {
-            "heart_rate": random.randint(60, 100),
-            "temperature": round(random.uniform(36.5, 37.5), 1),
-            "oxygen_level": random.randint(90, 100)
-        }
-        log_info(f"Synthetic data generated: {data}")
+        data = Reading(
+            heart_rate=random.randint(60, 100),
+            temperature=round(random.uniform(36.5, 37.5), 1),
+            oxygen_level=random.randint(90, 100)
+        )
+        log_sampled("sensor-data", lambda: f"Synthetic data generated: {data}")
         return data
+
+    def start_scheduled_acquisition(self, sensors=None, rates_hz=SENSOR_POLL_RATES_HZ):
+        """
+        Poll each sensor on its own schedule in the background.
+
+        Args:
+            sensors (list): SensorInterface instances; defaults to the mock interface sensors.
+            rates_hz (dict): Polling frequency per sensor name, overriding sensor defaults.
+        """
+        # Imported here so agents that never schedule sensors do not load the scheduler
+        from src.data_collection import sensor_interface
+        from src.data_collection.acquisition_scheduler import AcquisitionScheduler
+
+        if sensors is None:
+            # With waveforms on, the heart rate comes from the ECG instead of its own sensor
+            heart_rate_sensor = sensor_interface.MockEcgSensor() if WAVEFORM_ENABLED else sensor_interface.MockHeartRateSensor()
+            sensors = [heart_rate_sensor, sensor_interface.MockTemperatureSensor()]
+        self.scheduler = AcquisitionScheduler()
+        for sensor in sensors:
+            self.scheduler.register(sensor, rate_hz=rates_hz.get(sensor.name))
+        self.scheduler.start()
+
+    def collect_scheduled(self):
+        """
+        Return the readings produced by the scheduler since the last call.
+
+        Waveform blocks are set aside for collect_waveforms; the scalars derived from each
+        block are returned as a reading stamped with the block's end time.
+        """
+        readings = []
+        for _, reading in self.scheduler.drain():
+            if isinstance(reading, WaveformBlock):
+                self._waveforms.append(reading)
+                if reading.derived:
+                    readings.append(Reading(reading.end_ts, **reading.derived))
+            else:
+                readings.append(reading)
+        return readings
+
+    def collect_waveforms(self):
+        """Return the waveform blocks set aside by collect_scheduled since the last call."""
+        waveforms, self._waveforms = self._waveforms, []
+        return waveforms
+
+    def stop(self):
+        """Stop scheduled acquisition if it is running."""
+        if self.scheduler is not None:
+            self.scheduler.stop()
@@ -0,0 +1,101 @@
+"""
+waveform.py
+Blocks of high-frequency samples (ECG, PPG) and the scalars derived from them.
+
+A WaveformBlock is a run of evenly spaced samples of one signal: the capture time of the
+first sample, the sample rate, and the samples in an array.array of doubles. Sample i was
+captured at start_ts + i * 1000 / sample_rate_hz, and end_ts is the time just after the
+last sample, so consecutive blocks of one sensor line up end to start.
+
+A block may carry derived scalars, such as a heart rate estimated from the ECG. These are
+stored as an ordinary reading in sensor_data, while the samples themselves go to the
+waveform_chunks table (DatabaseManager.save_waveform).
+"""
+from array import array
+import math
+
+class WaveformBlock:
+    __slots__ = ("signal", "start_ts", "sample_rate_hz", "samples", "resolution", "derived")
+
+    def __init__(self, signal, start_ts, sample_rate_hz, samples, resolution=1.0, derived=None):
+        """
+        Args:
+            signal (str): Signal name, e.g. "ecg".
+            start_ts (int): Capture time of the first sample in epoch milliseconds.
+            sample_rate_hz (float): Samples per second.
+            samples (iterable): Sample values, oldest first.
+            resolution (float): Smallest step worth keeping; samples are stored as
+                multiples of it.
+            derived (dict): Reading fields computed from the block, e.g. {"heart_rate": 72}.
+        """
+        self.signal = signal
+        self.start_ts = start_ts
+        self.sample_rate_hz = sample_rate_hz
+        self.samples = samples if isinstance(samples, array) else array("d", samples)
+        self.resolution = resolution
+        self.derived = derived
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def end_ts(self):
+        """Epoch ms just after the last sample."""
+        return self.start_ts + round(len(self.samples) * 1000 / self.sample_rate_hz)
+
+    def sample_ts(self, index):
+        """Capture time of one sample in epoch milliseconds."""
+        return self.start_ts + round(index * 1000 / self.sample_rate_hz)
+
+    def split(self, max_samples):
+        """Cut the block into consecutive blocks of at most max_samples samples."""
+        if len(self.samples) <= max_samples:
+            return [self]
+        return [
+            WaveformBlock(self.signal, self.sample_ts(offset), self.sample_rate_hz,
+                          self.samples[offset:offset + max_samples], self.resolution)
+            for offset in range(0, len(self.samples), max_samples)
+        ]
+
+    def slice_time(self, from_ms, to_ms):
+        """Return the part of the block captured in [from_ms, to_ms)."""
+        first = max(0, math.ceil((from_ms - self.start_ts) * self.sample_rate_hz / 1000))
+        last = min(len(self.samples), math.ceil((to_ms - self.start_ts) * self.sample_rate_hz / 1000))
+        if first == 0 and last == len(self.samples):
+            return self
+        return WaveformBlock(self.signal, self.sample_ts(first), self.sample_rate_hz,
+                             self.samples[first:max(first, last)], self.resolution)
+
+    def __repr__(self):
+        return (f"WaveformBlock({self.signal!r}, start_ts={self.start_ts}, "
+                f"sample_rate_hz={self.sample_rate_hz}, samples={len(self.samples)})")
+
+def estimate_heart_rate(samples, sample_rate_hz, refractory_seconds=0.25):
+    """
+    Estimate the heart rate from R peaks in an ECG block.
+
+    A peak is an upward crossing of a threshold 60% of the way from the mean to the
+    maximum, at least refractory_seconds after the previous peak.
+
+    Args:
+        samples (sequence): ECG samples, oldest first.
+        sample_rate_hz (float): Samples per second.
+        refractory_seconds (float): Minimum time between two beats.
+
+    Returns:
+        float: Beats per minute, or None if fewer than two beats were found.
+    """
+    if len(samples) < 2:
+        return None
+    mean = math.fsum(samples) / len(samples)
+    threshold = mean + 0.6 * (max(samples) - mean)
+    refractory = int(refractory_seconds * sample_rate_hz)
+    peaks = []
+    previous = samples[0]
+    for index, value in enumerate(samples):
+        if previous < threshold <= value and (not peaks or index - peaks[-1] >= refractory):
+            peaks.append(index)
+        previous = value
+    if len(peaks) < 2:
+        return None
+    return 60 * sample_rate_hz * (len(peaks) - 1) / (peaks[-1] - peaks[0])
@@ -0,0 +1,237 @@
+"""
+alert_rules.py
+Table-driven alert rule engine that replaces the hard-coded checks in check_alert_conditions.
+
+Rules:
+Each rule in ALERT_RULES names a metric, a comparison and a threshold, plus optional
+hysteresis (clear_threshold), debounce (consecutive breaching readings) and duration (how
+long the breach must last). ALERT_RULE_OVERRIDES replaces fields per patient, so patient
+thresholds change in config instead of code.
+
+Compilation:
+Rules are compiled once per patient into a flat table keyed by metric, with the comparison
+resolved to an operator function. Evaluating a reading is a single pass over its metrics
+that looks up only the rules for the metrics present, and returns every alert that fired.
+
+Dedupe:
+A rule fires once when it becomes active and stays quiet while the breach continues. It is
+re-armed only after the value crosses back over the clear threshold, and an alert that is
+still active is repeated at most every ALERT_RENOTIFY_SECONDS.
+
+Conditions:
+Trend and vector analytics report conditions over a window rather than readings, and
+report them again on every run while they hold. evaluate_conditions puts them through the
+same state: a condition fires when it starts holding, repeats every ALERT_RENOTIFY_SECONDS
+while it holds, and re-arms once a run of its source no longer reports it.
+"""
+import operator
+from src.utils.config import ALERT_RULES, ALERT_RULE_OVERRIDES, ALERT_RENOTIFY_SECONDS
+from src.data_collection.reading import reading_ts_ms, READING_FIELDS
+
+COMPARATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+# Comparison that tells whether a value is back on the safe side of the clear threshold
+CLEAR_COMPARATORS = {">": operator.le, ">=": operator.lt, "<": operator.ge, "<=": operator.gt}
+
+class CompiledRule:
+    """One rule with its comparison functions resolved."""
+    __slots__ = ("name", "metric", "breached", "cleared", "threshold", "clear_threshold",
+                 "debounce", "duration_ms")
+
+    def __init__(self, rule):
+        op = rule.get("op", ">")
+        if op not in COMPARATORS:
+            raise ValueError(f"Alert rule '{rule.get('name')}' has unknown comparison '{op}'.")
+        self.name = rule["name"]
+        self.metric = rule["metric"]
+        self.breached = COMPARATORS[op]
+        self.cleared = CLEAR_COMPARATORS[op]
+        self.threshold = rule["threshold"]
+        self.clear_threshold = rule.get("clear_threshold", self.threshold)
+        self.debounce = max(1, rule.get("debounce", 1))
+        self.duration_ms = int(rule.get("duration_seconds", 0) * 1000)
+
+class RuleState:
+    """Per-patient progress of one rule."""
+    __slots__ = ("active", "streak", "breach_started_ms", "last_fired_ms")
+
+    def __init__(self):
+        self.active = False
+        self.streak = 0
+        self.breach_started_ms = None
+        self.last_fired_ms = None
+
+def compile_rules(rules, overrides=None):
+    """
+    Compile rule dicts into a table keyed by metric.
+
+    Args:
+        rules (list): Rule dicts as in ALERT_RULES.
+        overrides (dict): Rule name -> fields that replace the rule's own.
+
+    Returns:
+        dict: metric -> tuple of CompiledRule.
+    """
+    overrides = overrides or {}
+    table = {}
+    for rule in rules:
+        compiled = CompiledRule({**rule, **overrides.get(rule["name"], {})})
+        table.setdefault(compiled.metric, []).append(compiled)
+    return {metric: tuple(compiled) for metric, compiled in table.items()}
+
+class AlertRuleEngine:
+    def __init__(self, rules=ALERT_RULES, overrides=ALERT_RULE_OVERRIDES, renotify_seconds=ALERT_RENOTIFY_SECONDS):
+        """
+        Args:
+            rules (list): Rule dicts with name, metric, op, threshold and optional
+                clear_threshold, debounce and duration_seconds.
+            overrides (dict): patient_id -> {rule name: fields to override}.
+            renotify_seconds (float): Repeat an alert that is still active after this long;
+                None never repeats it.
+        """
+        self.rules = rules
+        self.overrides = overrides
+        self.renotify_ms = renotify_seconds * 1000 if renotify_seconds is not None else None
+        self._default_table = compile_rules(rules)
+        self._tables = {}  # patient_id -> compiled table, for patients with overrides
+        self._states = {}  # (patient_id, rule name) -> RuleState
+        self._conditions = {}  # (patient_id, source) -> names of the conditions it has reported
+
+    def table_for(self, patient_id):
+        """Return the compiled rule table for a patient, compiling overrides on first use."""
+        if patient_id not in self.overrides:
+            return self._default_table
+        table = self._tables.get(patient_id)
+        if table is None:
+            table = compile_rules(self.rules, self.overrides[patient_id])
+            self._tables[patient_id] = table
+        return table
+
+    def evaluate(self, patient_id, sensor_data, ts_ms=None):
+        """
+        Evaluate a reading against every rule for its metrics.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            sensor_data (dict): Reading to check.
+            ts_ms (int): Capture time in epoch milliseconds; defaults to the reading's
+                timestamp, or now if it has none.
+
+        Returns:
+            list: Names of the alerts that fired on this reading, in rule order per metric.
+        """
+        if ts_ms is None:
+            ts_ms = reading_ts_ms(sensor_data)
+        table = self.table_for(patient_id)
+        fired = []
+        for metric, value in sensor_data.items():
+            rules = table.get(metric)
+            if not rules or value is None:
+                continue
+            for rule in rules:
+                state = self._states.get((patient_id, rule.name))
+                if state is None:
+                    state = self._states[(patient_id, rule.name)] = RuleState()
+                if self._step(rule, state, value, ts_ms):
+                    fired.append(rule.name)
+        return fired
+
+    def evaluate_batch(self, patient_id, batch):
+        """
+        Evaluate every reading of a ReadingBatch, column by column.
+
+        Each rule only reads its own metric, so walking one column at a time gives the same
+        result as evaluating the readings one after another.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            batch (ReadingBatch): Readings to check, oldest first.
+
+        Returns:
+            list: (index in the batch, alert name) for every alert that fired, in batch order.
+        """
+        table = self.table_for(patient_id)
+        fired = []
+        for metric, rules in table.items():
+            if metric not in READING_FIELDS:
+                continue
+            states = []
+            for rule in rules:
+                state = self._states.get((patient_id, rule.name))
+                if state is None:
+                    state = self._states[(patient_id, rule.name)] = RuleState()
+                states.append((rule, state))
+            for index, (ts_ms, value) in enumerate(zip(batch.ts, batch.column(metric))):
+                if value != value:
+                    continue  # NaN: metric not read
+                for rule, state in states:
+                    if self._step(rule, state, value, ts_ms):
+                        fired.append((index, rule.name))
+        fired.sort(key=lambda item: item[0])
+        return fired
+
+    def evaluate_conditions(self, patient_id, source, conditions, ts_ms):
+        """
+        Dedupe the conditions one run of a detector reported for a patient.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            source (str): Detector that ran, e.g. "trend" or "vector". Conditions it
+                reported before and not in this run are cleared.
+            conditions (dict): Condition name -> alert message, for every condition that
+                holds now. Names must be stable between runs; messages may change.
+            ts_ms (int): Capture time of the newest reading the detector saw.
+
+        Returns:
+            list: Messages of the conditions that started holding or are due a renotify.
+        """
+        # A cleared condition drops its state, so names that stop being reported do not pile up
+        for name in self._conditions.pop((patient_id, source), set()).difference(conditions):
+            self._states.pop((patient_id, f"{source}:{name}"), None)
+        if conditions:
+            self._conditions[(patient_id, source)] = set(conditions)
+
+        fired = []
+        for name, message in conditions.items():
+            state = self._states.get((patient_id, f"{source}:{name}"))
+            if state is None:
+                state = self._states[(patient_id, f"{source}:{name}")] = RuleState()
+            state.streak += 1
+            if state.breach_started_ms is None:
+                state.breach_started_ms = ts_ms
+            if not state.active:
+                state.active = True
+            elif self.renotify_ms is None or ts_ms - state.last_fired_ms < self.renotify_ms:
+                continue
+            state.last_fired_ms = ts_ms
+            fired.append(message)
+        return fired
+
+    def _step(self, rule, state, value, ts_ms):
+        """Advance one rule's state with a new value. Returns True if the alert fires."""
+        if rule.breached(value, rule.threshold):
+            state.streak += 1
+            if state.breach_started_ms is None:
+                state.breach_started_ms = ts_ms
+        elif not state.active or rule.cleared(value, rule.clear_threshold):
+            # Below the threshold; an active alert only re-arms past the clear threshold
+            state.active = False
+            state.streak = 0
+            state.breach_started_ms = None
+            return False
+
+        if state.active:
+            if self.renotify_ms is not None and ts_ms - state.last_fired_ms >= self.renotify_ms:
+                state.last_fired_ms = ts_ms
+                return True
+            return False
+
+        if state.streak >= rule.debounce and ts_ms - state.breach_started_ms >= rule.duration_ms:
+            state.active = True
+            state.last_fired_ms = ts_ms
+            return True
+        return False
+
+    def active_alerts(self, patient_id):
+        """Names of the patient's alerts that are currently active."""
+        return [name for (pid, name), state in self._states.items() if pid == patient_id and state.active]
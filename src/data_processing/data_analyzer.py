@@ -4,7 +4,8 @@ Processes data in a sliding window to detect thresholds, triggering alerts if ne
 Explanation of analyze_recent_trends
 
 Database Query:
-Fetches recent records (within time_window_minutes) from the SQLite database.
+Fetches recent records (within time_window_minutes before now_ms, the current time by default)
+from the SQLite database.
 Only includes records with heart rate and temperature values, ordered by timestamp.
 
 Trend Analysis:
@@ -13,30 +14,45 @@ Average Threshold Check: Examines the average heart rate in the recent records,
 
 Helper Function - is_increasing_trend():
 Determines whether a list of values shows a strictly increasing trend, meaning each value is greater than the previous.
+
+Long windows - analyze_long_term_trends():
+Applies the same rules to hourly bucket means read through DatabaseManager.fetch_rollups,
+so windows of days stay cheap after raw rows have been compacted by retention.
 """
 import sqlite3
-from datetime import datetime, timedelta
 from statistics import mean
+from src.utils.timestamps import utc_now_epoch_ms
+from src.utils.config import HIGH_HEART_RATE, HIGH_TEMPERATURE, LOW_OXYGEN_LEVEL, ELEVATED_AVG_HEART_RATE
 
 # Alert conditions function from previous code
 def check_alert_conditions(sensor_data):
-    """Check if any individual sensor reading crosses alert thresholds."""
-    if sensor_data.get("heart_rate") and sensor_data["heart_rate"] > 120:
+    """
+    Check if any individual sensor reading crosses alert thresholds.
+
+    Stateless and first-match only; the main loop and pipeline use AlertRuleEngine instead.
+    """
+    if sensor_data.get("heart_rate") and sensor_data["heart_rate"] > HIGH_HEART_RATE:
         return "High heart rate alert"
-    if sensor_data.get("temperature") and sensor_data["temperature"] > 38.5:
+    if sensor_data.get("temperature") and sensor_data["temperature"] > HIGH_TEMPERATURE:
         return "High temperature alert"
-    if sensor_data.get("oxygen_level") and sensor_data["oxygen_level"] < 90:
+    if sensor_data.get("oxygen_level") and sensor_data["oxygen_level"] < LOW_OXYGEN_LEVEL:
         return "Low oxygen level alert"
     return None  # No alert
 
 # New function for time series analysis
-def analyze_recent_trends(db_path, time_window_minutes=5):
+def analyze_recent_trends(db_path, time_window_minutes=5, patient_id=None, now_ms=None):
     """
     Analyze recent trends in sensor data for potential alerts.
 
+    Reads through its own connection, so it only sees committed rows; a caller sharing the
+    database with a DatabaseManager should call its flush() first.
+
     Args:
         db_path (str): Path to the SQLite database file.
         time_window_minutes (int): The time window (in minutes) to look back for trend analysis.
+        patient_id (str): Restrict the analysis to one patient; None analyzes all records.
+        now_ms (int): End of the window in epoch milliseconds; defaults to now. A replay
+            passes its virtual clock's time.
 
     Returns:
         str: An alert message if a concerning trend is detected, else None.
@@ -45,16 +61,26 @@ def analyze_recent_trends(db_path, time_window_minutes=5):
     cursor = conn.cursor()
 
     # Calculate the time threshold for recent records
-    threshold_time = datetime.utcnow() - timedelta(minutes=time_window_minutes)
-
-    # Query recent data within the specified time window
-    cursor.execute("""
-        SELECT timestamp, heart_rate, temperature
-        FROM sensor_data
-        WHERE timestamp >= ?
-        ORDER BY timestamp DESC
-    """, (threshold_time.isoformat(),))
-    
+    if now_ms is None:
+        now_ms = utc_now_epoch_ms()
+    threshold_ms = now_ms - time_window_minutes * 60 * 1000
+
+    # Query recent data within the specified time window (served by idx_sensor_data_patient_ts)
+    if patient_id is None:
+        cursor.execute("""
+            SELECT timestamp, heart_rate, temperature
+            FROM sensor_data
+            WHERE ts >= ? AND ts <= ?
+            ORDER BY ts DESC
+        """, (threshold_ms, now_ms))
+    else:
+        cursor.execute("""
+            SELECT timestamp, heart_rate, temperature
+            FROM sensor_data
+            WHERE patient_id = ? AND ts >= ? AND ts <= ?
+            ORDER BY ts DESC
+        """, (patient_id, threshold_ms, now_ms))
+
     rows = cursor.fetchall()
     conn.close()
 
@@ -78,6 +104,38 @@ def analyze_recent_trends(db_path, time_window_minutes=5):
 
     return None  # No concerning trend detected
 
+def analyze_long_term_trends(db_manager, window_hours=24, patient_id=None, tier="hour"):
+    """
+    Analyze trends over a long window using rollup buckets instead of raw rows.
+
+    Args:
+        db_manager (DatabaseManager): Local store to read rollups from.
+        window_hours (float): How far back to look.
+        patient_id (str): Restrict the analysis to one patient; None analyzes all records.
+        tier (str): Bucket width, "hour" or "minute".
+
+    Returns:
+        str: An alert message if a concerning trend is detected, else None.
+    """
+    since_ms = utc_now_epoch_ms() - int(window_hours * 60 * 60 * 1000)
+    buckets = db_manager.fetch_rollups(tier, since_ms, patient_id)
+    heart_rates = [b["heart_rate"]["mean"] for b in buckets if b["heart_rate"]["count"]]
+    temperatures = [b["temperature"]["mean"] for b in buckets if b["temperature"]["count"]]
+
+    if is_increasing_trend(heart_rates):
+        return f"Rising {tier}ly heart rate trend over the last {window_hours} hours - potential concern."
+    if is_increasing_trend(temperatures):
+        return f"Rising {tier}ly temperature trend over the last {window_hours} hours - potential concern."
+
+    # Weight each bucket by its sample count so the average matches the raw readings
+    count = sum(b["heart_rate"]["count"] for b in buckets)
+    if count >= 3:
+        average = sum(b["heart_rate"]["mean"] * b["heart_rate"]["count"] for b in buckets if b["heart_rate"]["count"]) / count
+        if average > ELEVATED_AVG_HEART_RATE:
+            return f"Elevated average heart rate detected in the last {window_hours} hours."
+
+    return None
+
 def is_increasing_trend(values):
     """
     Check if there is a consistent upward trend in the list of values.
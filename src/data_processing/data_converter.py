@@ -1,21 +1,93 @@
 """
 data_converter.py
 Converts data to a JSON-compatible format for the backend, adding metadata like device ID, etc.
+
+The timestamp sent is the reading's capture time, normalized the same way SQLite stores
+it, so a record rebuilt from the backlog is identical to the one first sent. Stored
+records also carry an idempotency key built from the device ID, record ID and capture
+time; it stays the same across retries, so the backend can discard duplicates.
+
+All converters build records through backend_record, from a Reading or dict reading, a
+ReadingBatch's columns, or a stored row, without an intermediate dict.
 """
 # src/data_processing/data_converter.py
-from datetime import datetime
+from src.data_collection.reading import reading_ts_ms
 from src.utils.config import DEVICE_ID, PATIENT_ID
+from src.utils.timestamps import epoch_ms_to_iso
 
-def convert_to_backend_format(data, device_id=DEVICE_ID, patient_id=PATIENT_ID):
-    """Convert sensor data to match backend IoTDeviceData schema."""
-    # Extract individual data fields or use None if a field isn't available in the mock data
-    return {
+def idempotency_key(device_id, record_id, ts):
+    """
+    Build the stable key that identifies one stored reading to the backend.
+
+    Args:
+        device_id (str): Unique identifier for the device.
+        record_id (int): sensor_data row of the reading.
+        ts (int): Capture time in epoch milliseconds; tells readings apart if the local
+            database is ever recreated and record IDs start over.
+
+    Returns:
+        str: The idempotency key.
+    """
+    return f"{device_id}:{record_id}:{ts}"
+
+def backend_record(device_id, patient_id, ts, heart_rate=None, steps_count=None, calories_burned=None,
+                   oxygen_level=None, temperature=None, record_id=None):
+    """Build one IoTDeviceData record from field values; ts is the capture time in epoch ms."""
+    record = {
         "deviceId": device_id,
         "patientId": patient_id,
-        "timestamp": datetime.utcnow().isoformat() + "Z",  # UTC timestamp in ISO 8601 format
-        "heartRate": data.get("heart_rate"),
-        "stepsCount": data.get("steps_count"),
-        "caloriesBurned": data.get("calories_burned"),
-        "oxygenLevel": data.get("oxygen_level"),
-        "temperature": data.get("temperature")
+        "timestamp": epoch_ms_to_iso(ts),  # UTC capture time in ISO 8601 format
+        "heartRate": heart_rate,
+        "stepsCount": steps_count,
+        "caloriesBurned": calories_burned,
+        "oxygenLevel": oxygen_level,
+        "temperature": temperature
     }
+    if record_id is not None:
+        record["idempotencyKey"] = idempotency_key(device_id, record_id, ts)
+    return record
+
+def convert_to_backend_format(data, device_id=DEVICE_ID, patient_id=PATIENT_ID, record_id=None):
+    """Convert sensor data to match backend IoTDeviceData schema."""
+    # Keep the capture time; only readings that never had one are stamped now
+    # Fields that aren't available in the reading are sent as None
+    return backend_record(
+        device_id, patient_id, reading_ts_ms(data),
+        heart_rate=data.get("heart_rate"),
+        steps_count=data.get("steps_count"),
+        calories_burned=data.get("calories_burned"),
+        oxygen_level=data.get("oxygen_level"),
+        temperature=data.get("temperature"),
+        record_id=record_id
+    )
+
+def convert_batch_to_backend_format(batch, device_id=DEVICE_ID, patient_id=PATIENT_ID, record_ids=None,
+                                    indexes=None):
+    """
+    Convert the readings of a ReadingBatch straight from its columns.
+
+    Args:
+        batch (ReadingBatch): Readings to convert, oldest first.
+        device_id (str): Unique identifier for the device.
+        patient_id (str): Unique identifier for the patient.
+        record_ids (sequence): sensor_data row of each reading, as from save_batch.
+        indexes (sequence): Positions of the readings to convert, e.g. from
+            ReportFilter.select; None converts every reading.
+
+    Returns:
+        list: One backend record per converted reading, in batch order.
+    """
+    if record_ids is None:
+        record_ids = [None] * len(batch)
+    columns = zip(
+        batch.ts, batch.values("heart_rate"), batch.values("steps_count"), batch.values("calories_burned"),
+        batch.values("oxygen_level"), batch.values("temperature"), record_ids
+    )
+    if indexes is not None:
+        columns = list(columns)
+        columns = [columns[index] for index in indexes]
+    return [
+        backend_record(device_id, patient_id, ts, heart_rate, steps_count, calories_burned, oxygen_level,
+                       temperature, record_id)
+        for ts, heart_rate, steps_count, calories_burned, oxygen_level, temperature, record_id in columns
+    ]
@@ -1,12 +1,294 @@
 """
 database_manager.py
 Handles SQLite storage for data that needs to be stored locally for analysis or backup.
+
+Storage engine:
+A single long-lived connection is opened in WAL journal mode and shared by all methods.
+Inserts are group-committed: they run inside an open transaction that is committed once
+DB_GROUP_COMMIT_ROWS rows are pending or DB_GROUP_COMMIT_MS has passed, so one fsync covers
+many readings. Alert-bearing rows can be committed immediately with synchronous=FULL
+(DB_DURABLE_ALERTS). Statements use fixed SQL text so sqlite3's statement cache reuses
+the prepared statements. save_batch stores a whole ReadingBatch with one executemany fed
+straight from its columns.
+
+Visibility:
+Pending rows are visible to every method of this manager at once, since they all share its
+connection. Other connections (analyze_recent_trends, HistoryQuery, a second process) only
+see a row once its group is committed, up to DB_GROUP_COMMIT_MS later. In-process readers
+that need every stored row call flush() before opening their connection.
+
+Schema migrations:
+The schema version is kept in PRAGMA user_version. On startup every migration newer than
+the stored version runs once, in order, inside a transaction. Migration 1 adds the integer
+epoch-ms `ts` column used for time-range queries, back-fills it from the ISO `timestamp`
+text, and adds indexes for per-patient time ranges and for the unsent backlog. Migration 2
+adds the per-minute and per-hour rollup tables used by retention. Migration 3 adds the
+alerts table used by the alert fast lane.
+
+Retention and rollups:
+Rollup rows hold count, sum, min and max per metric for one patient and one time bucket,
+so buckets can be merged exactly. Sent raw rows older than the raw retention window are
+folded into minute buckets and deleted, and old minute buckets are folded into hour
+buckets. Each call handles one bounded chunk in its own short transaction, so the writer
+never waits long. fetch_rollups reads rollups and not-yet-compacted raw rows as one series.
+
+Transmission ledger:
+transmit_status moves each reading through 'unsent' (queued), 'in_flight' and 'sent'
+(acknowledged). A sender claims rows before posting them, so the live path and the
+backlog drainer never post the same row at the same time. Acknowledgements for a whole
+batch are written in one transaction and skip rows that are already 'sent'. Status changes
+join the group-commit transaction like inserts, so the live path does not pay one commit
+per reading; a status change lost in a crash at worst resends a row. Rows left
+'in_flight' by a crash, or claimed too long ago, are requeued; they are sent again with
+the same idempotency key, so the backend can drop the duplicate. Migration 4 adds the
+claim time and attempt count used by the ledger. Readings the report filter decides not to
+send are marked 'suppressed': they stay out of the backlog but are kept, and rolled up,
+like sent rows.
+
+Waveforms:
+High-frequency signals are not stored one row per sample. save_waveform splits a
+WaveformBlock into chunks of at most WAVEFORM_CHUNK_MAX_MS and stores each as one
+delta-encoded, compressed blob with its start time, end time and sample rate in the
+waveform_chunks table (migration 5). fetch_waveform reads a time range by decoding only the
+chunks that overlap it. Scalars derived from a waveform are ordinary sensor_data rows.
+
+Alert rows:
+Every insert sets alert_reading when the reading crosses HIGH_HEART_RATE, HIGH_TEMPERATURE
+or LOW_OXYGEN_LEVEL, as configured at the time it was stored (migration 6 back-fills older
+rows). The backlog's alert-first pass reads unsent alert rows through their own partial
+index instead of testing the thresholds on every unsent row.
 """
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
-from src.utils.logger import log_info, log_error
-from src.utils.config import DB_PATH
+from src.data_collection.reading import reading_ts_ms
+from src.data_collection.waveform import WaveformBlock
+from src.data_processing.waveform_codec import encode_samples, decode_samples, DELTA_ZLIB
+from src.utils.logger import log_info, log_error, log_sampled
+from src.utils.metrics import DB_INSERT_SECONDS, DB_COMMIT_SECONDS, RECORDS_SENT_TOTAL
+from src.utils.timestamps import iso_to_epoch_ms, epoch_ms_to_iso, utc_now_epoch_ms
+from src.utils.config import (
+    DB_PATH, HIGH_HEART_RATE, HIGH_TEMPERATURE, LOW_OXYGEN_LEVEL,
+    DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_GROUP_COMMIT_ROWS, DB_GROUP_COMMIT_MS, DB_DURABLE_ALERTS
+)
+
+# Matches rows whose readings cross an alert threshold; "IS 1" keeps NULL readings out.
+ALERT_ROW_CONDITION = "(heart_rate > ? OR temperature > ? OR oxygen_level < ?) IS 1"
+ALERT_ROW_PARAMS = (HIGH_HEART_RATE, HIGH_TEMPERATURE, LOW_OXYGEN_LEVEL)
+
+# Rows are passed in the 13 listed columns; alert_reading is derived from parameters 5-7
+# (heart_rate, temperature, oxygen_level) against the thresholds at insert time
+INSERT_SENSOR_DATA_SQL = f"""
+    INSERT INTO sensor_data (
+        device_id, patient_id, timestamp, ts, heart_rate, temperature, oxygen_level,
+        steps_count, calories_burned, battery_level, signal_strength, status, transmit_status,
+        alert_reading
+    ) VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13,
+              (?5 > {float(HIGH_HEART_RATE)} OR ?6 > {float(HIGH_TEMPERATURE)} OR ?7 < {float(LOW_OXYGEN_LEVEL)}) IS 1)
+"""
+
+def _migration_1_epoch_ts_and_indexes(conn):
+    """Add the epoch-ms ts column, back-fill it, and index time ranges and unsent rows."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sensor_data)")]
+    if "ts" not in columns:
+        conn.execute("ALTER TABLE sensor_data ADD COLUMN ts INTEGER")
+    conn.create_function("iso_to_epoch_ms", 1, iso_to_epoch_ms, deterministic=True)
+    conn.execute("UPDATE sensor_data SET ts = iso_to_epoch_ms(timestamp) WHERE ts IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_data_patient_ts ON sensor_data (patient_id, ts)")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sensor_data_unsent
+        ON sensor_data (id) WHERE transmit_status = 'unsent'
+    """)
+
+# Metrics kept in the rollup tables and the bucket width of each rollup tier
+ROLLUP_METRICS = ("heart_rate", "temperature", "oxygen_level")
+ROLLUP_TIERS = {"minute": 60 * 1000, "hour": 60 * 60 * 1000}
+
+def _rollup_columns():
+    """Rollup column names for every metric, in table order."""
+    return [f"{metric}_{part}" for metric in ROLLUP_METRICS for part in ("count", "sum", "min", "max")]
+
+def _migration_2_rollup_tables(conn):
+    """Create the per-minute and per-hour rollup tables."""
+    metric_columns = ", ".join(
+        f"{metric}_count INTEGER NOT NULL DEFAULT 0, {metric}_sum REAL, {metric}_min REAL, {metric}_max REAL"
+        for metric in ROLLUP_METRICS
+    )
+    for tier in ROLLUP_TIERS:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS sensor_rollup_{tier} (
+                patient_id TEXT NOT NULL,
+                bucket_ts INTEGER NOT NULL,
+                {metric_columns},
+                PRIMARY KEY (patient_id, bucket_ts)
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_sensor_rollup_{tier}_bucket ON sensor_rollup_{tier} (bucket_ts)")
+
+def _rollup_upsert_sql(tier):
+    """INSERT ... SELECT tail that merges new aggregates into existing buckets."""
+    merges = []
+    for metric in ROLLUP_METRICS:
+        merges += [
+            f"{metric}_count = {metric}_count + excluded.{metric}_count",
+            f"{metric}_sum = coalesce({metric}_sum, 0) + coalesce(excluded.{metric}_sum, 0)",
+            f"{metric}_min = min(coalesce({metric}_min, excluded.{metric}_min), coalesce(excluded.{metric}_min, {metric}_min))",
+            f"{metric}_max = max(coalesce({metric}_max, excluded.{metric}_max), coalesce(excluded.{metric}_max, {metric}_max))",
+        ]
+    return f"ON CONFLICT (patient_id, bucket_ts) DO UPDATE SET {', '.join(merges)}"
+
+# Aggregate expressions over raw rows, and over already rolled-up rows, in _rollup_columns order
+RAW_AGGREGATES = ", ".join(
+    f"count({m}), sum({m}), min({m}), max({m})" for m in ROLLUP_METRICS
+)
+ROLLUP_AGGREGATES = ", ".join(
+    f"sum({m}_count), sum({m}_sum), min({m}_min), max({m}_max)" for m in ROLLUP_METRICS
+)
+
+def _migration_3_alerts_table(conn):
+    """Create the alerts table and index its unsent rows."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            record_id INTEGER,                     -- sensor_data row that triggered the alert
+            alert_type TEXT NOT NULL,
+            priority INTEGER NOT NULL,             -- 0 is the most urgent
+            ts INTEGER NOT NULL,                   -- Capture time of the triggering reading, epoch ms
+            payload TEXT NOT NULL,                 -- Backend-formatted alert body as JSON
+            transmit_status TEXT DEFAULT 'unsent'
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_unsent ON alerts (priority, id) WHERE transmit_status = 'unsent'")
+
+def _migration_4_transmission_ledger(conn):
+    """Add the claim time and attempt count of the transmission ledger."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sensor_data)")]
+    if "tx_claimed_at" not in columns:
+        conn.execute("ALTER TABLE sensor_data ADD COLUMN tx_claimed_at INTEGER")  # Epoch ms of the last claim
+    if "tx_attempts" not in columns:
+        conn.execute("ALTER TABLE sensor_data ADD COLUMN tx_attempts INTEGER DEFAULT 0")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sensor_data_in_flight
+        ON sensor_data (tx_claimed_at) WHERE transmit_status = 'in_flight'
+    """)
+
+def _migration_5_waveform_chunks(conn):
+    """Create the waveform_chunks table and index it for range reads and retention."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS waveform_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            signal TEXT NOT NULL,                  -- Signal name, e.g. "ecg" or "ppg"
+            start_ts INTEGER NOT NULL,             -- Capture time of the first sample, epoch ms
+            end_ts INTEGER NOT NULL,               -- Time just after the last sample, epoch ms
+            sample_rate_hz REAL NOT NULL,
+            sample_count INTEGER NOT NULL,
+            resolution REAL NOT NULL,              -- Quantization step, in the signal's units
+            encoding TEXT NOT NULL,                -- Codec of data, see waveform_codec
+            data BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_waveform_chunks_range ON waveform_chunks (patient_id, signal, start_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_waveform_chunks_end ON waveform_chunks (end_ts)")
+
+def _migration_6_alert_reading_flag(conn):
+    """Flag alert-bearing readings and index the unsent ones for the backlog's alert pass."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sensor_data)")]
+    if "alert_reading" not in columns:
+        conn.execute("ALTER TABLE sensor_data ADD COLUMN alert_reading INTEGER NOT NULL DEFAULT 0")
+    conn.execute(f"UPDATE sensor_data SET alert_reading = 1 WHERE {ALERT_ROW_CONDITION}", ALERT_ROW_PARAMS)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sensor_data_unsent_alerts
+        ON sensor_data (id) WHERE transmit_status = 'unsent' AND alert_reading = 1
+    """)
+
+# Ordered schema migrations; migration N upgrades the database to user_version N.
+MIGRATIONS = [
+    _migration_1_epoch_ts_and_indexes,
+    _migration_2_rollup_tables,
+    _migration_3_alerts_table,
+    _migration_4_transmission_ledger,
+    _migration_5_waveform_chunks,
+    _migration_6_alert_reading_flag,
+]
+
+# Longest span one waveform chunk may cover. Blocks are split to fit, and range reads rely
+# on it to bound their index scan, so it must never be raised for an existing database.
+WAVEFORM_CHUNK_MAX_MS = 10 * 1000
+
+INSERT_WAVEFORM_CHUNK_SQL = """
+    INSERT INTO waveform_chunks (
+        device_id, patient_id, signal, start_ts, end_ts, sample_rate_hz, sample_count, resolution, encoding, data
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def bucket_series_sql(width_ms, from_ms, to_ms=None, patient_id=None, metrics=ROLLUP_METRICS):
+    """
+    Build a query for per-bucket aggregates over raw rows and every rollup tier that fits.
+
+    Raw rows are aggregated on the fly. A rollup tier is merged in when its bucket width
+    divides width_ms, so its buckets fall entirely inside one output bucket. Metrics
+    without rollups are aggregated from raw rows only.
+
+    Args:
+        width_ms (int): Output bucket width in milliseconds.
+        from_ms (int): Lower bound on the capture or bucket time; should be a multiple of width_ms.
+        to_ms (int): Exclusive upper bound; None leaves the range open.
+        patient_id (str): Restrict to one patient; None covers every patient.
+        metrics (sequence): sensor_data columns to aggregate.
+
+    Returns:
+        tuple: (query, params). Rows are (patient_id, bucket_ts, then count, sum, min and
+            max for each metric), ordered by bucket.
+    """
+    def bounds(column):
+        condition = f"{column} >= ?" + (f" AND {column} < ?" if to_ms is not None else "")
+        return condition + (" AND patient_id = ?" if patient_id is not None else "")
+
+    # The first UNION member names the columns for the outer query
+    aliased = ", ".join(
+        f"count({m}) AS c_{m}_count, sum({m}) AS c_{m}_sum, min({m}) AS c_{m}_min, max({m}) AS c_{m}_max"
+        for m in metrics
+    )
+    sources = [f"""
+        SELECT patient_id, ts / {width_ms} * {width_ms} AS bucket, {aliased}
+        FROM sensor_data WHERE {bounds("ts")} GROUP BY patient_id, bucket
+    """]
+    for tier, tier_width in ROLLUP_TIERS.items():
+        if width_ms % tier_width:
+            continue
+        aggregates = ", ".join(
+            f"sum({m}_count), sum({m}_sum), min({m}_min), max({m}_max)" if m in ROLLUP_METRICS
+            else "0, NULL, NULL, NULL"
+            for m in metrics
+        )
+        sources.append(f"""
+            SELECT patient_id, bucket_ts / {width_ms} * {width_ms} AS bucket, {aggregates}
+            FROM sensor_rollup_{tier} WHERE {bounds("bucket_ts")} GROUP BY patient_id, bucket
+        """)
+    query = f"""
+        SELECT patient_id, bucket, {", ".join(
+            f"sum(c_{m}_count), sum(c_{m}_sum), min(c_{m}_min), max(c_{m}_max)" for m in metrics
+        )}
+        FROM ({" UNION ALL ".join(sources)})
+        GROUP BY patient_id, bucket ORDER BY bucket
+    """
+    params = []
+    for _ in sources:
+        params.append(from_ms)
+        if to_ms is not None:
+            params.append(to_ms)
+        if patient_id is not None:
+            params.append(patient_id)
+    return query, params
+
+# Record IDs bound per IN (...) list, well under SQLite's host-parameter limit
+LEDGER_CHUNK_IDS = 500
 
 # class DatabaseManager:
 #     def __init__(self, db_path="/home/pi/vitaledge-pi-monitoring/sensor_data.db"):
@@ -18,11 +300,33 @@ from src.utils.config import DB_PATH
 #             log_error(f"Failed to connect to SQLite database: {e}")
 
 class DatabaseManager:
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, group_commit_rows=DB_GROUP_COMMIT_ROWS,
+                 group_commit_ms=DB_GROUP_COMMIT_MS, durable_alerts=DB_DURABLE_ALERTS):
         log_info(f"Local database path: {db_path}")
-        self.conn = sqlite3.connect(db_path)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.db_path = db_path
+        self.group_commit_rows = max(1, group_commit_rows)
+        self.group_commit_ms = group_commit_ms
+        self.durable_alerts = durable_alerts
+        self._lock = threading.RLock()
+        self._pending_rows = 0
+        self._first_pending_at = None
+        self._closed = threading.Event()
+        self._configure_connection()
         self._create_table_if_not_exists()
+        self._migrate()
+
+        self._flusher = None
+        if self.group_commit_rows > 1 and self.group_commit_ms > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="db-group-commit", daemon=True)
+            self._flusher.start()
+
+    def _configure_connection(self):
+        """Switch the connection to WAL mode and apply the storage pragmas."""
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        self.conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
 
     def create_tables(self):
         with self.conn:
@@ -50,52 +354,66 @@ class DatabaseManager:
 
     def _create_table_if_not_exists(self):
         """Ensure that the sensor_data table exists in the database with the updated schema."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sensor_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT NOT NULL,
-                patient_id TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                heart_rate REAL,
-                temperature REAL,
-                oxygen_level REAL,
-                steps_count REAL,
-                calories_burned REAL,
-                battery_level REAL,
-                signal_strength INTEGER,
-                status TEXT,
-                transmit_status TEXT DEFAULT 'unsent'
-            );
-        """)
-        conn.commit()
-        conn.close()
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sensor_data (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_id TEXT NOT NULL,
+                    patient_id TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    heart_rate REAL,
+                    temperature REAL,
+                    oxygen_level REAL,
+                    steps_count REAL,
+                    calories_burned REAL,
+                    battery_level REAL,
+                    signal_strength INTEGER,
+                    status TEXT,
+                    transmit_status TEXT DEFAULT 'unsent'
+                );
+                """)
+
+    def _migrate(self):
+        """Apply every schema migration newer than the database's user_version."""
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                try:
+                    with self.conn:
+                        migration(self.conn)
+                        self.conn.execute(f"PRAGMA user_version = {target}")
+                    log_info(f"SQLite schema migrated to version {target}.")
+                except sqlite3.Error as e:
+                    log_error(f"Schema migration to version {target} failed: {e}")
+                    raise
 
-    def save_data(self, device_id, patient_id, sensor_data):
+    def save_data(self, device_id, patient_id, sensor_data, durable=None):
         """
         Save sensor data to the SQLite database.
 
+        The insert joins the current group-commit transaction. It becomes visible to other
+        connections once the group is committed.
+
         Args:
             device_id (str): Unique identifier for the device.
             patient_id (str): Unique identifier for the patient.
-            sensor_data (dict): Dictionary of sensor data to store.
+            sensor_data (Reading or dict): Reading to store.
+            durable (bool): Commit this row immediately with synchronous=FULL. Defaults to
+                True for alert-bearing rows when durable_alerts is enabled.
 
         Returns:
             int: The ID of the inserted record.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if durable is None:
+            durable = self.durable_alerts and self._is_alert_reading(sensor_data)
 
-        cursor.execute("""
-            INSERT INTO sensor_data (
-                device_id, patient_id, timestamp, heart_rate, temperature, oxygen_level,
-                steps_count, calories_burned, battery_level, signal_strength, status, transmit_status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        # Normalize every stored timestamp to one ISO form and its epoch-ms twin
+        ts = reading_ts_ms(sensor_data)
+        values = (
             device_id,
             patient_id,
-            sensor_data.get("timestamp", datetime.utcnow().isoformat()),
+            epoch_ms_to_iso(ts),
+            ts,
             sensor_data.get("heart_rate"),
             sensor_data.get("temperature"),
             sensor_data.get("oxygen_level"),
@@ -105,13 +423,142 @@ class DatabaseManager:
             sensor_data.get("signal_strength"),
             sensor_data.get("status", "active"),
             "unsent"
-        ))
+        )
+
+        with self._lock:
+            if durable:
+                started = time.perf_counter()
+                record_id = self._save_durable(values)
+                DB_INSERT_SECONDS.labels("true").observe(time.perf_counter() - started)
+                return record_id
+
+            started = time.perf_counter()
+            record_id = self.conn.execute(INSERT_SENSOR_DATA_SQL, values).lastrowid
+            DB_INSERT_SECONDS.labels("false").observe(time.perf_counter() - started)
+            self._add_pending(1)
+            return record_id
 
-        record_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    def save_batch(self, device_id, patient_id, batch, durable=None):
+        """
+        Save every reading of a ReadingBatch with one executemany.
+
+        The rows join the current group-commit transaction, or are committed together with
+        synchronous=FULL when the batch holds an alert-bearing reading.
+
+        Args:
+            device_id (str): Unique identifier for the device.
+            patient_id (str): Unique identifier for the patient.
+            batch (ReadingBatch): Readings to store, oldest first.
+            durable (bool): Commit the batch immediately with synchronous=FULL. Defaults to
+                True for batches with an alert-bearing row when durable_alerts is enabled.
+
+        Returns:
+            range: The record IDs of the inserted rows, in batch order.
+        """
+        if not len(batch):
+            return range(0)
+        if durable is None:
+            durable = self.durable_alerts and self._is_alert_batch(batch)
+        rows = batch.rows(device_id, patient_id)
 
+        with self._lock:
+            started = time.perf_counter()
+            if durable:
+                self._commit()
+                self.conn.execute("PRAGMA synchronous=FULL")
+                try:
+                    with self.conn:
+                        self.conn.executemany(INSERT_SENSOR_DATA_SQL, rows)
+                        last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                finally:
+                    self.conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+            else:
+                self.conn.executemany(INSERT_SENSOR_DATA_SQL, rows)
+                last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self._add_pending(len(batch))
+            DB_INSERT_SECONDS.labels("true" if durable else "false").observe(time.perf_counter() - started)
+        # One writer inserts the batch under the lock, so its AUTOINCREMENT IDs are consecutive
+        return range(last_id - len(batch) + 1, last_id + 1)
+
+    def _save_durable(self, values):
+        """Commit pending rows, then insert and fsync one row with synchronous=FULL."""
+        self._commit()
+        self.conn.execute("PRAGMA synchronous=FULL")
+        try:
+            with self.conn:
+                record_id = self.conn.execute(INSERT_SENSOR_DATA_SQL, values).lastrowid
+        finally:
+            self.conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
         return record_id
+
+    @staticmethod
+    def _is_alert_reading(sensor_data):
+        """Check whether a reading crosses any alert threshold."""
+        heart_rate = sensor_data.get("heart_rate")
+        temperature = sensor_data.get("temperature")
+        oxygen_level = sensor_data.get("oxygen_level")
+        return ((heart_rate is not None and heart_rate > HIGH_HEART_RATE)
+                or (temperature is not None and temperature > HIGH_TEMPERATURE)
+                or (oxygen_level is not None and oxygen_level < LOW_OXYGEN_LEVEL))
+
+    @staticmethod
+    def _is_alert_batch(batch):
+        """Check whether any reading of a ReadingBatch crosses an alert threshold (NaN never does)."""
+        return (any(value > HIGH_HEART_RATE for value in batch.column("heart_rate"))
+                or any(value > HIGH_TEMPERATURE for value in batch.column("temperature"))
+                or any(value < LOW_OXYGEN_LEVEL for value in batch.column("oxygen_level")))
+
+    def _add_pending(self, rows):
+        """
+        Count rows written into the open group-commit transaction, committing once
+        group_commit_rows are pending. Caller must hold the lock.
+        """
+        if not rows:
+            return
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+        self._pending_rows += rows
+        if self._pending_rows >= self.group_commit_rows:
+            self._commit()
+
+    def _commit(self):
+        """Commit the open group-commit transaction. Caller must hold the lock."""
+        started = time.perf_counter()
+        self.conn.commit()
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        self._pending_rows = 0
+        self._first_pending_at = None
+
+    def flush(self):
+        """Commit all pending writes now, e.g. before another connection reads them."""
+        with self._lock:
+            if self._pending_rows:
+                self._commit()
+
+    def flush_if_due(self):
+        """Commit pending inserts if the oldest one has waited group_commit_ms."""
+        with self._lock:
+            if self._first_pending_at is None:
+                return
+            if (time.monotonic() - self._first_pending_at) * 1000 >= self.group_commit_ms:
+                self._commit()
+
+    def _flush_loop(self):
+        """Background timer that bounds how long an insert can stay uncommitted."""
+        while not self._closed.wait(self.group_commit_ms / 1000):
+            try:
+                self.flush_if_due()
+            except sqlite3.Error as e:
+                log_error(f"Group commit failed: {e}")
+
+    def close(self):
+        """Commit pending inserts and close the connection."""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._commit()
+            self.conn.close()
     
     # def save_data(self, device_id, patient_id, sensor_data, status='unsent'):
     #     """
@@ -168,29 +615,513 @@ class DatabaseManager:
     #     except sqlite3.Error as e:
     #         log_error(f"Failed to save data: {e}")
 
+    def count_unsent(self):
+        """Return the number of stored readings still waiting to be sent."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM sensor_data WHERE transmit_status = 'unsent'"
+            ).fetchone()[0]
+
     def fetch_unsent_data(self):
         """Fetch all unsent data from the database."""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM sensor_data WHERE transmit_status = 'unsent'")
-            unsent_data = cursor.fetchall()
+            with self._lock:
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT * FROM sensor_data WHERE transmit_status = 'unsent'")
+                unsent_data = cursor.fetchall()
             return unsent_data
         except sqlite3.Error as e:
             log_error(f"Failed to fetch unsent data: {e}")
             return []
 
+    def fetch_unsent_page(self, after_id=0, limit=100, alerts=None):
+        """
+        Fetch one page of unsent records in id order, starting after a keyset cursor.
+
+        Args:
+            after_id (int): Only records with an id greater than this are returned.
+            limit (int): Maximum number of records in the page.
+            alerts (bool): True for alert-bearing records only, False for routine records
+                only, None for both.
+
+        Returns:
+            list: Tuples of (id, device_id, patient_id, timestamp, heart_rate, temperature,
+                oxygen_level, steps_count, calories_burned).
+        """
+        query = """
+            SELECT id, device_id, patient_id, timestamp, heart_rate, temperature,
+                   oxygen_level, steps_count, calories_burned
+            FROM sensor_data
+            WHERE transmit_status = 'unsent' AND id > ?
+        """
+        params = [after_id]
+        if alerts is not None:
+            # The alert pass is served by idx_sensor_data_unsent_alerts, the routine pass by idx_sensor_data_unsent
+            query += " AND alert_reading = 1" if alerts else " AND alert_reading = 0"
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        try:
+            with self._lock:
+                cursor = self.conn.cursor()
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            log_error(f"Failed to fetch unsent page after ID {after_id}: {e}")
+            return []
+
+    def fetch_recent_readings(self, since_ms, patient_id=None):
+        """
+        Fetch trend-relevant readings captured at or after a point in time, oldest first.
+
+        Args:
+            since_ms (int): Lower bound on the capture time in epoch milliseconds.
+            patient_id (str): Restrict to one patient; None returns every patient.
+
+        Returns:
+            list: Tuples of (patient_id, ts, heart_rate, temperature, oxygen_level).
+        """
+        query = "SELECT patient_id, ts, heart_rate, temperature, oxygen_level FROM sensor_data WHERE ts >= ?"
+        params = [since_ms]
+        if patient_id is not None:
+            query += " AND patient_id = ?"
+            params.append(patient_id)
+        query += " ORDER BY ts"
+        try:
+            with self._lock:
+                return self.conn.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            log_error(f"Failed to fetch recent readings: {e}")
+            return []
+
+    def save_waveform(self, device_id, patient_id, block):
+        """
+        Save a WaveformBlock as compressed chunks.
+
+        The chunks are encoded before the lock is taken and join the current group-commit
+        transaction.
+
+        Args:
+            device_id (str): Unique identifier for the device.
+            patient_id (str): Unique identifier for the patient.
+            block (WaveformBlock): Samples to store.
+
+        Returns:
+            int: Number of chunks stored.
+        """
+        if not len(block):
+            return 0
+        max_samples = max(1, int(block.sample_rate_hz * WAVEFORM_CHUNK_MAX_MS / 1000))
+        rows = [
+            (device_id, patient_id, chunk.signal, chunk.start_ts, chunk.end_ts, chunk.sample_rate_hz, len(chunk),
+             chunk.resolution, DELTA_ZLIB, encode_samples(chunk.samples, chunk.resolution))
+            for chunk in block.split(max_samples)
+        ]
+        try:
+            with self._lock:
+                self.conn.executemany(INSERT_WAVEFORM_CHUNK_SQL, rows)
+                self._add_pending(len(rows))
+            return len(rows)
+        except sqlite3.Error as e:
+            log_error(f"Failed to save {block.signal} waveform: {e}")
+            return 0
+
+    def fetch_waveform(self, patient_id, signal, from_ms, to_ms):
+        """
+        Read one signal's samples captured in [from_ms, to_ms), decoding only the chunks needed.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            signal (str): Signal name, e.g. "ecg".
+            from_ms (int): Start of the range in epoch milliseconds.
+            to_ms (int): End of the range in epoch milliseconds, exclusive.
+
+        Returns:
+            list: WaveformBlocks trimmed to the range, oldest first. Gaps in capture show
+            up as separate blocks.
+        """
+        try:
+            with self._lock:
+                # No chunk spans more than WAVEFORM_CHUNK_MAX_MS, which bounds the index scan
+                rows = self.conn.execute("""
+                    SELECT start_ts, sample_rate_hz, resolution, encoding, data FROM waveform_chunks
+                    WHERE patient_id = ? AND signal = ? AND start_ts > ? AND start_ts < ? AND end_ts > ?
+                    ORDER BY start_ts
+                """, (patient_id, signal, from_ms - WAVEFORM_CHUNK_MAX_MS, to_ms, from_ms)).fetchall()
+        except sqlite3.Error as e:
+            log_error(f"Failed to fetch {signal} waveform: {e}")
+            return []
+        return [
+            WaveformBlock(signal, start_ts, sample_rate_hz, decode_samples(data, resolution, encoding),
+                          resolution).slice_time(from_ms, to_ms)
+            for start_ts, sample_rate_hz, resolution, encoding, data in rows
+        ]
+
+    def prune_waveform_chunks(self, cutoff_ms, limit):
+        """
+        Delete up to limit waveform chunks that ended before cutoff_ms.
+
+        Returns:
+            int: Number of chunks deleted.
+        """
+        try:
+            with self._lock:
+                self._commit()
+                with self.conn:
+                    return self.conn.execute("""
+                        DELETE FROM waveform_chunks WHERE id IN (
+                            SELECT id FROM waveform_chunks WHERE end_ts < ? ORDER BY end_ts LIMIT ?
+                        )
+                    """, (cutoff_ms, limit)).rowcount
+        except sqlite3.Error as e:
+            log_error(f"Failed to prune waveform chunks: {e}")
+            return 0
+
+    def rollup_raw_chunk(self, cutoff_ms, limit):
+        """
+        Fold the oldest sent or suppressed raw rows captured before cutoff_ms into minute rollups.
+
+        At most limit rows are handled, in one transaction; they are deleted once merged.
+        Unsent rows are never touched, so the backlog is not lost.
+
+        Returns:
+            int: Number of raw rows compacted.
+        """
+        width = ROLLUP_TIERS["minute"]
+        eligible = "transmit_status IN ('sent', 'suppressed') AND ts < ?"
+        try:
+            with self._lock:
+                self._commit()
+                max_id = self.conn.execute(
+                    f"SELECT max(id) FROM (SELECT id FROM sensor_data WHERE {eligible} ORDER BY id LIMIT ?)",
+                    (cutoff_ms, limit)
+                ).fetchone()[0]
+                if max_id is None:
+                    return 0
+                with self.conn:
+                    self.conn.execute(f"""
+                        INSERT INTO sensor_rollup_minute (patient_id, bucket_ts, {", ".join(_rollup_columns())})
+                        SELECT patient_id, ts / {width} * {width}, {RAW_AGGREGATES}
+                        FROM sensor_data WHERE id <= ? AND {eligible}
+                        GROUP BY patient_id, ts / {width}
+                        {_rollup_upsert_sql("minute")}
+                    """, (max_id, cutoff_ms))
+                    return self.conn.execute(
+                        f"DELETE FROM sensor_data WHERE id <= ? AND {eligible}", (max_id, cutoff_ms)
+                    ).rowcount
+        except sqlite3.Error as e:
+            log_error(f"Failed to roll up raw rows: {e}")
+            return 0
+
+    def rollup_minute_chunk(self, cutoff_ms, limit):
+        """
+        Fold the oldest minute buckets before cutoff_ms into hour rollups and delete them.
+
+        Returns:
+            int: Number of minute buckets compacted.
+        """
+        width = ROLLUP_TIERS["hour"]
+        try:
+            with self._lock:
+                self._commit()
+                max_rowid = self.conn.execute("""
+                    SELECT max(rowid) FROM (
+                        SELECT rowid FROM sensor_rollup_minute WHERE bucket_ts < ? ORDER BY rowid LIMIT ?
+                    )
+                """, (cutoff_ms, limit)).fetchone()[0]
+                if max_rowid is None:
+                    return 0
+                with self.conn:
+                    self.conn.execute(f"""
+                        INSERT INTO sensor_rollup_hour (patient_id, bucket_ts, {", ".join(_rollup_columns())})
+                        SELECT patient_id, bucket_ts / {width} * {width}, {ROLLUP_AGGREGATES}
+                        FROM sensor_rollup_minute WHERE rowid <= ? AND bucket_ts < ?
+                        GROUP BY patient_id, bucket_ts / {width}
+                        {_rollup_upsert_sql("hour")}
+                    """, (max_rowid, cutoff_ms))
+                    return self.conn.execute(
+                        "DELETE FROM sensor_rollup_minute WHERE rowid <= ? AND bucket_ts < ?", (max_rowid, cutoff_ms)
+                    ).rowcount
+        except sqlite3.Error as e:
+            log_error(f"Failed to roll up minute buckets: {e}")
+            return 0
+
+    def prune_hour_rollups(self, cutoff_ms, limit):
+        """
+        Delete up to limit hour buckets older than cutoff_ms.
+
+        Returns:
+            int: Number of hour buckets deleted.
+        """
+        try:
+            with self._lock:
+                self._commit()
+                with self.conn:
+                    return self.conn.execute("""
+                        DELETE FROM sensor_rollup_hour WHERE rowid IN (
+                            SELECT rowid FROM sensor_rollup_hour WHERE bucket_ts < ? ORDER BY bucket_ts LIMIT ?
+                        )
+                    """, (cutoff_ms, limit)).rowcount
+        except sqlite3.Error as e:
+            log_error(f"Failed to prune hour rollups: {e}")
+            return 0
+
+    def fetch_rollups(self, tier, since_ms, patient_id=None):
+        """
+        Fetch per-bucket aggregates from since_ms on, oldest first.
+
+        Raw rows that have not been compacted yet, and finer rollup tiers, are aggregated on
+        the fly and merged in, so the series covers the whole range at one bucket width.
+
+        Args:
+            tier (str): "minute" or "hour".
+            since_ms (int): Lower bound on the bucket start in epoch milliseconds.
+            patient_id (str): Restrict to one patient; None returns every patient.
+
+        Returns:
+            list: Dicts with patient_id, bucket_ts, and count/mean/min/max per metric.
+        """
+        width = ROLLUP_TIERS[tier]
+        query, params = bucket_series_sql(width, since_ms // width * width, patient_id=patient_id)
+        try:
+            with self._lock:
+                rows = self.conn.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            log_error(f"Failed to fetch {tier} rollups: {e}")
+            return []
+
+        buckets = []
+        for row in rows:
+            bucket = {"patient_id": row[0], "bucket_ts": row[1]}
+            for index, metric in enumerate(ROLLUP_METRICS):
+                count, total, low, high = row[2 + index * 4: 6 + index * 4]
+                bucket[metric] = {
+                    "count": count, "mean": total / count if count else None, "min": low, "max": high
+                }
+            buckets.append(bucket)
+        return buckets
+
+    def save_alert(self, device_id, patient_id, record_id, alert_type, priority, ts, payload):
+        """
+        Store an alert and commit it with synchronous=FULL before it is sent.
+
+        Args:
+            device_id (str): Unique identifier for the device.
+            patient_id (str): Unique identifier for the patient.
+            record_id (int): sensor_data row that triggered the alert, if any.
+            alert_type (str): Alert name, e.g. "High heart rate alert".
+            priority (int): 0 is the most urgent.
+            ts (int): Capture time of the triggering reading in epoch milliseconds.
+            payload (dict): Backend-formatted alert body.
+
+        Returns:
+            int: The ID of the stored alert, or None if it could not be stored.
+        """
+        try:
+            with self._lock:
+                self._commit()
+                self.conn.execute("PRAGMA synchronous=FULL")
+                try:
+                    with self.conn:
+                        return self.conn.execute("""
+                            INSERT INTO alerts (device_id, patient_id, record_id, alert_type, priority, ts, payload)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """, (device_id, patient_id, record_id, alert_type, priority, ts, json.dumps(payload))).lastrowid
+                finally:
+                    self.conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        except sqlite3.Error as e:
+            log_error(f"Failed to save alert '{alert_type}': {e}")
+            return None
+
+    def fetch_unsent_alerts(self, limit=1000):
+        """
+        Fetch unsent alerts, most urgent first.
+
+        Returns:
+            list: Tuples of (id, patient_id, priority, payload dict).
+        """
+        try:
+            with self._lock:
+                rows = self.conn.execute("""
+                    SELECT id, patient_id, priority, payload FROM alerts
+                    WHERE transmit_status = 'unsent' ORDER BY priority, id LIMIT ?
+                """, (limit,)).fetchall()
+            return [(alert_id, patient_id, priority, json.loads(payload)) for alert_id, patient_id, priority, payload in rows]
+        except sqlite3.Error as e:
+            log_error(f"Failed to fetch unsent alerts: {e}")
+            return []
+
+    def update_alert_tx_status(self, alert_id, new_tx_status):
+        """Update the transmit status of an alert by its ID."""
+        try:
+            with self._lock:
+                self.conn.execute("UPDATE alerts SET transmit_status = ? WHERE id = ?", (new_tx_status, alert_id))
+                self._commit()
+        except sqlite3.Error as e:
+            log_error(f"Failed to update transmit_status for alert ID {alert_id}: {e}")
+
+    def link_alert_records(self, links):
+        """
+        Attach sensor_data rows to alerts that were raised before their reading was stored.
+
+        The update joins the group-commit transaction; the alerts themselves are already durable.
+
+        Args:
+            links (list): (alert_id, record_id) pairs.
+        """
+        links = [(record_id, alert_id) for alert_id, record_id in links if alert_id is not None]
+        if not links:
+            return
+        try:
+            with self._lock:
+                self.conn.executemany("UPDATE alerts SET record_id = ? WHERE id = ?", links)
+                self._add_pending(len(links))
+        except sqlite3.Error as e:
+            log_error(f"Failed to link {len(links)} alerts to their readings: {e}")
+
     def update_tx_status(self, record_id, new_tx_status):
         """Update the status of a record by its ID."""
+        if new_tx_status == 'sent':
+            self.mark_acked([record_id])
+            return
         try:
-            with self.conn:
+            with self._lock:
                 self.conn.execute(
-                    "UPDATE sensor_data SET transmit_status = ? WHERE id = ?",
+                    "UPDATE sensor_data SET transmit_status = ?, tx_claimed_at = NULL WHERE id = ?",
                     (new_tx_status, record_id)
                 )
-            log_info(f"Record ID {record_id} updated to transmit_status '{new_tx_status}'")
+                self._add_pending(1)
+            log_sampled("tx-status", lambda: f"Record ID {record_id} updated to transmit_status '{new_tx_status}'")
         except sqlite3.Error as e:
             log_error(f"Failed to update transmit_status for record ID {record_id}: {e}")
 
+    def claim_for_send(self, record_ids, now_ms=None):
+        """
+        Move 'unsent' records to 'in_flight' before they are posted.
+
+        Args:
+            record_ids (list): Record IDs the caller is about to send.
+            now_ms (int): Claim time in epoch milliseconds; defaults to now.
+
+        Returns:
+            list: The IDs that were claimed, in input order. Records already in flight or
+                sent are left out, and the caller must not send them.
+        """
+        if not record_ids:
+            return []
+        now_ms = now_ms or utc_now_epoch_ms()
+        try:
+            with self._lock:
+                unsent = set()
+                for start in range(0, len(record_ids), LEDGER_CHUNK_IDS):
+                    chunk = record_ids[start:start + LEDGER_CHUNK_IDS]
+                    placeholders = ", ".join("?" * len(chunk))
+                    unsent.update(row[0] for row in self.conn.execute(
+                        f"SELECT id FROM sensor_data WHERE transmit_status = 'unsent' AND id IN ({placeholders})",
+                        chunk
+                    ))
+                claimed = [record_id for record_id in record_ids if record_id in unsent]
+                self.conn.executemany("""
+                    UPDATE sensor_data
+                    SET transmit_status = 'in_flight', tx_claimed_at = ?, tx_attempts = tx_attempts + 1
+                    WHERE id = ?
+                """, [(now_ms, record_id) for record_id in claimed])
+                self._add_pending(len(claimed))
+            return claimed
+        except sqlite3.Error as e:
+            log_error(f"Failed to claim {len(record_ids)} records for sending: {e}")
+            return []
+
+    def mark_acked(self, record_ids):
+        """
+        Record backend acknowledgements for several records in one transaction.
+
+        Records that are already 'sent' are not written again.
+
+        Returns:
+            int: Number of records that moved to 'sent'.
+        """
+        if not record_ids:
+            return 0
+        try:
+            with self._lock:
+                acked = self.conn.executemany("""
+                    UPDATE sensor_data SET transmit_status = 'sent', tx_claimed_at = NULL
+                    WHERE id = ? AND transmit_status != 'sent'
+                """, [(record_id,) for record_id in record_ids]).rowcount
+                self._add_pending(acked)
+        except sqlite3.Error as e:
+            log_error(f"Failed to record acknowledgements for {len(record_ids)} records: {e}")
+            return 0
+        RECORDS_SENT_TOTAL.inc(acked)
+        log_sampled("tx-status", lambda: f"{acked} of {len(record_ids)} acknowledged records marked as 'sent'.")
+        return acked
+
+    def mark_suppressed(self, record_ids):
+        """
+        Keep records the report filter decided not to send out of the backlog.
+
+        Only 'unsent' records are changed; one the backlog drainer already claimed is sent.
+        The update joins the group-commit transaction that usually still holds the rows'
+        inserts, so it costs no extra commit.
+
+        Returns:
+            int: Number of records that moved to 'suppressed'.
+        """
+        if not record_ids:
+            return 0
+        try:
+            with self._lock:
+                suppressed = self.conn.executemany("""
+                    UPDATE sensor_data SET transmit_status = 'suppressed'
+                    WHERE id = ? AND transmit_status = 'unsent'
+                """, [(record_id,) for record_id in record_ids]).rowcount
+                self._add_pending(suppressed)
+        except sqlite3.Error as e:
+            log_error(f"Failed to mark {len(record_ids)} records as suppressed: {e}")
+            return 0
+        return suppressed
+
+    def release_claims(self, record_ids):
+        """Return claimed records that could not be sent to 'unsent' for a later retry."""
+        if not record_ids:
+            return
+        try:
+            with self._lock:
+                released = self.conn.executemany("""
+                    UPDATE sensor_data SET transmit_status = 'unsent', tx_claimed_at = NULL
+                    WHERE id = ? AND transmit_status = 'in_flight'
+                """, [(record_id,) for record_id in record_ids]).rowcount
+                self._add_pending(released)
+        except sqlite3.Error as e:
+            log_error(f"Failed to release {len(record_ids)} claimed records: {e}")
+
+    def requeue_in_flight(self, claimed_before_ms=None):
+        """
+        Return 'in_flight' records to 'unsent', e.g. after a crash or a lost acknowledgement.
+
+        Args:
+            claimed_before_ms (int): Only requeue records claimed before this epoch-ms time;
+                None requeues every record in flight.
+
+        Returns:
+            int: Number of records requeued.
+        """
+        query = "UPDATE sensor_data SET transmit_status = 'unsent', tx_claimed_at = NULL WHERE transmit_status = 'in_flight'"
+        params = ()
+        if claimed_before_ms is not None:
+            query += " AND tx_claimed_at < ?"
+            params = (claimed_before_ms,)
+        try:
+            with self._lock:
+                requeued = self.conn.execute(query, params).rowcount
+                self._add_pending(requeued)
+        except sqlite3.Error as e:
+            log_error(f"Failed to requeue in-flight records: {e}")
+            return 0
+        if requeued:
+            log_info(f"Requeued {requeued} in-flight records for another send.")
+        return requeued
+
     # def update_status(self, record_id, status='sent'):
     #     """Update the status of a specific record by ID."""
     #     try:
@@ -0,0 +1,202 @@
+"""
+history_export.py
+Local access to historical readings: a GET /history endpoint and a command-line export.
+
+Endpoint:
+HistoryServer serves GET /history from a daemon thread. It binds to HISTORY_API_HOST,
+localhost by default, so patient data is not exposed on the ward network. The agent
+starts it when HISTORY_API_ENABLED is set; `--serve` runs it on its own. Query parameters:
+- patient_id: one patient; omitted returns every patient.
+- from / to: ISO 8601 or epoch ms; `to` defaults to now.
+- last: duration before `to`, e.g. 7d, used when `from` is omitted.
+- metrics: comma-separated sensor_data metrics; omitted returns all of them.
+- interval: bucket width for downsampling, e.g. 1m or 1h; omitted returns raw readings.
+- format: "ndjson" (default) or "csv".
+
+The body is written chunk by chunk as HistoryQuery fetches it, without a Content-Length,
+and the connection is closed at the end. A week of vitals therefore never has to fit in
+memory, and the database file never has to be copied off the device.
+
+Command line:
+    python -m src.data_processing.history_export --patient-id p_v2_1034 --last 7d \\
+        --metrics heart_rate,temperature --interval 5m --format csv --out week.csv
+    python -m src.data_processing.history_export --serve
+
+Both use their own read-only connection, so they are safe to run while the agent writes.
+Run on their own they see readings once the agent has group-committed them; the agent's
+own endpoint flushes its pending rows before each query.
+"""
+import argparse
+import sqlite3
+import sys
+import threading
+from urllib.parse import urlsplit, parse_qs
+from src.data_processing.history_query import (
+    HistoryQuery, FORMATS, resolve_range, parse_metrics, parse_duration_ms
+)
+from src.utils.config import DB_PATH, HISTORY_API_HOST, HISTORY_API_PORT, HISTORY_CHUNK_ROWS
+from src.utils.logger import log_info, log_error
+
+def export_chunks(history, patient_id=None, from_time=None, to_time=None, last=None, metrics=None,
+                  interval=None, output_format="ndjson"):
+    """
+    Validate export arguments and return the encoded result stream.
+
+    Args:
+        history (HistoryQuery): Store to read from.
+        patient_id (str): Restrict to one patient; None returns every patient.
+        from_time, to_time, last (str): Range, as for resolve_range.
+        metrics (str): Comma-separated metric names; None selects all of them.
+        interval (str): Downsampling bucket width, e.g. "5m"; None returns raw readings.
+        output_format (str): "ndjson" or "csv".
+
+    Returns:
+        tuple: (Content-Type, generator of bytes chunks).
+
+    Raises:
+        ValueError: If an argument is invalid.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown format '{output_format}'; choose from {sorted(FORMATS)}.")
+    from_ms, to_ms = resolve_range(from_time, to_time, last)
+    metric_names = parse_metrics(metrics)
+    interval_ms = parse_duration_ms(interval) if interval else None
+    content_type, encode = FORMATS[output_format]
+    rows = history.rows(from_ms, to_ms, patient_id, metric_names, interval_ms)
+    return content_type, encode(history.columns(metric_names, interval_ms), rows, history.chunk_rows)
+
+class HistoryServer:
+    def __init__(self, host=HISTORY_API_HOST, port=HISTORY_API_PORT, db_path=DB_PATH,
+                 chunk_rows=HISTORY_CHUNK_ROWS, flush=None):
+        """
+        Args:
+            host (str): Interface to bind; localhost keeps the endpoint off the network.
+            port (int): Port to bind; 0 picks a free port.
+            db_path (str): SQLite database written by the agent.
+            chunk_rows (int): Rows fetched and written per chunk.
+            flush (callable): Commits the writer's pending rows before each query; the
+                agent passes DatabaseManager.flush.
+        """
+        # Imported here so agents with the history endpoint disabled do not load http.server
+        from http.server import ThreadingHTTPServer
+
+        self.history = HistoryQuery(db_path, chunk_rows, flush)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/history"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="history-server", daemon=True)
+        self._thread.start()
+        log_info(f"History available at {self.url}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+
+        history = self.history
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path != "/history":
+                    self.send_error(404)
+                    return
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    content_type, chunks = export_chunks(
+                        history, params.get("patient_id"), params.get("from"), params.get("to"),
+                        params.get("last"), params.get("metrics"), params.get("interval"),
+                        params.get("format", "ndjson")
+                    )
+                    # Read the first chunk before answering, so a database error is still a 500
+                    first = next(chunks, b"")
+                except ValueError as e:
+                    self.send_error(400, explain=str(e).rstrip("."))
+                    return
+                except sqlite3.Error as e:
+                    log_error(f"History query failed: {e}")
+                    self.send_error(500, explain="History query failed")
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    self.wfile.write(first)
+                    for chunk in chunks:
+                        self.wfile.write(chunk)
+                except sqlite3.Error as e:
+                    log_error(f"History query failed mid-stream; response truncated: {e}")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client went away; closing the generator releases the connection
+                finally:
+                    chunks.close()
+
+            def log_message(self, format, *args):
+                pass  # Requests are not worth a log line each
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export VitalEdge readings from the local SQLite store.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database written by the agent")
+    parser.add_argument("--patient-id", help="Restrict to one patient (default: every patient)")
+    parser.add_argument("--from", dest="from_time", help="Start, ISO 8601 or epoch ms")
+    parser.add_argument("--to", dest="to_time", help="Exclusive end, ISO 8601 or epoch ms (default: now)")
+    parser.add_argument("--last", help="Duration before the end, e.g. 24h or 7d, when --from is not given")
+    parser.add_argument("--metrics", help="Comma-separated metrics (default: all)")
+    parser.add_argument("--interval", help="Downsample into buckets of this width, e.g. 1m or 1h")
+    parser.add_argument("--format", default="ndjson", choices=sorted(FORMATS))
+    parser.add_argument("--out", help="Output file (default: stdout)")
+    parser.add_argument("--chunk-rows", type=int, default=HISTORY_CHUNK_ROWS)
+    parser.add_argument("--serve", action="store_true", help="Serve GET /history instead of exporting")
+    parser.add_argument("--host", default=HISTORY_API_HOST)
+    parser.add_argument("--port", type=int, default=HISTORY_API_PORT)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        server = HistoryServer(args.host, args.port, args.db, args.chunk_rows).start()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            log_info("Shutdown requested.")
+        finally:
+            server.stop()
+        return 0
+
+    history = HistoryQuery(args.db, args.chunk_rows)
+    try:
+        _, chunks = export_chunks(history, args.patient_id, args.from_time, args.to_time, args.last,
+                                  args.metrics, args.interval, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    except sqlite3.Error as e:
+        log_error(f"History export failed: {e}")
+        return 1
+    finally:
+        if args.out:
+            out.close()
+        else:
+            out.flush()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+history_query.py
+Streams historical readings out of the local SQLite store, for clinicians and the aggregator.
+
+Queries:
+HistoryQuery reads a time range for one patient, or for every patient. Results are raw
+readings, or are downsampled into fixed-width buckets with count, mean, min and max per
+metric. Downsampled series merge raw rows that have not been compacted yet with every
+rollup tier whose width divides the interval (bucket_series_sql). Ranges older than the
+raw retention window therefore still return data. Raw queries only see rows that have not
+been rolled up yet.
+
+Streaming:
+Each query opens its own read-only connection and walks the cursor with fetchmany, so
+memory holds one chunk of rows however large the range is. In WAL mode the reader never
+blocks the agent's writer. The connection is closed when the generator is exhausted or
+closed. A separate connection only sees readings the agent has group-committed; inside
+the agent, HistoryQuery is given DatabaseManager.flush to call before each query, so
+nothing stored is missing. A standalone export can lag the agent by up to
+DB_GROUP_COMMIT_MS.
+
+Formats:
+ndjson_chunks and csv_chunks turn a row stream into encoded byte chunks of one fetch
+each, ready for a file, stdout or an HTTP response. Both formats use the same flat
+columns:
+- raw rows: patient_id, device_id, timestamp (ISO 8601), ts (epoch ms), then one column
+  per metric.
+- bucketed rows: patient_id, timestamp, bucket_ts, then {metric}_count, _mean, _min and
+  _max.
+"""
+import csv
+import io
+import json
+import re
+import sqlite3
+from pathlib import Path
+from src.data_collection.reading import READING_FIELDS
+from src.data_processing.database_manager import bucket_series_sql
+from src.utils.config import DB_PATH, HISTORY_CHUNK_ROWS
+from src.utils.timestamps import iso_to_epoch_ms, epoch_ms_to_iso, utc_now_epoch_ms
+
+DURATION_UNITS_MS = {"ms": 1, "s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000}
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m|h|d)?$")
+
+def parse_duration_ms(value):
+    """
+    Parse a duration such as "90s", "15m", "24h" or "7d"; a bare number is seconds.
+
+    Raises:
+        ValueError: If the value is not a duration of at least one millisecond.
+    """
+    match = DURATION_PATTERN.match(str(value).strip())
+    duration_ms = int(float(match.group(1)) * DURATION_UNITS_MS[match.group(2) or "s"]) if match else 0
+    if duration_ms <= 0:
+        raise ValueError(f"Invalid duration '{value}'; use e.g. 90s, 15m, 24h or 7d.")
+    return duration_ms
+
+def parse_time_ms(value):
+    """
+    Parse a point in time given as epoch milliseconds or ISO 8601 text.
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    epoch_ms = iso_to_epoch_ms(text)
+    if epoch_ms is None:
+        raise ValueError(f"Invalid time '{value}'; use ISO 8601 or epoch milliseconds.")
+    return epoch_ms
+
+def resolve_range(from_time=None, to_time=None, last=None):
+    """
+    Turn user-supplied range arguments into [from_ms, to_ms).
+
+    Args:
+        from_time (str): Start as ISO 8601 or epoch ms.
+        to_time (str): Exclusive end as ISO 8601 or epoch ms; defaults to now.
+        last (str): Duration before the end, e.g. "7d"; used when from_time is not given.
+
+    Returns:
+        tuple: (from_ms, to_ms).
+
+    Raises:
+        ValueError: If the range is missing, malformed or empty.
+    """
+    to_ms = parse_time_ms(to_time) if to_time else utc_now_epoch_ms()
+    if from_time:
+        from_ms = parse_time_ms(from_time)
+    elif last:
+        from_ms = to_ms - parse_duration_ms(last)
+    else:
+        raise ValueError("Give a start time or a duration to look back over.")
+    if from_ms >= to_ms:
+        raise ValueError("The start of the range must be before its end.")
+    return from_ms, to_ms
+
+def parse_metrics(value):
+    """
+    Parse a comma-separated metric list; empty selects every metric.
+
+    Raises:
+        ValueError: If a name is not a sensor_data metric.
+    """
+    if not value:
+        return list(READING_FIELDS)
+    metrics = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in metrics if name not in READING_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}; choose from {list(READING_FIELDS)}.")
+    return metrics
+
+class HistoryQuery:
+    def __init__(self, db_path=DB_PATH, chunk_rows=HISTORY_CHUNK_ROWS, flush=None):
+        """
+        Args:
+            db_path (str): SQLite database written by the agent.
+            chunk_rows (int): Rows fetched per fetchmany call.
+            flush (callable): Optional callable that commits the writer's pending rows,
+                e.g. DatabaseManager.flush; called before each connection is opened.
+        """
+        self.db_path = db_path
+        self.chunk_rows = max(1, chunk_rows)
+        self.flush = flush
+
+    def _connect(self):
+        """Open a read-only connection; the agent keeps the only writer."""
+        if self.flush is not None:
+            self.flush()
+        conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def patient_ids(self):
+        """Return every patient with raw readings stored, in order."""
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT DISTINCT patient_id FROM sensor_data ORDER BY patient_id")]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def columns(metrics, interval_ms=None):
+        """Column names of the rows returned by rows() for these arguments."""
+        if interval_ms is None:
+            return ["patient_id", "device_id", "timestamp", "ts", *metrics]
+        return ["patient_id", "timestamp", "bucket_ts",
+                *(f"{metric}_{part}" for metric in metrics for part in ("count", "mean", "min", "max"))]
+
+    def rows(self, from_ms, to_ms, patient_id=None, metrics=READING_FIELDS, interval_ms=None):
+        """
+        Stream readings captured in [from_ms, to_ms), fetching chunk_rows at a time.
+
+        Args:
+            from_ms (int): Start of the range in epoch milliseconds.
+            to_ms (int): Exclusive end of the range in epoch milliseconds.
+            patient_id (str): Restrict to one patient; None returns every patient.
+            metrics (sequence): sensor_data metrics to include.
+            interval_ms (int): Bucket width for downsampling; None returns raw readings.
+                Buckets are aligned to multiples of the width, so the first one may start
+                before from_ms.
+
+        Yields:
+            tuple: One row per reading or bucket, in columns() order. Raw readings are
+                ordered by patient, then time; buckets by time.
+
+        Raises:
+            sqlite3.Error: If the database cannot be read.
+        """
+        metrics = list(metrics)
+        unknown = [name for name in metrics if name not in READING_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown metrics {unknown}")
+        if interval_ms is None:
+            query = f"""
+                SELECT patient_id, device_id, timestamp, ts{"".join(f", {m}" for m in metrics)}
+                FROM sensor_data WHERE ts >= ? AND ts < ?
+            """
+            params = [from_ms, to_ms]
+            if patient_id is not None:
+                query += " AND patient_id = ?"
+                params.append(patient_id)
+            # Index order (patient_id, ts), so SQLite streams rows without sorting the range
+            query += " ORDER BY patient_id, ts"
+            return self._stream(query, params, None)
+        query, params = bucket_series_sql(interval_ms, from_ms // interval_ms * interval_ms, to_ms,
+                                          patient_id, metrics)
+        return self._stream(query, params, self._bucket_row)
+
+    @staticmethod
+    def _bucket_row(row):
+        """Turn a bucket_series_sql row into (patient_id, timestamp, bucket_ts, count, mean, min, max...)."""
+        out = [row[0], epoch_ms_to_iso(row[1]), row[1]]
+        for offset in range(2, len(row), 4):
+            count, total, low, high = row[offset:offset + 4]
+            out += [count, total / count if count else None, low, high]
+        return tuple(out)
+
+    def _stream(self, query, params, transform):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                chunk = cursor.fetchmany(self.chunk_rows)
+                if not chunk:
+                    return
+                if transform is None:
+                    yield from chunk
+                else:
+                    yield from map(transform, chunk)
+        finally:
+            conn.close()
+
+def _chunked(rows, chunk_rows):
+    """Group a row stream into lists of at most chunk_rows rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def ndjson_chunks(columns, rows, chunk_rows=HISTORY_CHUNK_ROWS):
+    """Encode rows as newline-delimited JSON objects, yielding one bytes chunk per chunk_rows rows."""
+    for chunk in _chunked(rows, chunk_rows):
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk).encode()
+
+def csv_chunks(columns, rows, chunk_rows=HISTORY_CHUNK_ROWS):
+    """Encode rows as CSV with a header line, yielding one bytes chunk per chunk_rows rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for chunk in _chunked(rows, chunk_rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # Header only: the range was empty
+
+# Output format -> (Content-Type, encoder)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", ndjson_chunks),
+    "csv": ("text/csv; charset=utf-8", csv_chunks),
+}
@@ -0,0 +1,204 @@
+"""
+report_filter.py
+Edge-side send-on-change filter that decides which stored readings are worth sending.
+
+Dead-bands:
+A reading is sent when one of the metrics in REPORT_DEADBANDS has moved further than its
+dead-band from the value last sent for that patient. Comparing against the last value
+sent, not the previous reading, means slow drift is still reported once it adds up.
+Metrics without a dead-band never cause a send on their own.
+
+Heartbeat:
+A reading is also sent when nothing has been sent for the patient for
+REPORT_HEARTBEAT_SECONDS, so the backend can tell a stable patient from a silent device.
+
+Adaptive rate:
+escalate() switches a patient to full rate: every reading is sent until REPORT_BOOST_SECONDS
+after the alert or trend flag that triggered it. The caller escalates on every alert it
+raises and while an alert rule stays active.
+
+Readings that are not sent stay in SQLite at full resolution. The caller marks them
+'suppressed' (DatabaseManager.mark_suppressed), which keeps them out of the backlog and
+lets retention roll them up like sent rows. The stats attribute counts the readings sent
+for each reason and gives the reduction ratio, the share of readings that were not sent;
+it is logged periodically and exported as vitaledge_report_decisions_total.
+"""
+import threading
+from src.data_collection.reading import reading_ts_ms
+from src.utils.config import REPORT_DEADBANDS, REPORT_HEARTBEAT_SECONDS, REPORT_BOOST_SECONDS
+from src.utils.logger import log_sampled
+from src.utils.metrics import REPORT_DECISIONS_TOTAL
+
+class ReportFilterStats:
+    """Counters of the filter's decisions."""
+    __slots__ = ("seen", "changed", "heartbeat", "boosted", "suppressed")
+
+    def __init__(self):
+        self.seen = 0
+        self.changed = 0
+        self.heartbeat = 0
+        self.boosted = 0
+        self.suppressed = 0
+
+    def as_dict(self):
+        return {
+            "seen": self.seen,
+            "sent_changed": self.changed,
+            "sent_heartbeat": self.heartbeat,
+            "sent_boosted": self.boosted,
+            "suppressed": self.suppressed,
+            "reduction_ratio": round(self.suppressed / self.seen, 3) if self.seen else 0.0,
+        }
+
+class PatientReportState:
+    """What was last sent for one patient."""
+    __slots__ = ("last_values", "last_sent_ms", "boost_until_ms")
+
+    def __init__(self):
+        self.last_values = {}
+        self.last_sent_ms = None
+        self.boost_until_ms = None
+
+class ReportFilter:
+    def __init__(self, deadbands=REPORT_DEADBANDS, heartbeat_seconds=REPORT_HEARTBEAT_SECONDS,
+                 boost_seconds=REPORT_BOOST_SECONDS):
+        """
+        Args:
+            deadbands (dict): Metric -> smallest change since the last sent value that is
+                worth sending.
+            heartbeat_seconds (float): Longest time a patient goes without a sent reading.
+            boost_seconds (float): How long every reading is sent after escalate().
+        """
+        self.deadbands = deadbands
+        self.heartbeat_ms = heartbeat_seconds * 1000
+        self.boost_ms = boost_seconds * 1000
+        self.stats = ReportFilterStats()
+        self._states = {}  # patient_id -> PatientReportState
+        # The live path and the pipeline's analyze stage may run on different threads
+        self._lock = threading.Lock()
+
+    def escalate(self, patient_id, ts_ms):
+        """
+        Send every reading of a patient captured from ts_ms until the boost period has passed.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            ts_ms (int): Capture time of the reading that was flagged, in epoch milliseconds.
+        """
+        with self._lock:
+            state = self._state(patient_id)
+            until = ts_ms + self.boost_ms
+            if state.boost_until_ms is None or until > state.boost_until_ms:
+                state.boost_until_ms = until
+
+    def should_send(self, patient_id, sensor_data):
+        """
+        Decide whether one reading is sent.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            sensor_data (Reading): Reading that was just stored.
+
+        Returns:
+            bool: True if the reading should be sent to the backend.
+        """
+        values = {metric: sensor_data.get(metric) for metric in self.deadbands}
+        with self._lock:
+            send = self._decide(self._state(patient_id), reading_ts_ms(sensor_data), values)
+        self._log_stats()
+        return send
+
+    def select(self, patient_id, batch):
+        """
+        Decide which readings of a ReadingBatch are sent.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            batch (ReadingBatch): Readings that were just stored, oldest first.
+
+        Returns:
+            list: Positions in the batch of the readings to send, in batch order.
+        """
+        columns = [(metric, batch.column(metric)) for metric in self.deadbands]
+        selected = []
+        with self._lock:
+            state = self._state(patient_id)
+            for index, ts_ms in enumerate(batch.ts):
+                values = {}
+                for metric, column in columns:
+                    value = column[index]
+                    values[metric] = value if value == value else None  # NaN: metric not read
+                if self._decide(state, ts_ms, values):
+                    selected.append(index)
+        self._log_stats()
+        return selected
+
+    def filter_stored_batch(self, db_manager, patient_id, batch, record_ids, flagged=(), still_flagged=False):
+        """
+        Escalate for a batch's alerts, select the readings to send and mark the rest 'suppressed'.
+
+        Args:
+            db_manager (DatabaseManager): Store the batch was saved to.
+            patient_id (str): Unique identifier for the patient.
+            batch (ReadingBatch): Readings that were just stored and analyzed, oldest first.
+            record_ids (sequence): sensor_data row of each reading, as from save_batch.
+            flagged (iterable): Positions of the readings an alert or trend flag was raised on.
+            still_flagged (bool): True while an alert rule is still active for the patient
+                after the batch, which keeps the patient at full rate.
+
+        Returns:
+            list: Positions in the batch of the readings to send, in batch order.
+        """
+        for index in flagged:
+            self.escalate(patient_id, batch.ts[index])
+        if still_flagged and len(batch):
+            self.escalate(patient_id, batch.ts[-1])
+        indexes = self.select(patient_id, batch)
+        if len(indexes) < len(batch):
+            selected = set(indexes)
+            db_manager.mark_suppressed(
+                [record_id for index, record_id in enumerate(record_ids) if index not in selected]
+            )
+        return indexes
+
+    def _state(self, patient_id):
+        state = self._states.get(patient_id)
+        if state is None:
+            state = self._states[patient_id] = PatientReportState()
+        return state
+
+    def _decide(self, state, ts_ms, values):
+        """Classify one reading, record it and update the patient's state. Returns True to send."""
+        if state.boost_until_ms is not None and ts_ms < state.boost_until_ms:
+            decision = "boosted"
+        elif self._changed(state.last_values, values):
+            decision = "changed"
+        elif state.last_sent_ms is None or ts_ms - state.last_sent_ms >= self.heartbeat_ms:
+            decision = "heartbeat"
+        else:
+            decision = "suppressed"
+
+        stats = self.stats
+        stats.seen += 1
+        setattr(stats, decision, getattr(stats, decision) + 1)
+        REPORT_DECISIONS_TOTAL.labels(decision).inc()
+        if decision == "suppressed":
+            return False
+
+        state.last_sent_ms = ts_ms
+        for metric, value in values.items():
+            if value is not None:
+                state.last_values[metric] = value
+        return True
+
+    def _changed(self, last_values, values):
+        for metric, value in values.items():
+            if value is None:
+                continue
+            last = last_values.get(metric)
+            if last is None or abs(value - last) > self.deadbands[metric]:
+                return True
+        return False
+
+    def _log_stats(self):
+        log_sampled("report-filter", lambda: f"Report filter: {self.stats.as_dict()}")
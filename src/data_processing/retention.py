@@ -0,0 +1,94 @@
+"""
+retention.py
+Keeps the on-device sensor_data store bounded by compacting old data into rollup tiers.
+
+Tiers:
+- raw rows: kept for RAW_RETENTION_HOURS, then folded into per-minute buckets once sent.
+- minute rollups: kept for MINUTE_ROLLUP_RETENTION_DAYS, then folded into per-hour buckets.
+- hour rollups: kept for HOUR_ROLLUP_RETENTION_DAYS (None keeps them forever).
+- waveform chunks: kept for WAVEFORM_RETENTION_HOURS, then deleted; the scalars derived
+  from them stay in sensor_data.
+
+Each step works in chunks of RETENTION_CHUNK_ROWS rows, each chunk in its own short
+transaction, and stops once its time budget is spent. Steps are cheap enough to run from
+the main loop or the pipeline's store stage, and a large backlog of old rows is worked off
+over several steps instead of blocking the writer.
+"""
+import time
+from src.utils.config import (
+    RAW_RETENTION_HOURS, MINUTE_ROLLUP_RETENTION_DAYS, HOUR_ROLLUP_RETENTION_DAYS,
+    RETENTION_CHUNK_ROWS, RETENTION_TIME_BUDGET_MS, RETENTION_INTERVAL_SECONDS, WAVEFORM_RETENTION_HOURS
+)
+from src.utils.logger import log_info
+from src.utils.timestamps import utc_now_epoch_ms
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+class RetentionManager:
+    def __init__(self, db_manager, raw_retention_hours=RAW_RETENTION_HOURS,
+                 minute_retention_days=MINUTE_ROLLUP_RETENTION_DAYS,
+                 hour_retention_days=HOUR_ROLLUP_RETENTION_DAYS, chunk_rows=RETENTION_CHUNK_ROWS,
+                 time_budget_ms=RETENTION_TIME_BUDGET_MS, interval_seconds=RETENTION_INTERVAL_SECONDS,
+                 waveform_retention_hours=WAVEFORM_RETENTION_HOURS):
+        """
+        Args:
+            db_manager (DatabaseManager): Store to compact.
+            raw_retention_hours (float): Age after which sent raw rows are rolled up.
+            minute_retention_days (float): Age after which minute buckets are rolled up.
+            hour_retention_days (float): Age after which hour buckets are deleted; None keeps them.
+            chunk_rows (int): Rows handled per transaction.
+            time_budget_ms (int): Max time spent per step.
+            interval_seconds (float): Minimum time between steps started by run_if_due.
+            waveform_retention_hours (float): Age after which waveform chunks are deleted.
+        """
+        self.db_manager = db_manager
+        self.raw_retention_ms = raw_retention_hours * HOUR_MS
+        self.minute_retention_ms = minute_retention_days * DAY_MS
+        self.hour_retention_ms = hour_retention_days * DAY_MS if hour_retention_days is not None else None
+        self.chunk_rows = chunk_rows
+        self.time_budget_ms = time_budget_ms
+        self.interval_seconds = interval_seconds
+        self.waveform_retention_ms = waveform_retention_hours * HOUR_MS
+        self._next_run_at = 0.0
+
+    def run_if_due(self):
+        """Run a step if interval_seconds have passed since the last one."""
+        now = time.monotonic()
+        if now < self._next_run_at:
+            return None
+        self._next_run_at = now + self.interval_seconds
+        return self.step()
+
+    def step(self, now_ms=None):
+        """
+        Compact as much as the time budget allows, oldest tier transitions first.
+
+        Args:
+            now_ms (int): Reference time in epoch milliseconds; defaults to now.
+
+        Returns:
+            dict: Rows handled per action ("raw_rolled_up", "minutes_rolled_up", "hours_pruned",
+            "waveform_chunks_pruned").
+        """
+        now_ms = utc_now_epoch_ms() if now_ms is None else now_ms
+        deadline = time.monotonic() + self.time_budget_ms / 1000
+        actions = [
+            ("raw_rolled_up", self.db_manager.rollup_raw_chunk, now_ms - self.raw_retention_ms),
+            ("minutes_rolled_up", self.db_manager.rollup_minute_chunk, now_ms - self.minute_retention_ms),
+        ]
+        if self.hour_retention_ms is not None:
+            actions.append(("hours_pruned", self.db_manager.prune_hour_rollups, now_ms - self.hour_retention_ms))
+        actions.append(("waveform_chunks_pruned", self.db_manager.prune_waveform_chunks,
+                        now_ms - self.waveform_retention_ms))
+
+        done = {name: 0 for name, _, _ in actions}
+        for name, action, cutoff_ms in actions:
+            while time.monotonic() < deadline:
+                handled = action(cutoff_ms, self.chunk_rows)
+                done[name] += handled
+                if handled < self.chunk_rows:
+                    break
+        if any(done.values()):
+            log_info(f"Retention step: {done}")
+        return done
@@ -0,0 +1,234 @@
+"""
+trend_window.py
+Stateful sliding-window trend engine that replaces re-querying SQLite on every tick.
+
+Each new reading is pushed into a per-patient, per-metric ring buffer that only holds the
+last time_window_minutes of samples. Every buffer keeps running aggregates, so pushing a
+reading and asking for the current trend are both O(1) (amortized over evictions):
+
+Running sums:
+The sum and sum of squares of the values in the window give the mean and variance directly.
+
+Monotonic run:
+Each sample gets a sequence number, and the buffer remembers where the current strictly
+increasing run started. The whole window is a rising trend exactly when that run started
+at or before the oldest sample still in the window.
+
+Storage:
+Samples live in two parallel array.array columns (epoch-ms int64 and double), so the
+window holds no per-sample Python objects. Evicted samples are cut off the front in bulk
+once they make up half the arrays. push_batch feeds a whole ReadingBatch column by column,
+and columns() hands the window to NumPy as two flat arrays.
+
+SQLite is only read once at startup (rebuild_from_db) to warm the windows.
+
+Clock:
+Eviction measures the window back from the clock's "now", the wall clock by default. A
+replay passes its ReplayClock instead, so recorded readings are windowed as they were live.
+"""
+import time
+from array import array
+from src.utils.config import TREND_WINDOW_MINUTES, TREND_WINDOW_MAX_SAMPLES, ELEVATED_AVG_HEART_RATE
+from src.data_collection.reading import reading_ts_ms
+from src.utils.timestamps import utc_now_epoch_ms
+from src.utils.metrics import TREND_ANALYSIS_SECONDS
+
+TREND_METRICS = ("heart_rate", "temperature", "oxygen_level")
+
+class MetricWindow:
+    """Time-bounded buffer of (ts, value) samples in parallel arrays, with running aggregates."""
+    def __init__(self, window_ms, max_samples):
+        self.window_ms = window_ms
+        self.max_samples = max_samples
+        self._ts = array("q")
+        self._values = array("d")
+        self._start = 0  # Index of the oldest sample still in the window
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._seq = 0  # Sequence number of the next sample
+        self._run_start_seq = 0
+        self._last_value = None
+
+    def push(self, ts, value):
+        """Add a sample and evict whatever has fallen out of the window."""
+        if self._last_value is None or value <= self._last_value:
+            self._run_start_seq = self._seq
+        self._last_value = value
+
+        if len(self) >= self.max_samples:
+            self._pop_oldest()
+        self._ts.append(ts)
+        self._values.append(value)
+        self._seq += 1
+        self.total += value
+        self.total_sq += value * value
+        self.evict(ts)
+
+    def extend(self, ts_column, value_column):
+        """Push every sample of two parallel columns, skipping NaN (missing) values."""
+        for ts, value in zip(ts_column, value_column):
+            if value == value:
+                self.push(ts, value)
+
+    def evict(self, now_ms):
+        """Drop samples older than the window, relative to now_ms."""
+        threshold = now_ms - self.window_ms
+        while self._start < len(self._ts) and self._ts[self._start] < threshold:
+            self._pop_oldest()
+
+    def _pop_oldest(self):
+        value = self._values[self._start]
+        self._start += 1
+        self.total -= value
+        self.total_sq -= value * value
+        if self._start == len(self._ts):
+            self.total = 0.0
+            self.total_sq = 0.0
+        # Drop evicted slots once they are half the arrays, so compaction stays amortized O(1)
+        if self._start * 2 >= len(self._ts):
+            del self._ts[:self._start]
+            del self._values[:self._start]
+            self._start = 0
+
+    def __len__(self):
+        return len(self._ts) - self._start
+
+    def columns(self):
+        """Return copies of the window's (ts, value) arrays, oldest first."""
+        return self._ts[self._start:], self._values[self._start:]
+
+    def mean(self):
+        """Mean of the values in the window, or None if it is empty."""
+        if not len(self):
+            return None
+        return self.total / len(self)
+
+    def variance(self):
+        """Population variance of the values in the window, or None if it is empty."""
+        if not len(self):
+            return None
+        mean = self.total / len(self)
+        return max(0.0, self.total_sq / len(self) - mean * mean)
+
+    def is_increasing(self, min_samples=3):
+        """Check whether every value in the window is greater than the one before it."""
+        if len(self) < min_samples:
+            return False
+        return self._run_start_seq <= self._seq - len(self)
+
+class TrendWindow:
+    def __init__(self, time_window_minutes=TREND_WINDOW_MINUTES, max_samples=TREND_WINDOW_MAX_SAMPLES,
+                 clock=utc_now_epoch_ms):
+        """
+        Args:
+            time_window_minutes (float): How far back the windows reach.
+            max_samples (int): Most samples kept per patient and metric.
+            clock (callable): Returns "now" in epoch milliseconds.
+        """
+        self.clock = clock
+        self.time_window_minutes = time_window_minutes
+        self.window_ms = time_window_minutes * 60 * 1000
+        self.max_samples = max_samples
+        self._windows = {}  # patient_id -> {metric: MetricWindow}
+
+    def push(self, patient_id, sensor_data, ts_ms=None):
+        """
+        Add a reading to the patient's windows.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            sensor_data (dict): Reading with any of the tracked metrics.
+            ts_ms (int): Capture time in epoch milliseconds; defaults to the reading's
+                timestamp, or now if it has none.
+        """
+        if ts_ms is None:
+            ts_ms = reading_ts_ms(sensor_data)
+        for metric, window in self._windows_for(patient_id).items():
+            value = sensor_data.get(metric)
+            if value is not None:
+                window.push(ts_ms, value)
+
+    def push_batch(self, patient_id, batch):
+        """
+        Add every reading of a ReadingBatch to the patient's windows.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            batch (ReadingBatch): Readings, oldest first.
+        """
+        if not len(batch):
+            return
+        windows = self._windows_for(patient_id)
+        for metric, window in windows.items():
+            window.extend(batch.ts, batch.column(metric))
+
+    def _windows_for(self, patient_id):
+        windows = self._windows.get(patient_id)
+        if windows is None:
+            windows = {metric: MetricWindow(self.window_ms, self.max_samples) for metric in TREND_METRICS}
+            self._windows[patient_id] = windows
+        return windows
+
+    def metric(self, patient_id, metric, now_ms=None):
+        """Return the patient's MetricWindow for a metric, evicted up to now_ms, or None."""
+        windows = self._windows.get(patient_id)
+        if windows is None:
+            return None
+        window = windows[metric]
+        window.evict(self.clock() if now_ms is None else now_ms)
+        return window
+
+    def analyze(self, patient_id, now_ms=None):
+        """
+        Check the patient's current windows for a concerning trend.
+
+        Applies the same rules as analyze_recent_trends, on samples ordered oldest to newest.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            now_ms (int): Evaluation time in epoch milliseconds; defaults to the clock's now.
+
+        Returns:
+            str: An alert message if a concerning trend is detected, else None.
+        """
+        started = time.perf_counter()
+        try:
+            return self._evaluate(patient_id, now_ms)
+        finally:
+            TREND_ANALYSIS_SECONDS.observe(time.perf_counter() - started)
+
+    def _evaluate(self, patient_id, now_ms):
+        heart_rates = self.metric(patient_id, "heart_rate", now_ms)
+        temperatures = self.metric(patient_id, "temperature", now_ms)
+        if heart_rates is None:
+            return None
+
+        if heart_rates.is_increasing():
+            return "Rising trend in heart rate detected - potential concern."
+        if temperatures.is_increasing():
+            return "Rising trend in temperature detected - potential concern."
+
+        if len(heart_rates) >= 3 and heart_rates.mean() > ELEVATED_AVG_HEART_RATE:
+            return f"Elevated average heart rate detected in the last {self.time_window_minutes} minutes."
+
+        return None
+
+    def rebuild_from_db(self, db_manager, patient_id=None):
+        """
+        Warm the windows from readings already stored in SQLite.
+
+        Args:
+            db_manager (DatabaseManager): Local store to read from.
+            patient_id (str): Only rebuild this patient; None rebuilds every patient.
+
+        Returns:
+            int: Number of readings loaded.
+        """
+        since_ms = self.clock() - self.window_ms
+        loaded = 0
+        rows = db_manager.fetch_recent_readings(since_ms, patient_id)
+        for row_patient_id, ts, heart_rate, temperature, oxygen_level in rows:
+            reading = {"heart_rate": heart_rate, "temperature": temperature, "oxygen_level": oxygen_level}
+            self.push(row_patient_id, reading, ts)
+            loaded += 1
+        return loaded
@@ -0,0 +1,221 @@
+"""
+vector_analytics.py
+Vectorized anomaly detection over columnar NumPy arrays, for richer checks than the
+strictly-increasing and high-average rules in data_analyzer and TrendWindow.
+
+Input:
+A window is a dict of equal-length float arrays, "ts" (epoch ms) plus one array per metric,
+with NaN where a reading lacks that metric. Windows come either from SQLite
+(columns_from_db), whose rows np.fromiter pours straight into one preallocated array, or
+from the live TrendWindow arrays (columns_from_trend_window), whose buffer copies NumPy
+wraps as they are. The detectors never loop over readings in Python.
+
+Detectors:
+- zscore: rolling z-score of every sample that arrived since the previous run, each
+  against the ZSCORE_WINDOW_SAMPLES before it, in one pass over a sliding-window view. A
+  short spike between two runs is therefore still scored.
+- ewma: exponentially weighted level, evaluated as one dot product with a weight vector.
+- slope: least-squares slope per minute against capture time.
+- cross-metric: heart rate rising while SpO2 falls, from the two slopes.
+
+Every detector result carries its own cost in microseconds, so the detection rate can be
+matched to what the CPU can spare.
+"""
+import time
+from operator import itemgetter
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from src.utils.config import (
+    ELEVATED_AVG_HEART_RATE, ZSCORE_WINDOW_SAMPLES, ZSCORE_ALERT, EWMA_ALPHA,
+    HR_SLOPE_ALERT_BPM_PER_MIN, SPO2_SLOPE_ALERT_PCT_PER_MIN, VECTOR_ANALYTICS_INTERVAL_SECONDS
+)
+from src.utils.logger import log_sampled
+
+VECTOR_METRICS = ("heart_rate", "temperature", "oxygen_level")
+WINDOW_FIELDS = 1 + len(VECTOR_METRICS)  # ts plus one column per metric
+
+def columns_from_rows(rows, first_field=0):
+    """
+    Build a window from (ts, heart_rate, temperature, oxygen_level) rows, oldest first.
+
+    Args:
+        rows (list): Row tuples; the window's fields start at index first_field.
+        first_field (int): Leading fields to skip in each row, e.g. 1 for a patient_id.
+
+    Returns:
+        dict: "ts" and one float array per metric, None values as NaN.
+    """
+    # map(itemgetter) and np.fromiter run in C and fill one preallocated (n, fields) array
+    pick = itemgetter(*range(first_field, first_field + WINDOW_FIELDS))
+    table = np.fromiter(map(pick, rows), dtype=np.dtype((float, WINDOW_FIELDS)), count=len(rows))
+    window = {"ts": table[:, 0]}
+    for index, metric in enumerate(VECTOR_METRICS, start=1):
+        window[metric] = table[:, index]
+    return window
+
+def columns_from_db(db_manager, since_ms, patient_id):
+    """Load one patient's readings captured at or after since_ms as a window."""
+    return columns_from_rows(db_manager.fetch_recent_readings(since_ms, patient_id), first_field=1)
+
+def columns_from_trend_window(trend_window, patient_id, now_ms=None):
+    """
+    Copy one patient's live TrendWindow buffers into per-metric windows.
+
+    Each metric keeps its own timeline here, so the result maps metric -> (ts, values).
+    """
+    series = {}
+    for metric in VECTOR_METRICS:
+        window = trend_window.metric(patient_id, metric, now_ms)
+        if window is None or not len(window):
+            continue
+        ts, values = window.columns()
+        # The array copies are wrapped as-is; no per-sample Python objects are created
+        series[metric] = (np.frombuffer(ts, dtype=np.int64).astype(float), np.frombuffer(values, dtype=np.float64))
+    return series
+
+def _present(ts, values):
+    """Drop NaN samples so each metric is analyzed on its own readings."""
+    mask = ~np.isnan(values)
+    return ts[mask], values[mask]
+
+def rolling_zscores(values, window, start=0):
+    """
+    Z-score of each sample from position start on against the window samples before it.
+
+    Args:
+        values (ndarray): Samples, oldest first.
+        window (int): Number of preceding samples each score is measured against.
+        start (int): First position to score; earlier samples only serve as history.
+
+    Returns:
+        ndarray: One z-score per scored sample (0.0 against a flat window), starting at
+            max(start, window); empty when there is nothing to score.
+    """
+    first = max(start, window)
+    if first >= len(values):
+        return np.empty(0)
+    # Row k views the window samples just before position first + k; nothing is copied
+    trailing = sliding_window_view(values[first - window:len(values) - 1], window)
+    mean = trailing.mean(axis=1)
+    std = trailing.std(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(std > 1e-9, (values[first:] - mean) / std, 0.0)
+
+def ewma(values, alpha):
+    """Final exponentially weighted moving average (recursive form seeded with the first value)."""
+    n = len(values)
+    if n == 0:
+        return None
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (n - 1)
+    return float(np.dot(weights, values))
+
+def slope_per_minute(ts, values):
+    """Least-squares slope of values against time, in units per minute."""
+    if len(values) < 3:
+        return None
+    minutes = (ts - ts[0]) / 60000.0
+    spread = minutes - minutes.mean()
+    denominator = np.dot(spread, spread)
+    if denominator == 0:
+        return None
+    return float(np.dot(spread, values - values.mean()) / denominator)
+
+def _timed(name, detector):
+    """Run a detector and attach its cost in microseconds."""
+    started = time.perf_counter()
+    alert, value = detector()
+    return {"detector": name, "alert": alert, "value": value,
+            "cost_us": round((time.perf_counter() - started) * 1e6, 1)}
+
+def run_detectors(series, scored_until=None):
+    """
+    Run every detector over a patient's per-metric series.
+
+    Args:
+        series (dict): metric -> (ts array, values array), as from columns_from_trend_window.
+            A columnar window from columns_from_db can be passed through split_window first.
+        scored_until (dict): metric -> capture time of the last sample an earlier run
+            z-scored; only later samples are scored. Missing metrics score every sample.
+
+    Returns:
+        list: One dict per detector with "detector", "alert" (str or None), "value" and "cost_us".
+    """
+    results = []
+    slopes = {}
+    for metric, (ts, values) in series.items():
+        ts, values = _present(ts, values)
+        if not len(values):
+            continue
+
+        def zscore(ts=ts, values=values, metric=metric):
+            since = (scored_until or {}).get(metric)
+            start = 0 if since is None else int(np.searchsorted(ts, since, side="right"))
+            scores = rolling_zscores(values, ZSCORE_WINDOW_SAMPLES, start)
+            if not len(scores):
+                return None, None
+            worst = float(scores[np.argmax(np.abs(scores))])
+            alert = f"Unusual {metric} reading (z-score {worst:.1f})." if abs(worst) >= ZSCORE_ALERT else None
+            return alert, worst
+        results.append(_timed(f"zscore:{metric}", zscore))
+
+        def slope(ts=ts, values=values, metric=metric):
+            slopes[metric] = slope_per_minute(ts, values)
+            return None, slopes[metric]
+        results.append(_timed(f"slope:{metric}", slope))
+
+        if metric == "heart_rate":
+            def level(values=values):
+                value = ewma(values, EWMA_ALPHA)
+                alert = "Elevated smoothed heart rate (EWMA)." if value > ELEVATED_AVG_HEART_RATE else None
+                return alert, value
+            results.append(_timed("ewma:heart_rate", level))
+
+    def rising_hr_falling_spo2():
+        hr_slope, spo2_slope = slopes.get("heart_rate"), slopes.get("oxygen_level")
+        if hr_slope is None or spo2_slope is None:
+            return None, None
+        if hr_slope >= HR_SLOPE_ALERT_BPM_PER_MIN and spo2_slope <= SPO2_SLOPE_ALERT_PCT_PER_MIN:
+            return "Heart rate rising while SpO2 falls - potential concern.", (hr_slope, spo2_slope)
+        return None, (hr_slope, spo2_slope)
+    results.append(_timed("cross:hr_up_spo2_down", rising_hr_falling_spo2))
+    return results
+
+def split_window(window):
+    """Turn a columnar window into the per-metric series run_detectors expects."""
+    return {metric: (window["ts"], window[metric]) for metric in VECTOR_METRICS}
+
+class VectorAnalyzer:
+    def __init__(self, interval_seconds=VECTOR_ANALYTICS_INTERVAL_SECONDS):
+        """
+        Args:
+            interval_seconds (float): Minimum time between runs started by run_if_due.
+        """
+        self.interval_seconds = interval_seconds
+        self._next_run_at = {}  # patient_id -> monotonic time of the next run
+        self._scored_until = {}  # patient_id -> {metric: ts of the last z-scored sample}
+
+    def run_if_due(self, trend_window, patient_id, now_ms=None):
+        """
+        Run the detectors over the patient's live window if interval_seconds have passed
+        since they last ran for that patient.
+
+        Args:
+            trend_window (TrendWindow): Live windows to read.
+            patient_id (str): Unique identifier for the patient.
+            now_ms (int): Time the window is evicted up to; defaults to the window's clock.
+
+        Returns:
+            dict: Detector name -> alert message for every detector that alerted in this
+                run; None if no run was due.
+        """
+        now = time.monotonic()
+        if now < self._next_run_at.get(patient_id, 0.0):
+            return None
+        self._next_run_at[patient_id] = now + self.interval_seconds
+        series = columns_from_trend_window(trend_window, patient_id, now_ms)
+        results = run_detectors(series, self._scored_until.get(patient_id))
+        self._scored_until[patient_id] = {metric: ts[-1] for metric, (ts, _) in series.items()}
+        cost_us = sum(result["cost_us"] for result in results)
+        log_sampled("vector-analytics", lambda: f"Vector analytics ran {len(results)} detectors in {cost_us:.0f} us.")
+        return {result["detector"]: result["alert"] for result in results if result["alert"]}
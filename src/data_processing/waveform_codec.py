@@ -0,0 +1,60 @@
+"""
+waveform_codec.py
+Packs waveform samples into compact chunk blobs for the waveform_chunks table.
+
+Encoding ("delta-zlib"):
+Samples are quantized to integer multiples of the block's resolution, delta-encoded (the
+first value, then the difference to each previous one), laid out as little-endian int64
+and compressed with zlib. Neighbouring samples of a physiological signal differ little, so
+the deltas are small numbers whose high bytes are zero, and zlib shrinks them several
+times over. Quantization is the only loss: a decoded sample is within resolution / 2 of
+the original.
+
+Only the standard library is used, so every device can read every chunk.
+"""
+from array import array
+from itertools import accumulate
+import sys
+import zlib
+from src.utils.config import WAVEFORM_COMPRESSION_LEVEL
+
+DELTA_ZLIB = "delta-zlib"
+
+def encode_samples(samples, resolution, level=WAVEFORM_COMPRESSION_LEVEL):
+    """
+    Encode samples as a delta-zlib blob.
+
+    Args:
+        samples (sequence): Sample values, oldest first.
+        resolution (float): Quantization step, in the signal's units.
+        level (int): zlib compression level, 1 (fastest) to 9 (smallest).
+
+    Returns:
+        bytes: The encoded chunk.
+    """
+    quantized = [round(value / resolution) for value in samples]
+    deltas = array("q", quantized[:1])
+    deltas.extend(current - previous for previous, current in zip(quantized, quantized[1:]))
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes(), level)
+
+def decode_samples(blob, resolution, encoding=DELTA_ZLIB):
+    """
+    Decode a chunk blob back into sample values.
+
+    Args:
+        blob (bytes): Encoded chunk.
+        resolution (float): Quantization step the chunk was encoded with.
+        encoding (str): Encoding recorded with the chunk.
+
+    Returns:
+        array: Sample values as doubles, oldest first.
+    """
+    if encoding != DELTA_ZLIB:
+        raise ValueError(f"Unknown waveform encoding '{encoding}'")
+    deltas = array("q")
+    deltas.frombytes(zlib.decompress(blob))
+    if sys.byteorder != "little":
+        deltas.byteswap()
+    return array("d", (value * resolution for value in accumulate(deltas)))
@@ -0,0 +1,188 @@
+"""
+alert_channel.py
+Fast lane for alerts, kept apart from the routine data path and its backlog.
+
+How an alert travels:
+raise_alert stores the alert in the SQLite alerts table and commits it with
+synchronous=FULL, then puts it on the channel's priority queue. A dedicated sender thread
+posts it to the backend's alerts endpoint over the channel's own keep-alive session, so it
+never waits behind routine uploads or backlog retries. Lower priority numbers go first.
+
+Connection:
+The session is warmed when the channel starts and after a failure, so the first alert does
+not pay for TCP or TLS setup. The JWT token comes from the Transmitter's TokenManager.
+
+Delivery:
+A failed send is retried after ALERT_RETRY_SECONDS. Alerts still unsent at startup are
+reloaded from SQLite, so a crash or reboot does not lose them.
+
+Latency:
+The time from raise_alert to the backend's acknowledgement is recorded for each alert, and
+metrics() reports p50/p99/max against ALERT_LATENCY_TARGET_MS.
+"""
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+import requests
+from src.data_collection.reading import reading_ts_ms
+from src.data_processing.data_converter import convert_to_backend_format
+from src.utils.config import DEVICE_ID, HTTP_TIMEOUT_SECONDS, ALERT_LATENCY_TARGET_MS, ALERT_RETRY_SECONDS
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import HTTP_REQUEST_SECONDS
+from src.utils.timestamps import epoch_ms_to_iso
+
+# Priorities used by the edge agent; lower is more urgent
+PRIORITY_THRESHOLD = 0
+PRIORITY_TREND = 1
+
+class AlertChannel:
+    def __init__(self, transmitter, db_manager, device_id=DEVICE_ID,
+                 latency_target_ms=ALERT_LATENCY_TARGET_MS, retry_seconds=ALERT_RETRY_SECONDS):
+        """
+        Args:
+            transmitter (Transmitter): Source of the backend URL and the shared JWT token.
+            db_manager (DatabaseManager): Durable store for alerts.
+            device_id (str): Unique identifier for the device.
+            latency_target_ms (float): End-to-end latency each alert should meet.
+            retry_seconds (float): Delay before a failed send is retried.
+        """
+        self.transmitter = transmitter
+        self.db_manager = db_manager
+        self.device_id = device_id
+        self.latency_target_ms = latency_target_ms
+        self.retry_seconds = retry_seconds
+        self.session = requests.Session()
+        self.queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._latencies_ms = deque(maxlen=1000)
+        self._sent = 0
+        self._failures = 0
+        self._over_target = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Reload unsent alerts, warm the connection and start the sender thread."""
+        for alert_id, patient_id, priority, payload in self.db_manager.fetch_unsent_alerts():
+            self._enqueue(priority, alert_id, patient_id, payload)
+        self.warm()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-channel", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the sender thread; alerts still queued stay 'unsent' in SQLite."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.session.close()
+
+    def warm(self):
+        """Open a keep-alive connection to the backend ahead of the next alert."""
+        try:
+            self.session.head(self.transmitter.backend_url, timeout=HTTP_TIMEOUT_SECONDS)
+        except requests.exceptions.RequestException as e:
+            log_error(f"Alert channel could not warm its connection: {e}")
+
+    def raise_alert(self, patient_id, alert_type, sensor_data, record_id=None, priority=PRIORITY_THRESHOLD,
+                    device_id=None):
+        """
+        Persist an alert durably and queue it for immediate sending.
+
+        Args:
+            patient_id (str): Unique identifier for the patient.
+            alert_type (str): Alert name or message.
+            sensor_data (dict): Reading that triggered the alert.
+            record_id (int): sensor_data row of the reading, if stored.
+            priority (int): Lower numbers are sent first.
+            device_id (str): Device that produced the reading; defaults to the channel's.
+
+        Returns:
+            int: ID of the stored alert, or None if it could not be stored (it is still sent).
+        """
+        device_id = device_id or self.device_id
+        ts = reading_ts_ms(sensor_data)
+        payload = {
+            "deviceId": device_id,
+            "patientId": patient_id,
+            "alertType": alert_type,
+            "priority": priority,
+            "timestamp": epoch_ms_to_iso(ts),
+            "reading": convert_to_backend_format(sensor_data, device_id=device_id, patient_id=patient_id)
+        }
+        alert_id = self.db_manager.save_alert(device_id, patient_id, record_id, alert_type, priority, ts, payload)
+        self._enqueue(priority, alert_id, patient_id, payload)
+        return alert_id
+
+    def _enqueue(self, priority, alert_id, patient_id, payload):
+        self.queue.put((priority, next(self._seq), alert_id, patient_id, payload, time.monotonic()))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            priority, _, alert_id, patient_id, payload, raised_at = item
+            if self._send(patient_id, payload):
+                if alert_id is not None:
+                    self.db_manager.update_alert_tx_status(alert_id, 'sent')
+                self._record_latency((time.monotonic() - raised_at) * 1000, payload["alertType"])
+            else:
+                self._failures += 1
+                self.queue.put(item)
+                if self._stop.wait(self.retry_seconds):
+                    return
+                self.warm()
+
+    def _send(self, patient_id, payload):
+        """POST one alert, refreshing the shared token once on a 401."""
+        endpoint = f"{self.transmitter.backend_url}/api/patients/{patient_id}/alerts"
+        token = self.transmitter.tokens.get()
+        for attempt in range(2):
+            if not token:
+                log_error("Authentication failed. Cannot send alert.")
+                return False
+            headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+            started, status = time.perf_counter(), "error"
+            try:
+                response = self.session.post(endpoint, json=payload, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
+                status = response.status_code
+                if response.status_code == 401 and attempt == 0:
+                    token = self.transmitter.tokens.refresh(token)
+                    continue
+                response.raise_for_status()
+                return True
+            except requests.exceptions.RequestException as e:
+                log_error(f"Failed to send alert '{payload['alertType']}': {e}")
+                return False
+            finally:
+                HTTP_REQUEST_SECONDS.labels("alerts", status).observe(time.perf_counter() - started)
+        return False
+
+    def _record_latency(self, latency_ms, alert_type):
+        self._sent += 1
+        self._latencies_ms.append(latency_ms)
+        if latency_ms > self.latency_target_ms:
+            self._over_target += 1
+            log_error(f"Alert '{alert_type}' took {latency_ms:.0f} ms, over the {self.latency_target_ms} ms target.")
+        else:
+            log_info(f"Alert '{alert_type}' delivered in {latency_ms:.0f} ms.")
+
+    def metrics(self):
+        """Return delivery counts and end-to-end latency figures for recent alerts."""
+        ordered = sorted(self._latencies_ms)
+        def pick(fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3) if ordered else 0.0
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self._sent,
+            "failures": self._failures,
+            "over_target": self._over_target,
+            "p50_ms": pick(0.50),
+            "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1], 3) if ordered else 0.0
+        }
@@ -0,0 +1,161 @@
+"""
+async_transmitter.py
+asyncio transport backend for Transmitter. It keeps Transmitter's public API, but record
+uploads run as coroutines on a private event loop, so several POSTs can be in flight at
+once instead of one round-trip at a time.
+
+Event loop:
+The loop runs on its own daemon thread. Synchronous callers (main loop, pipeline stages,
+backlog drainer) hand coroutines to it with run_coroutine_threadsafe and wait for the
+result, so nothing outside this module has to be async.
+
+Concurrency and pooling:
+One aiohttp.ClientSession with a bounded TCPConnector is shared by every request, and a
+semaphore caps the number of in-flight POSTs at max_in_flight.
+
+Token refresh:
+Tokens come from the Transmitter's TokenManager, which refreshes them in the background
+before they expire. Each request remembers the token it was sent with; on a 401 it asks
+the manager for a refresh with that stale token. Refreshes are single-flight: the first
+caller re-authenticates, and everyone queued behind it sees the token has already changed
+and simply retries with the new one, so a burst of parallel 401s costs one auth call.
+Round trips run on a worker thread, so the event loop never blocks on authentication.
+
+Bodies are encoded with the same negotiated codec as the synchronous backend. Each POST
+gets its own ClientTimeout, cut to the time left before the caller's deadline.
+
+Results are recorded in the transmission ledger on the calling thread, never on the loop:
+a chunk's acknowledgements in one transaction, and failed records released for retry.
+"""
+import asyncio
+import threading
+import time
+import aiohttp
+from src.utils.config import BACKEND_URL, AUTH_ENDPOINT, HTTP_TIMEOUT_SECONDS, HTTP_MAX_IN_FLIGHT, TOKEN_CACHE_PATH
+from src.utils.logger import log_info, log_error, log_sampled
+from src.utils.metrics import HTTP_REQUEST_SECONDS
+from src.data_transmission.transmitter import Transmitter, request_timeout
+
+class AsyncTransmitter(Transmitter):
+    def __init__(self, max_in_flight=HTTP_MAX_IN_FLIGHT, backend_url=BACKEND_URL,
+                 auth_endpoint=AUTH_ENDPOINT, db_manager=None, token_cache_path=TOKEN_CACHE_PATH):
+        """
+        Args:
+            max_in_flight (int): Upper bound on concurrent backend requests.
+            backend_url, auth_endpoint, db_manager, token_cache_path: As for Transmitter.
+        """
+        super().__init__(backend_url, auth_endpoint, db_manager, token_cache_path=token_cache_path)
+        self.max_in_flight = max(1, max_in_flight)
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="tx-async", daemon=True)
+        self._loop_thread.start()
+        self._aio_session = None
+        self._in_flight = None
+        self._run(self._open())
+        self.backlog_drainer.send_many = self.send_many
+
+    def _run(self, coro):
+        """Run a coroutine on the transmitter's event loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _open(self):
+        """Create the loop-bound session and semaphore."""
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+        self._aio_session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS)
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    async def _refresh_token(self, stale_token):
+        """
+        Get a token from the TokenManager without blocking the event loop.
+
+        Args:
+            stale_token (str): Token the backend rejected, or None when the caller has no
+                token yet.
+
+        Returns:
+            str: A valid token, or None if authentication failed.
+        """
+        if stale_token is None:
+            token = self.tokens.current()
+            if token:
+                return token
+            return await asyncio.get_running_loop().run_in_executor(None, self.tokens.get)
+        return await asyncio.get_running_loop().run_in_executor(None, self.tokens.refresh, stale_token)
+
+    async def _post_record(self, data, patient_id, deadline=None):
+        """POST one record, refreshing the token once on a 401. Returns True on success."""
+        endpoint = f"{self.backend_url}/api/patients/{patient_id}/device-data"
+        async with self._in_flight:
+            token = await self._refresh_token(None)
+            for attempt in range(2):
+                if not token:
+                    log_error("Authentication failed. Cannot send data.")
+                    return False
+                body, headers = self.encode_upload(data)
+                headers['Authorization'] = f'Bearer {token}'
+                if "idempotencyKey" in data:
+                    headers['Idempotency-Key'] = data["idempotencyKey"]
+                started, status = time.perf_counter(), "error"
+                # Computed after queueing on the semaphore, so waiting counts against the deadline
+                timeout = aiohttp.ClientTimeout(total=request_timeout(deadline))
+                try:
+                    async with self._aio_session.post(endpoint, data=body, headers=headers, timeout=timeout) as response:
+                        status = response.status
+                        if response.status == 401 and attempt == 0:
+                            token = await self._refresh_token(token)
+                            continue
+                        if response.status == 415 and attempt == 0 and self.use_plain_json():
+                            log_info("Backend rejected the upload encoding; switching to plain JSON.")
+                            continue
+                        response.raise_for_status()
+                        return True
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    log_error(f"Failed to send data: {e}")
+                    return False
+                finally:
+                    HTTP_REQUEST_SECONDS.labels("device-data", status).observe(time.perf_counter() - started)
+            return False
+
+    async def _post_many(self, records, deadline=None):
+        return await asyncio.gather(*(self._post_record(data, patient_id, deadline) for data, patient_id, _ in records))
+
+    def send_data_http(self, data, patient_id, record_id=None, deadline=None):
+        """Send data via HTTP POST to the backend with JWT authentication."""
+        return self.send_many([(data, patient_id, record_id)], deadline)[0]
+
+    def send_many(self, records, deadline=None):
+        """
+        Send several records concurrently, at most max_in_flight at a time.
+
+        Args:
+            records (list): (backend_data, patient_id, record_id) tuples; stored records
+                should already be claimed.
+            deadline (float): Optional time.monotonic() value every POST must finish by.
+
+        Returns:
+            list: One success flag per record, in input order.
+        """
+        if not records:
+            return []
+        results = self._run(self._post_many(records, deadline))
+        acked = [record_id for (_, _, record_id), ok in zip(records, results) if ok and record_id is not None]
+        failed = [record_id for (_, _, record_id), ok in zip(records, results) if not ok and record_id is not None]
+        # Acknowledgements for the whole chunk are recorded in one transaction
+        self.db_manager.mark_acked(acked)
+        self.db_manager.release_claims(failed)
+        if acked:
+            log_sampled("record-sent", lambda: f"{len(acked)} records sent successfully and marked as 'sent'.")
+        return results
+
+    async def _close_session(self):
+        await self._aio_session.close()
+
+    def close(self):
+        """Close the async session, stop the event loop, then release the sync resources."""
+        self._run(self._close_session())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        super().close()
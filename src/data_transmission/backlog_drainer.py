@@ -0,0 +1,177 @@
+"""
+backlog_drainer.py
+Drains the SQLite backlog of unsent records in small, bounded steps so a long backend
+outage never stalls the main loop.
+
+How a drain tick works:
+Records are read in id-ordered pages using a keyset cursor (id > last_id), so each page
+costs the same no matter how large the backlog is. Alert-bearing records are drained
+first, then routine records. Each tick stops once its time or byte budget is spent, and
+the cursors remember where to resume on the next tick. Every send is given the tick's
+deadline, so a single slow request cannot overrun the time budget either. No send is
+started with less than min_request_ms of the budget left: a request cut off that early
+would likely reach the backend anyway and only be posted again on the next tick.
+
+Backoff:
+When a send fails, the drainer waits before trying again. The delay doubles with each
+consecutive failure up to a maximum, and full jitter spreads retries from many devices.
+
+Concurrent sends:
+If a send_many callable is given, the records of each page that fit the budgets are sent
+together as one concurrent chunk instead of one at a time. A failure anywhere in the chunk
+ends the tick; records that failed stay 'unsent' and are picked up when the pass restarts.
+
+Claims:
+The records of each page slice are claimed in the transmission ledger before they are
+sent, and any the tick did not get to are released again. Records the live path claimed
+in the meantime are skipped, so a record is never posted twice at once. After each full
+routine pass, records claimed more than in_flight_timeout_seconds ago without an
+acknowledgement are requeued.
+"""
+import json
+import random
+import time
+from src.data_processing.data_converter import backend_record
+from src.utils.config import (
+    BACKLOG_PAGE_SIZE, BACKLOG_TIME_BUDGET_MS, BACKLOG_MIN_REQUEST_MS, BACKLOG_BYTE_BUDGET,
+    BACKLOG_BACKOFF_BASE_SECONDS, BACKLOG_BACKOFF_MAX_SECONDS, TRANSMIT_IN_FLIGHT_TIMEOUT_SECONDS
+)
+from src.utils.logger import log_info, log_error
+from src.utils.timestamps import utc_now_epoch_ms, iso_to_epoch_ms
+
+class BacklogDrainer:
+    def __init__(self, db_manager, send_record, page_size=BACKLOG_PAGE_SIZE,
+                 time_budget_ms=BACKLOG_TIME_BUDGET_MS, byte_budget=BACKLOG_BYTE_BUDGET,
+                 backoff_base_seconds=BACKLOG_BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds=BACKLOG_BACKOFF_MAX_SECONDS, send_many=None,
+                 in_flight_timeout_seconds=TRANSMIT_IN_FLIGHT_TIMEOUT_SECONDS,
+                 min_request_ms=BACKLOG_MIN_REQUEST_MS):
+        """
+        Args:
+            db_manager (DatabaseManager): Source of unsent records.
+            send_record (callable): send_record(backend_data, patient_id, record_id, deadline)
+                -> bool for a record the drainer has already claimed; expected to give up by
+                deadline (a time.monotonic() value), to mark the record as sent on success
+                or once a streaming transport acknowledges it, and to release the claim on
+                failure.
+            page_size (int): Records read per keyset page.
+            time_budget_ms (int): Max time spent per drain tick.
+            byte_budget (int): Max serialized payload bytes sent per drain tick.
+            backoff_base_seconds (float): Delay after the first failure.
+            backoff_max_seconds (float): Upper bound for the retry delay.
+            send_many (callable): Optional send_many(records, deadline) -> list of bool,
+                taking (backend_data, patient_id, record_id) tuples of claimed records and
+                sending them concurrently by deadline.
+            in_flight_timeout_seconds (float): Age after which an unacknowledged claim is
+                requeued.
+            min_request_ms (int): Least time left in the tick for another send to start.
+        """
+        self.db_manager = db_manager
+        self.send_record = send_record
+        self.page_size = page_size
+        self.time_budget_ms = time_budget_ms
+        self.byte_budget = byte_budget
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.send_many = send_many
+        self.in_flight_timeout_seconds = in_flight_timeout_seconds
+        self.min_request_ms = min_request_ms
+        self._cursors = {True: 0, False: 0}  # Last drained id for the alert and routine passes
+        self._failures = 0
+        self._next_attempt_at = 0.0
+
+    def drain(self):
+        """
+        Send as much of the backlog as the per-tick budgets allow.
+
+        Returns:
+            int: Number of records sent during this tick.
+        """
+        now = time.monotonic()
+        if now < self._next_attempt_at:
+            return 0
+
+        deadline = now + self.time_budget_ms / 1000
+        # No new send starts after last_start; a tiny budget still leaves half of it for sends
+        last_start = deadline - min(self.min_request_ms, self.time_budget_ms / 2) / 1000
+        bytes_sent = 0
+        sent = 0
+        for alerts in (True, False):
+            while True:
+                page = self.db_manager.fetch_unsent_page(
+                    after_id=self._cursors[alerts], limit=self.page_size, alerts=alerts
+                )
+                if not page:
+                    # Pass complete; start over next tick to pick up anything left behind
+                    self._cursors[alerts] = 0
+                    if not alerts:
+                        self._requeue_stale_claims()
+                    break
+
+                chunk = []
+                budget_reached = False
+                for record in page:
+                    if time.monotonic() >= last_start or bytes_sent >= self.byte_budget:
+                        budget_reached = True
+                        break
+                    record_id, patient_id, backend_data = self._to_backend_record(record)
+                    chunk.append((backend_data, patient_id, record_id))
+                    bytes_sent += len(json.dumps(backend_data))
+                if not chunk:
+                    log_info(f"Backlog drain budget reached after {sent} records.")
+                    return sent
+                last_id = chunk[-1][2]
+
+                # Rows the live path claimed since the page was read are skipped
+                claimed = set(self.db_manager.claim_for_send([record_id for _, _, record_id in chunk]))
+                chunk = [record for record in chunk if record[2] in claimed]
+
+                if self.send_many is None:
+                    for index, (backend_data, patient_id, record_id) in enumerate(chunk):
+                        if time.monotonic() >= last_start:
+                            self.db_manager.release_claims([rid for _, _, rid in chunk[index:]])
+                            log_info(f"Backlog drain budget reached after {sent} records.")
+                            return sent
+                        if not self.send_record(backend_data, patient_id, record_id, deadline=deadline):
+                            self.db_manager.release_claims([rid for _, _, rid in chunk[index + 1:]])
+                            self._register_failure()
+                            return sent
+                        self._failures = 0
+                        self._cursors[alerts] = record_id
+                        sent += 1
+                elif chunk:
+                    results = self.send_many(chunk, deadline=deadline)
+                    sent += sum(1 for ok in results if ok)
+                    if not all(results):
+                        self._register_failure()
+                        return sent
+                    self._failures = 0
+                self._cursors[alerts] = last_id
+
+                if budget_reached:
+                    log_info(f"Backlog drain budget reached after {sent} records.")
+                    return sent
+
+        if sent:
+            log_info(f"Backlog drain sent {sent} records ({bytes_sent} bytes).")
+        return sent
+
+    def _requeue_stale_claims(self):
+        """Requeue records whose send was never acknowledged within in_flight_timeout_seconds."""
+        self.db_manager.requeue_in_flight(claimed_before_ms=utc_now_epoch_ms() - int(self.in_flight_timeout_seconds * 1000))
+
+    def _to_backend_record(self, record):
+        """Rebuild the backend payload for a row returned by fetch_unsent_page."""
+        (record_id, device_id, patient_id, timestamp, heart_rate, temperature,
+         oxygen_level, steps_count, calories_burned) = record
+        backend_data = backend_record(device_id, patient_id, iso_to_epoch_ms(timestamp), heart_rate, steps_count,
+                                      calories_burned, oxygen_level, temperature, record_id)
+        return record_id, patient_id, backend_data
+
+    def _register_failure(self):
+        """Schedule the next attempt using exponential backoff with full jitter."""
+        self._failures += 1
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (self._failures - 1))
+        delay = random.uniform(0, delay)
+        self._next_attempt_at = time.monotonic() + delay
+        log_error(f"Backlog send failed ({self._failures} in a row); next attempt in {delay:.1f}s.")
@@ -0,0 +1,146 @@
+"""
+mqtt_transport.py
+MQTT transport for streaming vitals over one long-lived connection instead of one HTTP
+request per reading.
+
+Session:
+The client connects with a fixed client ID and clean_session=False, so the broker keeps
+the session, and QoS 1 messages that were in flight are redelivered after a reconnect.
+paho's network thread handles keep-alives and reconnects with backoff.
+
+Publishing:
+Each record is published with QoS 1 to a per-patient topic,
+"{MQTT_TOPIC_PREFIX}/{patient_id}/device-data", encoded by payload_codec. paho caps the
+number of unacknowledged messages at MQTT_MAX_INFLIGHT. send() also refuses new records
+once MQTT_MAX_QUEUED are awaiting their PUBACK. Refused records stay 'unsent' for the
+backlog drainer. While the broker is unreachable, paho still queues QoS 1 messages
+(publish() answers MQTT_ERR_NO_CONN) and sends them after reconnecting, so such a record
+counts as accepted and waits for its PUBACK like any other; it is never published twice.
+
+Acknowledgements:
+Each PUBACK is matched to its message ID and then to the record ID, and on_ack marks the
+record as sent. A PUBACK can arrive before publish() has returned the message ID, so
+early acknowledgements are parked until the mapping is recorded. Parked acknowledgements
+are dropped on every reconnect, so a stale one can never match a reused message ID.
+
+paho-mqtt (2.0 or later, for the VERSION2 callback API) is only imported when
+TRANSMIT_TRANSPORT is "mqtt".
+"""
+import threading
+import paho.mqtt.client as mqtt
+from src.data_transmission.payload_codec import encode_payload
+from src.data_transmission.transport import Transport
+from src.utils.config import (
+    DEVICE_ID, USERNAME, PASSWORD, MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE_SECONDS, MQTT_TOPIC_PREFIX,
+    MQTT_MAX_INFLIGHT, MQTT_MAX_QUEUED, UPLOAD_COMPRESSION
+)
+from src.utils.logger import log_info, log_error
+
+class MqttTransport(Transport):
+    name = "mqtt"
+
+    def __init__(self, host=MQTT_HOST, port=MQTT_PORT, client_id=DEVICE_ID, username=USERNAME,
+                 password=PASSWORD, topic_prefix=MQTT_TOPIC_PREFIX, max_inflight=MQTT_MAX_INFLIGHT,
+                 max_queued=MQTT_MAX_QUEUED, keepalive_seconds=MQTT_KEEPALIVE_SECONDS,
+                 compression=UPLOAD_COMPRESSION):
+        """
+        Args:
+            host (str), port (int): Broker address.
+            client_id (str): Stable client ID that names the persistent session.
+            username (str), password (str): Broker credentials; None connects anonymously.
+            topic_prefix (str): First topic level; records go to prefix/patient_id/device-data.
+            max_inflight (int): QoS 1 messages sent but not yet acknowledged.
+            max_queued (int): Records awaiting a PUBACK before send() refuses new ones.
+            keepalive_seconds (int): MQTT keep-alive interval.
+            compression (str): payload_codec compression for message bodies.
+        """
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.topic_prefix = topic_prefix
+        self.max_queued = max_queued
+        self.keepalive_seconds = keepalive_seconds
+        self.compression = compression
+        self.acked = 0
+        self._lock = threading.Lock()
+        self._pending = {}  # mid -> record_id
+        self._early_acks = set()
+        self._connected = threading.Event()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, clean_session=False)
+        if username is not None:
+            self.client.username_pw_set(username, password)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.max_queued_messages_set(max_queued)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+
+    def topic_for(self, patient_id):
+        return f"{self.topic_prefix}/{patient_id}/device-data"
+
+    def start(self, timeout=5.0):
+        """Connect in the background and wait briefly for the broker to accept."""
+        self.client.connect_async(self.host, self.port, keepalive=self.keepalive_seconds)
+        self.client.loop_start()
+        if not self._connected.wait(timeout):
+            log_error(f"MQTT broker {self.host}:{self.port} not reachable yet; will keep retrying.")
+
+    def send(self, data, patient_id, record_id=None):
+        """Publish a record with QoS 1. Returns True if it was queued for delivery."""
+        with self._lock:
+            if len(self._pending) >= self.max_queued:
+                return False
+        body, _ = encode_payload(data, compression=self.compression)
+        info = self.client.publish(self.topic_for(patient_id), body, qos=1)
+        # NO_CONN: paho keeps the QoS 1 message and sends it once the connection is back
+        if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+            log_error(f"MQTT publish failed: {mqtt.error_string(info.rc)}")
+            return False
+
+        with self._lock:
+            if info.mid in self._early_acks:
+                self._early_acks.discard(info.mid)
+                acked = True
+            else:
+                self._pending[info.mid] = record_id
+                acked = False
+        if acked:
+            self.acked += 1
+            self._acknowledge(record_id)
+        return True
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        with self._lock:
+            if mid not in self._pending:
+                self._early_acks.add(mid)
+                return
+            record_id = self._pending.pop(mid)
+        self.acked += 1
+        self._acknowledge(record_id)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code.is_failure:
+            log_error(f"MQTT connection refused: {reason_code}")
+            return
+        with self._lock:
+            self._early_acks.clear()
+        self._connected.set()
+        log_info(f"Connected to MQTT broker {self.host}:{self.port} (session present: {flags.session_present}).")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        self._connected.clear()
+        if reason_code.is_failure:
+            log_error(f"Disconnected from MQTT broker: {reason_code}")
+        else:
+            log_info("Disconnected from MQTT broker.")
+
+    def pending(self):
+        """Number of records published but not yet acknowledged."""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
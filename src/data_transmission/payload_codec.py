@@ -0,0 +1,132 @@
+"""
+payload_codec.py
+Encodes upload payloads for the backend and decodes them again for local testing.
+
+Encodings:
+- json: plain JSON, records exactly as converted, null fields included. This is the
+  default wire format every consumer already reads, so it is never trimmed.
+- columnar: for batches, one array per field instead of one object per record, serialized
+  with MessagePack. Field names are sent once per batch rather than once per reading, and
+  null fields are left out. It is only used when configured (UPLOAD_BATCH_ENCODING) and
+  accepted by the backend, which has to understand its Content-Type.
+
+Compression:
+Either encoding can be compressed with gzip (standard library) or zstd (needs the
+zstandard package). The matching Content-Type and Content-Encoding headers are returned
+with the body, so the backend can pick the right decoder.
+
+msgpack and zstandard are optional; asking for them when they are not installed raises
+ValueError, and the transmitter falls back to plain JSON.
+"""
+import gzip
+import json
+
+JSON_CONTENT_TYPE = "application/json"
+COLUMNAR_CONTENT_TYPE = "application/vnd.vitaledge.columnar+msgpack"
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def to_columns(records):
+    """
+    Pivot backend records into column arrays.
+
+    Returns:
+        dict: {"count": n, "columns": {field: [values]}}, with columns that are null for
+            every record left out.
+    """
+    fields = []
+    for record in records:
+        for key in record:
+            if key not in fields:
+                fields.append(key)
+    columns = {}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        if any(value is not None for value in values):
+            columns[field] = values
+    return {"count": len(records), "columns": columns}
+
+def from_columns(frame):
+    """Rebuild the list of records from a columnar frame, omitting null fields."""
+    records = [{} for _ in range(frame["count"])]
+    for field, values in frame["columns"].items():
+        for record, value in zip(records, values):
+            if value is not None:
+                record[field] = value
+    return records
+
+def compress(body, compression):
+    """Compress bytes with 'gzip', 'zstd' or 'identity'."""
+    if compression == "identity":
+        return body
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package.")
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    raise ValueError(f"Unknown compression '{compression}'.")
+
+def decompress(body, compression):
+    """Reverse compress()."""
+    if compression in (None, "identity"):
+        return body
+    if compression == "gzip":
+        return gzip.decompress(body)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unknown compression '{compression}'.")
+
+def encode_payload(payload, encoding="json", compression="identity"):
+    """
+    Serialize a record or list of records for upload.
+
+    Args:
+        payload (dict or list): A backend record, or a list of them for a batch.
+        encoding (str): "json", or "columnar" (batches only; single records use JSON).
+        compression (str): "identity", "gzip" or "zstd".
+
+    Returns:
+        tuple: (body bytes, headers dict).
+    """
+    if isinstance(payload, list):
+        if encoding == "columnar":
+            if msgpack is None:
+                raise ValueError("Columnar encoding requires the msgpack package.")
+            body = msgpack.packb(to_columns(payload), use_bin_type=True)
+            content_type = COLUMNAR_CONTENT_TYPE
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            content_type = JSON_CONTENT_TYPE
+    else:
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        content_type = JSON_CONTENT_TYPE
+
+    headers = {"Content-Type": content_type}
+    if compression != "identity":
+        headers["Content-Encoding"] = compression
+    return compress(body, compression), headers
+
+def decode_payload(body, headers):
+    """
+    Decode a body produced by encode_payload, as the backend would.
+
+    Returns:
+        dict or list: The record, or the list of records for a batch.
+    """
+    raw = decompress(body, headers.get("Content-Encoding"))
+    if headers.get("Content-Type") == COLUMNAR_CONTENT_TYPE:
+        if msgpack is None:
+            raise ValueError("Columnar decoding requires the msgpack package.")
+        return from_columns(msgpack.unpackb(raw, raw=False))
+    return json.loads(raw)
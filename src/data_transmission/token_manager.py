@@ -0,0 +1,246 @@
+"""
+token_manager.py
+Keeps a valid JWT for the backend in memory so that sending data never waits on authentication.
+
+Expiry:
+The token's exp claim is read from its payload, the middle base64url part of the JWT. The
+signature is not checked, since only the backend has the key. A token without a readable
+exp is assumed to be valid for TOKEN_FALLBACK_TTL_SECONDS.
+
+Refresh:
+A daemon thread wakes TOKEN_REFRESH_MARGIN_SECONDS before the token expires and fetches a
+new one, so senders always find a valid token in memory. A sender only authenticates
+itself when no usable token exists at all, e.g. on a first start without a cache or
+after the auth endpoint was down. After a failed attempt, senders wait
+TOKEN_RETRY_SECONDS before trying again, so an auth outage does not slow every send.
+
+Refreshes are single-flight. refresh(stale_token) after a 401 re-authenticates only if
+nobody has already replaced the stale token, so a burst of 401s on several threads costs
+one round trip.
+
+Cache:
+The token is written to TOKEN_CACHE_PATH together with the auth endpoint and username it
+was issued for. The file is created with mode 0600 and replaced atomically, and the
+password is never written. On restart, a cached token that is still valid is reused
+instead of blocking on AUTH_ENDPOINT.
+
+Every authentication round trip is counted by trigger in AUTH_ROUND_TRIPS_TOTAL and in
+stats(). The triggers are startup, proactive, missing, expired and unauthorized.
+"""
+import base64
+import json
+import os
+import threading
+import time
+from src.utils.config import (
+    TOKEN_CACHE_PATH, TOKEN_REFRESH_MARGIN_SECONDS, TOKEN_FALLBACK_TTL_SECONDS, TOKEN_RETRY_SECONDS
+)
+from src.utils.logger import log_info, log_error
+from src.utils.metrics import AUTH_ROUND_TRIPS_TOTAL
+
+def token_expiry(token):
+    """
+    Read the exp claim of a JWT without verifying it.
+
+    Args:
+        token (str): Token as issued by the backend.
+
+    Returns:
+        float: Expiry time in epoch seconds, or None if the token is not a JWT or has no exp.
+    """
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+        return float(claims["exp"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+class TokenManager:
+    def __init__(self, fetch, cache_path=TOKEN_CACHE_PATH, cache_key=None,
+                 refresh_margin_seconds=TOKEN_REFRESH_MARGIN_SECONDS,
+                 fallback_ttl_seconds=TOKEN_FALLBACK_TTL_SECONDS, retry_seconds=TOKEN_RETRY_SECONDS):
+        """
+        Args:
+            fetch (callable): Performs one authentication round trip and returns the new
+                token, or None if it failed.
+            cache_path (str): File the token is kept in across restarts; None disables
+                the cache.
+            cache_key (str): Identifies the account and endpoint; a cached token issued
+                under another key is ignored.
+            refresh_margin_seconds (float): How long before expiry the token is refreshed.
+            fallback_ttl_seconds (float): Assumed lifetime of a token without an exp claim.
+            retry_seconds (float): Delay before a failed authentication is tried again.
+        """
+        self.fetch = fetch
+        self.cache_path = cache_path
+        self.cache_key = cache_key
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+        self.retry_seconds = retry_seconds
+        # (token, expires_at, refresh_at) in epoch seconds, replaced as a whole so readers
+        # never see a token paired with another token's expiry
+        self._current = (None, 0.0, 0.0)
+        self._failed_at = None  # time.monotonic() of the last failed round trip
+        self._round_trips = {}  # trigger -> count
+        self._failures = 0
+        self._cache_hits = 0
+        self._lock = threading.Lock()  # Serializes round trips
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def token(self):
+        """The token in memory, valid or not."""
+        return self._current[0]
+
+    def start(self):
+        """Load the cached token and start the background refresher."""
+        self._load_cache()
+        self._thread = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the background refresher."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def current(self):
+        """Return the token if it has not expired, else None. Never authenticates."""
+        token, expires_at, _ = self._current
+        if token and time.time() < expires_at:
+            return token
+        return None
+
+    def get(self):
+        """
+        Return a valid token, authenticating only if there is none in memory.
+
+        Returns:
+            str: The token, or None if authentication failed or is backing off.
+        """
+        token = self.current()
+        if token:
+            return token
+        stale = self.token
+        return self._refresh(stale, "expired" if stale else "missing", respect_backoff=True)
+
+    def refresh(self, stale_token, trigger="unauthorized"):
+        """
+        Replace a token the backend rejected, unless another caller already replaced it.
+
+        Args:
+            stale_token (str): Token the caller's request was sent with.
+            trigger (str): Why the refresh is needed, for the round-trip counts.
+
+        Returns:
+            str: The new token, or None if authentication failed.
+        """
+        return self._refresh(stale_token, trigger)
+
+    def _refresh(self, stale_token, trigger, respect_backoff=False):
+        with self._lock:
+            current = self.current()
+            if current and current != stale_token:
+                return current
+            if respect_backoff and self._failed_at is not None \
+                    and time.monotonic() - self._failed_at < self.retry_seconds:
+                return None
+
+            self._round_trips[trigger] = self._round_trips.get(trigger, 0) + 1
+            AUTH_ROUND_TRIPS_TOTAL.labels(trigger).inc()
+            token = self.fetch()
+            if not token:
+                self._failures += 1
+                self._failed_at = time.monotonic()
+                if trigger == "unauthorized" and self.token == stale_token:
+                    self._current = (None, 0.0, 0.0)
+                return self.current()
+
+            self._failed_at = None
+            self._set_token(token, token_expiry(token) or time.time() + self.fallback_ttl_seconds)
+            self._save_cache()
+        self._wake.set()
+        return token
+
+    def _set_token(self, token, expires_at):
+        """Install a token and schedule its refresh; short-lived tokens refresh at half-life."""
+        now = time.time()
+        lifetime = max(0.0, expires_at - now)
+        self._current = (token, expires_at, now + max(lifetime - self.refresh_margin_seconds, lifetime / 2))
+
+    def _seconds_until_refresh(self):
+        if self._failed_at is not None:
+            retry_in = self.retry_seconds - (time.monotonic() - self._failed_at)
+            if retry_in > 0:
+                return retry_in
+        token, _, refresh_at = self._current
+        if not token:
+            return 0.0
+        return refresh_at - time.time()
+
+    def _refresh_loop(self):
+        """Background thread: refresh the token ahead of its expiry."""
+        while not self._stop.is_set():
+            delay = self._seconds_until_refresh()
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+                continue
+            # A failure sets _failed_at, which delays the next attempt by retry_seconds
+            token = self.token
+            self._refresh(token, "proactive" if token else "startup")
+
+    def _load_cache(self):
+        """Install the cached token if it was issued for this account and has not expired."""
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            log_error(f"Ignoring unreadable token cache {self.cache_path}: {e}")
+            return False
+        if not isinstance(cached, dict) or cached.get("key") != self.cache_key:
+            return False
+        token, expires_at = cached.get("token"), cached.get("expires_at")
+        if not token or not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return False
+        self._set_token(token, expires_at)
+        self._cache_hits += 1
+        log_info("Reusing the cached JWT token.")
+        return True
+
+    def _save_cache(self):
+        """Write the token to the cache file, readable by this user only. Caller holds the lock."""
+        if not self.cache_path:
+            return
+        token, expires_at, _ = self._current
+        temp_path = f"{self.cache_path}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            # A leftover temp file keeps its old mode; tighten it before the token is written
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": self.cache_key, "token": token, "expires_at": expires_at}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            log_error(f"Failed to cache the JWT token in {self.cache_path}: {e}")
+
+    def stats(self):
+        """Return authentication round trips by trigger, failures, cache hits and time to expiry."""
+        _, expires_at, _ = self._current
+        return {
+            "round_trips": dict(self._round_trips),
+            "failures": self._failures,
+            "cache_hits": self._cache_hits,
+            "expires_in_seconds": round(expires_at - time.time(), 1) if self.token else None,
+        }
@@ -2,64 +2,407 @@
 transmitter.py
 Manages HTTP calls to the backend, sending data that’s already in the correct format.
 It manages token retrieval and re-authentication efficiently.
-This refactored version includes a token management system that retrieves and caches the token
-but also re-authenticates if the token has expired or becomes invalid.
+
+Authentication:
+The JWT is kept by a TokenManager, which refreshes it in the background before it expires
+and caches it on disk across restarts, so requests find a valid token in memory. A request
+answered with 401 is retried once with a fresh token.
+
+All requests go through one pooled requests.Session so connections are kept alive between
+readings. In batch mode, converted records are buffered and uploaded as a single JSON array
+to the bulk endpoint once BATCH_SIZE records or BATCH_MAX_WAIT_MS have accumulated.
+
+Request bodies are built by payload_codec: records go out as JSON, batches can use the
+columnar encoding (UPLOAD_BATCH_ENCODING), and bodies can be compressed (UPLOAD_COMPRESSION).
+The encoding is negotiated: if the backend answers 415 Unsupported Media Type, the
+transmitter switches to plain uncompressed JSON for the rest of the session and retries.
+
+Streaming transports:
+A Transport (e.g. MqttTransport) can be plugged in. send_data then hands records to it,
+and its acknowledgements are mapped back to the transmission ledger. Authentication,
+batch uploads and alerts still use HTTP.
+
+Exactly-once delivery:
+Every stored record is claimed in the transmission ledger ('in_flight') before it is
+posted, acknowledged ('sent') once the backend confirms it, and released to 'unsent' if
+the send fails. Batch acknowledgements are written in one transaction. Records carry an
+idempotencyKey, also sent as the Idempotency-Key header on single posts, so a record that
+is resent after a crash between the post and its acknowledgement can be discarded by the
+backend. Records a previous run left in flight are requeued at startup.
+
+Every backend request is timed into HTTP_REQUEST_SECONDS by endpoint and status code,
+and token requests are counted by outcome.
+
+Timeouts:
+Requests time out after HTTP_TIMEOUT_SECONDS. Backlog sends carry the drain tick's
+deadline, and their timeout is cut to whatever is left of it, so a stalled backend cannot
+hold a tick past its budget.
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import threading
 import time
-from src.utils.config import DEVICE_ID, PATIENT_ID, BACKEND_URL, AUTH_ENDPOINT, USERNAME, PASSWORD
-from src.utils.logger import log_info, log_error
+from src.utils.config import (
+    DEVICE_ID, PATIENT_ID, BACKEND_URL, AUTH_ENDPOINT, USERNAME, PASSWORD,
+    BATCH_SIZE, BATCH_MAX_WAIT_MS, HTTP_POOL_SIZE, HTTP_TIMEOUT_SECONDS,
+    UPLOAD_COMPRESSION, UPLOAD_BATCH_ENCODING, TOKEN_CACHE_PATH
+)
+from src.utils.logger import log_info, log_error, log_sampled
+from src.utils.metrics import HTTP_REQUEST_SECONDS, TOKEN_REFRESHES_TOTAL
 from src.data_processing.database_manager import DatabaseManager
-from src.data_processing.data_converter import convert_to_backend_format
+from src.data_transmission.backlog_drainer import BacklogDrainer
+from src.data_transmission.payload_codec import encode_payload
+from src.data_transmission.token_manager import TokenManager
+
+def request_timeout(deadline=None):
+    """
+    Timeout for one request: HTTP_TIMEOUT_SECONDS, capped by the time left before deadline.
+
+    Args:
+        deadline (float): time.monotonic() value the request must finish by, or None.
+
+    Returns:
+        float: Timeout in seconds.
+    """
+    if deadline is None:
+        return HTTP_TIMEOUT_SECONDS
+    return min(HTTP_TIMEOUT_SECONDS, max(0.001, deadline - time.monotonic()))
 
 class Transmitter:
-    def __init__(self):
-        self.token = None
-        self.db_manager = DatabaseManager()
+    def __init__(self, backend_url=BACKEND_URL, auth_endpoint=AUTH_ENDPOINT, db_manager=None, transport=None,
+                 token_cache_path=TOKEN_CACHE_PATH):
+        """
+        Args:
+            backend_url (str): Base URL of the backend API.
+            auth_endpoint (str): URL used to obtain JWT tokens.
+            db_manager (DatabaseManager): Local store for transmit status; defaults to a
+                new connection to DB_PATH. A store passed in is shared, not owned, and is
+                left open by close().
+            transport (Transport): Streaming transport used by send_data instead of HTTP POST.
+            token_cache_path (str): File the JWT is kept in across restarts; None disables
+                the cache.
+        """
+        self.backend_url = backend_url
+        self.auth_endpoint = auth_endpoint
+        self._owns_db = db_manager is None
+        self.db_manager = db_manager or DatabaseManager()
+        self.session = self._create_session()
+        self.tokens = TokenManager(self._fetch_token, cache_path=token_cache_path,
+                                   cache_key=f"{USERNAME}@{auth_endpoint}").start()
+        self.upload_compression = UPLOAD_COMPRESSION
+        self.upload_batch_encoding = UPLOAD_BATCH_ENCODING
+        self._batch = []  # Buffered (patient_id, record_id, backend_data) tuples
+        self._batch_started_at = None
+        self._batch_lock = threading.Lock()  # Several transmit workers may share the buffer
+        self.transport = transport
+        if transport is not None:
+            transport.on_ack = self._mark_sent
+            transport.start()
+        # Nothing is in flight yet; claims left by an earlier run are retried
+        self.db_manager.requeue_in_flight()
+        self.backlog_drainer = BacklogDrainer(self.db_manager, self.send_claimed)
+
+    def _create_session(self):
+        """Create a keep-alive HTTP session with a bounded connection pool."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def encode_upload(self, payload):
+        """
+        Encode a record or batch with the negotiated encoding and compression.
+
+        Falls back to plain JSON if the configured codec is not available on this device.
+
+        Returns:
+            tuple: (body bytes, headers dict).
+        """
+        try:
+            return encode_payload(payload, self.upload_batch_encoding, self.upload_compression)
+        except ValueError as e:
+            log_error(f"Upload encoding unavailable ({e}); falling back to plain JSON.")
+            self.use_plain_json()
+            return encode_payload(payload)
+
+    def use_plain_json(self):
+        """Switch uploads to uncompressed JSON. Returns True if anything changed."""
+        changed = (self.upload_batch_encoding, self.upload_compression) != ("json", "identity")
+        self.upload_batch_encoding = "json"
+        self.upload_compression = "identity"
+        return changed
+
+    def _timed_post(self, label, endpoint, deadline=None, **kwargs):
+        """POST through the pooled session, recording the latency under label and status code."""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = self.session.post(endpoint, timeout=request_timeout(deadline), **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            HTTP_REQUEST_SECONDS.labels(label, status).observe(time.perf_counter() - started)
+
+    def _post_encoded(self, endpoint, payload, headers, label="device-data", deadline=None):
+        """POST an encoded payload, renegotiating to plain JSON once on a 415."""
+        body, encoding_headers = self.encode_upload(payload)
+        response = self._timed_post(label, endpoint, deadline, data=body, headers={**headers, **encoding_headers})
+        if response.status_code == 415 and self.use_plain_json():
+            log_info("Backend rejected the upload encoding; switching to plain JSON.")
+            body, encoding_headers = self.encode_upload(payload)
+            response = self._timed_post(label, endpoint, deadline, data=body, headers={**headers, **encoding_headers})
+        return response
 
     def get_jwt_token(self):
-        """Authenticate and retrieve JWT token."""
+        """Return a valid JWT token, authenticating only if none is held."""
+        return self.tokens.get()
+
+    def _fetch_token(self):
+        """Authenticate and retrieve a new JWT token; called by the TokenManager."""
         credentials = {"username": USERNAME, "password": PASSWORD}
         try:
-            response = requests.post(AUTH_ENDPOINT, json=credentials)
+            response = self._timed_post("auth", self.auth_endpoint, json=credentials)
             response.raise_for_status()
-            self.token = response.text.strip()
+            TOKEN_REFRESHES_TOTAL.labels("ok").inc()
             log_info("JWT token obtained successfully.")
-            return self.token
+            return response.text.strip()
         except requests.exceptions.RequestException as e:
+            TOKEN_REFRESHES_TOTAL.labels("failed").inc()
             log_error(f"Failed to authenticate: {e}")
-            self.token = None
             return None
 
-    def send_data_http(self, data, patient_id, record_id=None):
+    def _post_authorized(self, endpoint, payload, headers, label="device-data", deadline=None):
+        """
+        POST an encoded payload with the current token, re-authenticating once on a 401.
+
+        Returns:
+            Response: The backend's response, or None if no token could be obtained.
+        """
+        token = self.tokens.get()
+        if not token:
+            return None
+        response = self._post_encoded(endpoint, payload, {**headers, 'Authorization': f'Bearer {token}'}, label, deadline)
+        if response.status_code == 401:
+            log_info("Backend rejected the JWT token; re-authenticating.")
+            token = self.tokens.refresh(token)
+            if not token:
+                return None
+            response = self._post_encoded(endpoint, payload, {**headers, 'Authorization': f'Bearer {token}'}, label, deadline)
+        return response
+
+    def send_data(self, data, patient_id, record_id=None):
+        """
+        Claim a record and send it over the configured transport, or HTTP POST when there
+        is none.
+
+        With a streaming transport, True means the record was accepted; it is marked as
+        'sent' when the transport acknowledges it. A record that is already in flight on
+        another path, or already sent, is not posted again and counts as handled.
+        """
+        if record_id is not None and not self.db_manager.claim_for_send([record_id]):
+            return True
+        return self.send_claimed(data, patient_id, record_id)
+
+    def send_claimed(self, data, patient_id, record_id=None, deadline=None):
+        """
+        Send a record the caller has already claimed; the claim is released on failure.
+        An HTTP post must finish by deadline (a time.monotonic() value) when one is given.
+        """
+        if self.transport is None:
+            return self.send_data_http(data, patient_id, record_id, deadline)
+        if self.transport.send(data, patient_id, record_id):
+            return True
+        if record_id is not None:
+            self.db_manager.release_claims([record_id])
+        return False
+
+    def _mark_sent(self, record_id):
+        """Acknowledgement callback for streaming transports."""
+        self.db_manager.mark_acked([record_id])
+
+    def send_data_http(self, data, patient_id, record_id=None, deadline=None):
         """Send data via HTTP POST to the backend with JWT authentication."""
-        if not self.token:
-            self.token = self.get_jwt_token()
-            if not self.token:
-                log_error("Authentication failed. Cannot send data.")
-                return False
+        sent = self._post_device_data(data, patient_id, deadline)
+        if record_id is not None:
+            if sent:
+                self.db_manager.mark_acked([record_id])
+                log_sampled("record-sent", lambda: f"Data for record ID {record_id} sent successfully and marked as 'sent'.")
+            else:
+                self.db_manager.release_claims([record_id])
+        return sent
 
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.token}'
-        }
-        endpoint = f"{BACKEND_URL}/api/patients/{patient_id}/device-data"
+    def _post_device_data(self, data, patient_id, deadline=None):
+        """POST one record with its idempotency key. Returns True on success."""
+        headers = {}
+        if "idempotencyKey" in data:
+            headers['Idempotency-Key'] = data["idempotencyKey"]
+        endpoint = f"{self.backend_url}/api/patients/{patient_id}/device-data"
         
         try:
-            response = requests.post(endpoint, json=data, headers=headers)
+            response = self._post_authorized(endpoint, data, headers, deadline=deadline)
+            if response is None:
+                log_error("Authentication failed. Cannot send data.")
+                return False
             response.raise_for_status()
-            
-            # Mark as sent if the transmission was successful
-            if record_id is not None:
-                self.db_manager.update_tx_status(record_id, 'sent')
-                log_info(f"Data for record ID {record_id} sent successfully and marked as 'sent'.")
-            
             return True
         except requests.exceptions.RequestException as e:
             log_error(f"Failed to send data: {e}")
             return False
 
+    def queue_for_batch(self, data, patient_id, record_id):
+        """
+        Claim a backend-formatted record and buffer it for the next batch upload.
+
+        The claim keeps the backlog drainer from posting the record on its own while it
+        waits; a record the drainer has already claimed is not buffered. The buffer is
+        flushed as soon as it holds BATCH_SIZE records or its oldest record has waited
+        BATCH_MAX_WAIT_MS (checked here and by flush_batch_if_due).
+
+        Args:
+            data (dict): Backend-formatted record.
+            patient_id (str): Unique identifier for the patient.
+            record_id (int): ID of the local SQLite record.
+
+        Returns:
+            int: Number of records sent if a flush happened, else None.
+        """
+        if record_id is not None and not self.db_manager.claim_for_send([record_id]):
+            return None
+        with self._batch_lock:
+            if not self._batch:
+                self._batch_started_at = time.monotonic()
+            self._batch.append((patient_id, record_id, data))
+            due = self._batch_due()
+        if due:
+            return self.flush_batch()
+        return None
+
+    def _batch_due(self):
+        """Check whether the batch buffer has reached its size or age limit."""
+        if not self._batch:
+            return False
+        waited_ms = (time.monotonic() - self._batch_started_at) * 1000
+        return len(self._batch) >= BATCH_SIZE or waited_ms >= BATCH_MAX_WAIT_MS
+
+    def flush_batch_if_due(self):
+        """Flush the batch buffer if it is full or has waited long enough."""
+        if self._batch_due():
+            return self.flush_batch()
+        return None
+
+    def flush_batch(self):
+        """
+        Upload every buffered record, one bulk request per patient.
+
+        The records were claimed when they were queued; claims of records the backend
+        does not acknowledge are released for the backlog.
+
+        Returns:
+            int: Number of records acknowledged by the backend.
+        """
+        with self._batch_lock:
+            pending, self._batch, self._batch_started_at = self._batch, [], None
+        by_patient = {}
+        for patient_id, record_id, data in pending:
+            by_patient.setdefault(patient_id, []).append((record_id, data))
+
+        sent = 0
+        for patient_id, records in by_patient.items():
+            sent += self.send_batch_http(records, patient_id)
+        return sent
+
+    def send_batch_http(self, records, patient_id):
+        """
+        Send several records to the bulk endpoint as one JSON array.
+
+        The backend answers with one result per item, in request order, either as a bare
+        list or under a "results" key; each item carries an HTTP-style "status" code.
+        A 2xx response with an empty body (e.g. 204 No Content) acknowledges the whole
+        batch. Any other body that is not JSON or does not hold one result per record is
+        treated as a failure, so a truncated or rewritten response never marks records
+        'sent' that the backend may not have stored; they stay 'unsent' and are retried.
+
+        Args:
+            records (list): (record_id, backend_data) tuples for a single patient.
+            patient_id (str): Unique identifier for the patient.
+
+        Returns:
+            int: Number of records acknowledged by the backend.
+        """
+        if not records:
+            return 0
+        record_ids = [record_id for record_id, _ in records if record_id is not None]
+        endpoint = f"{self.backend_url}/api/patients/{patient_id}/device-data/batch"
+
+        try:
+            response = self._post_authorized(endpoint, [data for _, data in records], {}, label="batch")
+            if response is None:
+                log_error("Authentication failed. Cannot send batch.")
+                self.db_manager.release_claims(record_ids)
+                return 0
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            log_error(f"Failed to send batch of {len(records)} records: {e}")
+            self.db_manager.release_claims(record_ids)
+            return 0
+
+        results = self._parse_batch_results(response, len(records))
+        acked, rejected = [], []
+        for (record_id, _), ok in zip(records, results):
+            if record_id is None:
+                continue
+            if ok:
+                acked.append(record_id)
+            else:
+                rejected.append(record_id)
+                log_error(f"Backend rejected record ID {record_id} in batch; it stays 'unsent'.")
+        # All acknowledgements of the batch are recorded in one transaction
+        self.db_manager.mark_acked(acked)
+        self.db_manager.release_claims(rejected)
+        log_sampled("batch-sent", lambda: f"Batch for patient {patient_id}: {len(acked)}/{len(records)} records marked as 'sent'.")
+        return len(acked)
+
+    def _parse_batch_results(self, response, expected):
+        """Map a bulk response to a list of per-item success flags; see send_batch_http."""
+        if not response.content.strip():
+            return [True] * expected
+        try:
+            body = response.json()
+        except ValueError:
+            log_error(f"Bulk response is not JSON ({len(response.content)} bytes); the batch is retried.")
+            return [False] * expected
+
+        items = body.get("results") if isinstance(body, dict) else body
+        if not isinstance(items, list) or len(items) != expected:
+            count = len(items) if isinstance(items, list) else "no"
+            log_error(f"Bulk response has {count} results for {expected} records; the batch is retried.")
+            return [False] * expected
+
+        flags = []
+        for item in items:
+            status = item.get("status", 200) if isinstance(item, dict) else item
+            try:
+                flags.append(200 <= int(status) < 300)
+            except (TypeError, ValueError):
+                flags.append(str(status).lower() in ("ok", "sent", "created"))
+        return flags
+
+    def close(self):
+        """
+        Upload what is left in the batch buffer, then close the transport, the pooled HTTP
+        session and, if the transmitter opened it, its database connection.
+        """
+        if self._batch:
+            self.flush_batch()
+        self.tokens.stop()
+        if self.transport is not None:
+            self.transport.close()
+        self.session.close()
+        if self._owns_db:
+            self.db_manager.close()
+
     # def send_data_http(self, data, patient_id=PATIENT_ID):
     #     """Send data to backend with JWT authentication."""
     #     if not self.token:
@@ -90,33 +433,13 @@ class Transmitter:
     #         return False
 
     def retry_unsent_data(self):
-        """Attempt to resend all unsent data in the SQLite buffer."""
-        unsent_data = self.db_manager.fetch_unsent_data()
-        for record in unsent_data:
-            log_info(f"record: {record}")
-            try:
-                # Read the sqlite record - TODO read into individual field
-                record_id, device_id, patient_id, timestamp, heart_rate, temperature, oxygen_level, steps_count, calories_burned, battery_level, signal_strength, status, transmit_status = record
- 
-                 # Recreate raw data as a python dictionary from sqlite data format
-                sensor_data = {
-                    "heart_rate": heart_rate,
-                    "temperature": temperature,
-                    "oxygen_level": oxygen_level
-                }
-
-                # Decode the raw data and convert to backend format
-                # sensor_data = json.loads(data_json)
-                backend_data = convert_to_backend_format(sensor_data)
-
-                # Attempt to send to backend
-                if self.send_data_http(backend_data, patient_id):
-                    self.db_manager.update_tx_status(record_id, 'sent')  # Update status to 'sent' after success
-                    log_info(f"Record ID {record_id} sent successfully and marked as 'sent'.")
-                else:
-                    log_error(f"Retry failed for record ID {record_id}")
-            except json.JSONDecodeError as e:
-                log_error(f"Failed to parse data for record ID {record_id}: {e}")
+        """
+        Resend part of the unsent backlog, bounded by the per-tick time and byte budgets.
+
+        Returns:
+            int: Number of records sent during this call.
+        """
+        return self.backlog_drainer.drain()
 
     # def retry_unsent_data(self):
     #     """Attempt to resend all unsent data in the SQLite buffer."""
@@ -0,0 +1,40 @@
+"""
+transport.py
+Defines the interface for streaming transports that can sit behind Transmitter, as an
+alternative to its built-in HTTP POST path.
+
+A transport accepts one backend-formatted record at a time, already claimed ('in_flight')
+in the transmission ledger. Acceptance only means the record is on its way; the transport
+calls on_ack(record_id) once the remote side has confirmed it, and Transmitter records the
+acknowledgement with DatabaseManager.mark_acked ('sent'). A record the transport refuses
+is released back to 'unsent' straight away. One that is accepted but never acknowledged
+stays 'in_flight' until requeue_in_flight returns it to 'unsent', at startup or in the
+backlog drainer's sweep of claims older than TRANSMIT_IN_FLIGHT_TIMEOUT_SECONDS.
+"""
+from abc import ABC, abstractmethod
+
+class Transport(ABC):
+    # Name used in logs and metrics
+    name = "transport"
+
+    def __init__(self):
+        self.on_ack = None  # on_ack(record_id), set by Transmitter
+
+    def start(self):
+        """Open the transport's connection; called once by Transmitter."""
+
+    @abstractmethod
+    def send(self, data, patient_id, record_id=None):
+        """
+        Hand a record to the transport.
+
+        Returns:
+            bool: True if the record was accepted for delivery.
+        """
+
+    def close(self):
+        """Flush what can be flushed and close the connection."""
+
+    def _acknowledge(self, record_id):
+        if record_id is not None and self.on_ack is not None:
+            self.on_ack(record_id)
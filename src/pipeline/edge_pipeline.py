@@ -0,0 +1,181 @@
+"""
+edge_pipeline.py
+Runs the edge agent as a concurrent collect -> analyze -> store -> transmit pipeline.
+
+Collection runs on its own thread, reading every due channel of a ChannelHub, and feeds
+the analyze stage. Each item carries the channel it came from and that channel's readings
+as one columnar ReadingBatch, so every stage works with that channel's device and patient
+and handles a burst of samples as a single item. Analyze, store and transmit run on their
+own workers, joined by bounded queues:
+
+- analyze: checks alert thresholds, the trend window and, when enabled, the vectorized
+  detectors, entirely locally and straight off the collected batch. Alerts are handed to
+  the AlertChannel fast lane, which sends them on its own thread ahead of routine data, so
+  they never wait behind the batch's SQLite insert.
+- store: saves the batch to SQLite with one executemany, attaches the record IDs and links
+  the batch's alerts to their rows. It stores waveform blocks as chunks, and runs
+  retention steps between batches so compaction never races the writer. With a
+  ReportFilter, it then picks the readings worth sending and marks the rest 'suppressed';
+  batches with nothing to send stop here.
+- transmit: sends the readings to the backend, and drains the backlog once per loop interval.
+  TRANSMIT_WORKERS threads share the transmitter; only one drains the backlog at a time.
+
+Only the transmit stage talks to the network. Its queue never blocks the stages upstream:
+when it is full the reading is dropped from the queue, but it is already stored as 'unsent'
+in SQLite, so the backlog drainer sends it later. Network stalls therefore cannot delay
+acquisition or local alerting.
+"""
+import threading
+from src.data_processing.data_converter import convert_batch_to_backend_format
+from src.data_processing.alert_rules import AlertRuleEngine
+from src.data_transmission.alert_channel import PRIORITY_THRESHOLD, PRIORITY_TREND
+from src.pipeline.stage import Stage, Pipeline
+from src.utils.config import (
+    TRANSMIT_MODE, TRANSMIT_WORKERS, LOOP_INTERVAL_SECONDS, PIPELINE_QUEUE_CAPACITY,
+    PIPELINE_METRICS_INTERVAL_SECONDS
+)
+from src.utils.logger import log_info, log_error
+
+class EdgePipeline:
+    def __init__(self, hub, db_manager, trend_window, transmitter, retention=None,
+                 vector_analyzer=None, alert_engine=None, alert_channel=None, report_filter=None,
+                 queue_capacity=PIPELINE_QUEUE_CAPACITY, transmit_workers=TRANSMIT_WORKERS):
+        self.hub = hub
+        self.db_manager = db_manager
+        self.trend_window = trend_window
+        self.transmitter = transmitter
+        self.retention = retention
+        self.vector_analyzer = vector_analyzer
+        self.alert_engine = alert_engine or AlertRuleEngine()
+        self.alert_channel = alert_channel
+        self.report_filter = report_filter
+        self.pipeline = Pipeline([
+            Stage("analyze", self._analyze, queue_capacity=queue_capacity),
+            Stage("store", self._store, queue_capacity=queue_capacity,
+                  periodic_handler=retention.step if retention else None,
+                  periodic_interval_seconds=retention.interval_seconds if retention else 1.0),
+            Stage("transmit", self._transmit, workers=transmit_workers, queue_capacity=queue_capacity,
+                  block_when_full=False, periodic_handler=self._transmit_housekeeping, periodic_interval_seconds=LOOP_INTERVAL_SECONDS)
+        ])
+        self._stop = threading.Event()
+        self._housekeeping_lock = threading.Lock()
+        self._collector = None
+
+    def start(self):
+        """Start the stage workers and the collection thread."""
+        self.pipeline.start()
+        self._collector = threading.Thread(target=self._collect_loop, name="collect", daemon=True)
+        self._collector.start()
+
+    def stop(self, timeout=None):
+        """Stop collection, then let each stage finish its queued readings."""
+        self._stop.set()
+        if self._collector is not None:
+            self._collector.join(timeout)
+        self.pipeline.stop(timeout)
+
+    def run_forever(self):
+        """Run until interrupted, logging stage metrics periodically."""
+        self.start()
+        try:
+            while not self._stop.wait(PIPELINE_METRICS_INTERVAL_SECONDS):
+                log_info(f"Pipeline metrics: {self.pipeline.metrics()}")
+                log_info(f"Channel metrics: {self.hub.stats()}")
+                if self.report_filter is not None:
+                    log_info(f"Report filter: {self.report_filter.stats.as_dict()}")
+        except KeyboardInterrupt:
+            log_info("Shutdown requested.")
+        finally:
+            self.stop()
+
+    def _collect_loop(self):
+        """Collection stage: read the due channels and feed the analyze stage."""
+        while not self._stop.is_set():
+            for channel, batch in self.hub.collect_due_batches():
+                self.pipeline.put({"channel": channel, "batch": batch, "alerts": [], "still_flagged": False,
+                                   "record_ids": None, "send_indexes": None})
+            self._stop.wait(self.hub.seconds_until_due())
+
+    def _analyze(self, item):
+        channel, batch = item["channel"], item["batch"]
+        # Waveform-only batches have no readings to check; store saves their chunks
+        if not len(batch):
+            return item
+        patient_id = channel.patient_id
+        alerts = [(message, PRIORITY_THRESHOLD, index)
+                  for index, message in self.alert_engine.evaluate_batch(patient_id, batch)]
+
+        # Trend and vector conditions go through the engine's active/renotify state, so a
+        # lasting trend raises one alert rather than one per batch. Windows are evaluated at
+        # the batch's capture time: the collector (and a replay's clock) may already be ahead
+        self.trend_window.push_batch(patient_id, batch)
+        last = len(batch) - 1
+        ts_ms = batch.ts[last]
+        trend_alert = self.trend_window.analyze(patient_id, ts_ms)
+        trend_conditions = {trend_alert: trend_alert} if trend_alert else {}
+        alerts += [(message, PRIORITY_TREND, last)
+                   for message in self.alert_engine.evaluate_conditions(patient_id, "trend", trend_conditions, ts_ms)]
+        if self.vector_analyzer is not None:
+            detected = self.vector_analyzer.run_if_due(self.trend_window, patient_id, ts_ms)
+            if detected is not None:
+                alerts += [(message, PRIORITY_TREND, last)
+                           for message in self.alert_engine.evaluate_conditions(patient_id, "vector", detected, ts_ms)]
+
+        channel.stats.alerts += len(alerts)
+        for message, priority, index in alerts:
+            log_info(f"Alert: {message} ({channel.name})")
+            alert_id = None
+            if self.alert_channel is not None:
+                # Raised before the reading is stored; store links the alert to its row
+                alert_id = self.alert_channel.raise_alert(patient_id, message, batch.reading(index), None,
+                                                          priority, device_id=channel.device_id)
+            item["alerts"].append((alert_id, index))
+        item["still_flagged"] = bool(self.alert_engine.active_alerts(patient_id))
+        return item
+
+    def _store(self, item):
+        channel, batch = item["channel"], item["batch"]
+        item["record_ids"] = self.db_manager.save_batch(channel.device_id, channel.patient_id, batch)
+        self.db_manager.link_alert_records([(alert_id, item["record_ids"][index]) for alert_id, index in item["alerts"]])
+        for block in batch.waveforms:
+            self.db_manager.save_waveform(channel.device_id, channel.patient_id, block)
+        # Waveform-only batches have nothing further to send
+        if not len(batch):
+            return None
+
+        if self.report_filter is not None:
+            # Done here rather than in transmit so each patient's batches are filtered in order
+            item["send_indexes"] = self.report_filter.filter_stored_batch(
+                self.db_manager, channel.patient_id, batch, item["record_ids"],
+                flagged=[index for _, index in item["alerts"]], still_flagged=item["still_flagged"]
+            )
+            if not item["send_indexes"]:
+                return None
+        return item
+
+    def _transmit(self, item):
+        channel, indexes, record_ids = item["channel"], item["send_indexes"], item["record_ids"]
+        records = convert_batch_to_backend_format(item["batch"], device_id=channel.device_id,
+                                                  patient_id=channel.patient_id, record_ids=record_ids,
+                                                  indexes=indexes)
+        if indexes is not None:
+            record_ids = [record_ids[index] for index in indexes]
+        for backend_data, record_id in zip(records, record_ids):
+            if TRANSMIT_MODE == "batch":
+                self.transmitter.queue_for_batch(backend_data, channel.patient_id, record_id)
+            elif not self.transmitter.send_data(backend_data, channel.patient_id, record_id):
+                # The rest of the batch is already stored as 'unsent' and goes out with the backlog
+                log_error("Data transmission failed. Retrying will occur from the backlog.")
+                break
+
+    def _transmit_housekeeping(self):
+        """Flush a waiting batch and drain part of the backlog."""
+        # Each transmit worker calls this; the others skip while one is draining
+        if not self._housekeeping_lock.acquire(blocking=False):
+            return
+        try:
+            if TRANSMIT_MODE == "batch":
+                self.transmitter.flush_batch_if_due()
+            self.transmitter.retry_unsent_data()
+        finally:
+            self._housekeeping_lock.release()
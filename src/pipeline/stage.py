@@ -0,0 +1,172 @@
+"""
+stage.py
+Generic building blocks for a threaded processing pipeline.
+
+A Stage owns a bounded input queue and one or more worker threads. Each worker takes an
+item, passes it to the stage handler, and forwards whatever the handler returns to the next
+stage. A full downstream queue either blocks the producer (backpressure) or, for stages that
+may shed load, drops the item and counts it.
+
+Shutdown is clean: Pipeline.stop() stops the stages in order, and each stage finishes the
+items already in its queue before its workers exit.
+"""
+import queue
+import threading
+import time
+from src.utils.logger import log_info, log_error
+
+_STOP = object()  # Sentinel that tells a worker to exit
+
+class StageMetrics:
+    """Counters and latency figures for one stage."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def record(self, latency_ms, error=False):
+        with self._lock:
+            self.processed += 1
+            self.errors += int(error)
+            self.total_latency_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+class Stage:
+    def __init__(self, name, handler, workers=1, queue_capacity=1024, block_when_full=True,
+                 periodic_handler=None, periodic_interval_seconds=1.0):
+        """
+        Args:
+            name (str): Stage name used in logs and metrics.
+            handler (callable): handler(item) -> next item, a list of next items, or None.
+            workers (int): Number of worker threads.
+            queue_capacity (int): Size of the bounded input queue.
+            block_when_full (bool): Block producers when the queue is full (backpressure);
+                when False, new items are dropped instead.
+            periodic_handler (callable): Housekeeping called by a worker at least every
+                periodic_interval_seconds, whether or not items are arriving.
+            periodic_interval_seconds (float): Interval between periodic_handler calls.
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_capacity)
+        self.block_when_full = block_when_full
+        self.periodic_handler = periodic_handler
+        self.periodic_interval_seconds = periodic_interval_seconds
+        self.next_stage = None
+        self.metrics = StageMetrics()
+        self._threads = []
+
+    def put(self, item):
+        """Enqueue an item, blocking or dropping when the queue is full."""
+        if self.block_when_full:
+            self.queue.put(item)
+            return True
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.metrics.record_drop()
+            return False
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Let workers finish queued items, then wait for them to exit."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        next_periodic = time.monotonic() + self.periodic_interval_seconds
+        while True:
+            timeout = None
+            if self.periodic_handler:
+                timeout = next_periodic - time.monotonic()
+                if timeout <= 0:
+                    self._run_periodic()
+                    next_periodic = time.monotonic() + self.periodic_interval_seconds
+                    continue
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                return
+
+            started = time.monotonic()
+            error = False
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                error = True
+                result = None
+                log_error(f"Stage '{self.name}' failed to process an item: {e}")
+            self.metrics.record((time.monotonic() - started) * 1000, error)
+            self._forward(result)
+
+    def _run_periodic(self):
+        try:
+            self.periodic_handler()
+        except Exception as e:
+            log_error(f"Stage '{self.name}' periodic handler failed: {e}")
+
+    def _forward(self, result):
+        if result is None or self.next_stage is None:
+            return
+        for item in result if isinstance(result, list) else [result]:
+            self.next_stage.put(item)
+
+    def snapshot(self):
+        """Return this stage's metrics and current queue depth as a dict."""
+        m = self.metrics
+        return {
+            "queue_depth": self.queue.qsize(),
+            "processed": m.processed,
+            "errors": m.errors,
+            "dropped": m.dropped,
+            "mean_latency_ms": round(m.total_latency_ms / m.processed, 3) if m.processed else 0.0,
+            "max_latency_ms": round(m.max_latency_ms, 3)
+        }
+
+class Pipeline:
+    def __init__(self, stages):
+        """
+        Args:
+            stages (list): Stages in processing order; each feeds the next.
+        """
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        for stage in reversed(self.stages):
+            stage.start()
+        log_info(f"Pipeline started: {' -> '.join(stage.name for stage in self.stages)}")
+
+    def put(self, item):
+        """Feed an item into the first stage."""
+        return self.stages[0].put(item)
+
+    def stop(self, timeout=None):
+        """Drain and stop every stage, upstream first."""
+        for stage in self.stages:
+            stage.stop(timeout)
+        log_info("Pipeline stopped.")
+
+    def metrics(self):
+        """Return per-stage metrics keyed by stage name."""
+        return {stage.name: stage.snapshot() for stage in self.stages}
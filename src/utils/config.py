@@ -1,7 +1,13 @@
 """
 config.py
 Central configuration file for parameters, URLs, etc.
+
+The lean runtime profile (RUNTIME_PROFILE = "lean") overrides a few settings at the end of
+this file for small boards such as the Pi Zero, trading throughput and observability for a
+faster cold start and a smaller resident set.
 """
+import os
+
 DB_PATH = "/home/pi/vitaledge-pi-monitoring/sensor_data.db"
 DEVICE_ID = "PI-DEVICE-001"
 PATIENT_ID = "p_v2_1034"
@@ -9,3 +15,147 @@ BACKEND_URL = "http://host.docker.internal:8080"  # Backend URL
 AUTH_ENDPOINT = "http://host.docker.internal:8080/authenticate"  # Authentication endpoint
 USERNAME = "admin"
 PASSWORD = "password"
+
+# Authentication settings
+TOKEN_CACHE_PATH = os.path.join(os.path.dirname(DB_PATH), "jwt_token.json")  # JWT kept across restarts (mode 0600); None disables it
+TOKEN_REFRESH_MARGIN_SECONDS = 120  # Refresh the JWT this long before its exp claim
+TOKEN_FALLBACK_TTL_SECONDS = 3600  # Assumed lifetime of a token without an exp claim
+TOKEN_RETRY_SECONDS = 30  # Delay before a failed authentication is retried
+
+# Transmission settings
+TRANSMIT_MODE = "single"  # "single" posts each reading; "batch" posts readings as one JSON array
+BATCH_SIZE = 50  # Max records gathered before a batch upload is flushed
+BATCH_MAX_WAIT_MS = 2000  # Max time a record waits in the batch buffer before a flush
+HTTP_POOL_SIZE = 4  # Keep-alive connections held by the pooled HTTP session
+HTTP_TIMEOUT_SECONDS = 30  # Per-request timeout for backend calls
+TRANSMIT_TRANSPORT = "http"  # "http" POSTs each reading; "mqtt" streams readings over one MQTT session (needs paho-mqtt)
+TRANSMIT_BACKEND = "sync"  # "sync" sends one request at a time; "async" keeps several requests in flight
+HTTP_MAX_IN_FLIGHT = 4  # Max concurrent backend requests with the async backend
+UPLOAD_COMPRESSION = "identity"  # "identity", "gzip" or "zstd" (needs zstandard)
+UPLOAD_BATCH_ENCODING = "json"  # "json" or "columnar" (MessagePack column arrays; needs msgpack)
+TRANSMIT_IN_FLIGHT_TIMEOUT_SECONDS = 300  # Sent records with no acknowledgement after this long are requeued
+
+# MQTT transport settings
+MQTT_HOST = "host.docker.internal"
+MQTT_PORT = 1883
+MQTT_KEEPALIVE_SECONDS = 60
+MQTT_TOPIC_PREFIX = "vitaledge/patients"  # Readings go to {prefix}/{patient_id}/device-data
+MQTT_MAX_INFLIGHT = 20  # QoS 1 messages sent but not yet acknowledged
+MQTT_MAX_QUEUED = 1000  # Messages awaiting acknowledgement before new readings are left to the backlog
+
+# Alert thresholds
+HIGH_HEART_RATE = 120  # BPM
+HIGH_TEMPERATURE = 38.5  # Celsius
+LOW_OXYGEN_LEVEL = 90  # Percent
+ELEVATED_AVG_HEART_RATE = 100  # BPM; average over the trend window
+
+# Alert rules, compiled once by AlertRuleEngine. clear_threshold adds hysteresis, debounce is
+# the number of consecutive breaching readings, and duration_seconds how long a breach must last.
+ALERT_RULES = [
+    {"name": "High heart rate alert", "metric": "heart_rate", "op": ">", "threshold": HIGH_HEART_RATE,
+     "clear_threshold": HIGH_HEART_RATE - 5, "debounce": 1},
+    {"name": "High temperature alert", "metric": "temperature", "op": ">", "threshold": HIGH_TEMPERATURE,
+     "clear_threshold": HIGH_TEMPERATURE - 0.3, "debounce": 1},
+    {"name": "Low oxygen level alert", "metric": "oxygen_level", "op": "<", "threshold": LOW_OXYGEN_LEVEL,
+     "clear_threshold": LOW_OXYGEN_LEVEL + 2, "debounce": 1},
+]
+ALERT_RULE_OVERRIDES = {}  # patient_id -> {rule name: {field: value}}, e.g. a lower heart rate limit
+ALERT_RENOTIFY_SECONDS = 300  # Repeat an alert that is still active after this long (None never repeats)
+ALERT_LATENCY_TARGET_MS = 1000  # End-to-end target from raising an alert to the backend's ack
+ALERT_RETRY_SECONDS = 2  # Delay before a failed alert send is retried
+
+# Report filter settings (send-on-change)
+REPORT_FILTER_ENABLED = False  # Send a reading only when a metric moves past its dead-band, on the heartbeat, or after an alert
+REPORT_DEADBANDS = {"heart_rate": 2, "temperature": 0.1, "oxygen_level": 1}  # Change since the last sent value worth sending
+REPORT_HEARTBEAT_SECONDS = 60  # Send a reading at least this often per patient even when nothing changed
+REPORT_BOOST_SECONDS = 300  # Send every reading for this long after an alert or trend flag
+
+# Trend analysis settings
+TREND_WINDOW_MINUTES = 5  # Sliding window used for trend detection
+TREND_WINDOW_MAX_SAMPLES = 4096  # Ring buffer capacity per patient and metric
+
+# Vectorized analytics settings (needs numpy)
+VECTOR_ANALYTICS_ENABLED = False  # Run the NumPy detectors over the live trend window
+VECTOR_ANALYTICS_INTERVAL_SECONDS = 10  # How often the detectors run
+ZSCORE_WINDOW_SAMPLES = 30  # Preceding samples each reading is compared against
+ZSCORE_ALERT = 3.0  # Absolute z-score that raises an alert
+EWMA_ALPHA = 0.2  # Smoothing factor for the EWMA heart rate level
+HR_SLOPE_ALERT_BPM_PER_MIN = 2.0  # Heart rate rise per minute for the cross-metric rule
+SPO2_SLOPE_ALERT_PCT_PER_MIN = -0.5  # SpO2 fall per minute for the cross-metric rule
+
+# Backlog retry settings
+BACKLOG_PAGE_SIZE = 100  # Unsent rows read per keyset page
+BACKLOG_TIME_BUDGET_MS = 1000  # Max time spent draining the backlog per main-loop tick
+BACKLOG_MIN_REQUEST_MS = 100  # No backlog send is started with less of the tick budget left
+BACKLOG_BYTE_BUDGET = 256 * 1024  # Max payload bytes sent from the backlog per tick
+BACKLOG_BACKOFF_BASE_SECONDS = 5  # First retry delay after the backend fails
+BACKLOG_BACKOFF_MAX_SECONDS = 300  # Upper bound for the exponential retry delay
+
+# Local storage settings
+DB_SYNCHRONOUS = "NORMAL"  # SQLite synchronous level for routine commits (WAL makes NORMAL crash-safe)
+DB_CACHE_SIZE_KB = 2048  # SQLite page cache size
+DB_GROUP_COMMIT_ROWS = 20  # Commit once this many inserts are pending (1 = commit every insert)
+DB_GROUP_COMMIT_MS = 1000  # Commit pending inserts at least this often
+DB_DURABLE_ALERTS = True  # Commit alert-bearing rows immediately with synchronous=FULL
+
+# Retention settings
+RAW_RETENTION_HOURS = 24  # Sent raw rows older than this are rolled up into minute buckets
+MINUTE_ROLLUP_RETENTION_DAYS = 7  # Minute buckets older than this are rolled up into hour buckets
+HOUR_ROLLUP_RETENTION_DAYS = 365  # Hour buckets older than this are deleted (None keeps them)
+RETENTION_CHUNK_ROWS = 500  # Rows compacted per transaction
+RETENTION_TIME_BUDGET_MS = 200  # Max time spent compacting per retention step
+RETENTION_INTERVAL_SECONDS = 60  # How often a retention step runs
+
+# Acquisition settings
+ACQUISITION_MODE = "loop"  # "loop" reads all sensors once per tick; "scheduled" polls each sensor at its own rate
+LOOP_INTERVAL_SECONDS = 5  # Delay between main-loop ticks
+SENSOR_POLL_RATES_HZ = {"heart_rate": 1.0, "temperature": 0.1}  # Per-sensor polling frequency
+ACQUISITION_QUEUE_CAPACITY = 4096  # Readings buffered between the scheduler and the main loop
+
+# Waveform settings (scheduled acquisition only)
+WAVEFORM_ENABLED = False  # Capture the mock ECG waveform; its derived heart rate replaces the mock heart rate sensor
+WAVEFORM_COMPRESSION_LEVEL = 6  # zlib level for waveform chunks, 1 (fastest) to 9 (smallest)
+WAVEFORM_RETENTION_HOURS = 24  # Waveform chunks older than this are deleted by retention
+
+# Sensor channels hosted by this process. Each entry is {"device_id": ..., "patient_id": ...}
+# with optional "use_synthetic" and "interval_seconds"; an empty list runs one channel for
+# DEVICE_ID/PATIENT_ID.
+SENSOR_CHANNELS = []
+
+# Replay settings (benchmarks.replay_benchmark)
+REPLAY_TICK_MS = 1000  # Recorded time released to the agent per replay tick; one batch per patient per tick
+
+# Runtime settings
+RUNTIME_MODE = "loop"  # "loop" runs every step in one thread; "pipeline" runs concurrent stages
+PIPELINE_QUEUE_CAPACITY = 1024  # Bounded queue size between pipeline stages
+TRANSMIT_WORKERS = 1  # Transmit stage threads sharing the transmitter's connection pool
+PIPELINE_METRICS_INTERVAL_SECONDS = 60  # How often pipeline stage metrics are logged
+
+# Observability settings
+METRICS_ENABLED = True  # Serve counters and latency histograms at http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = "127.0.0.1"  # Interface for the metrics endpoint; localhost keeps it off the network
+METRICS_PORT = 9108
+LOG_SAMPLE_INTERVAL_SECONDS = 30  # Per-reading INFO messages are logged at most this often per kind
+
+# History query and export settings
+HISTORY_API_ENABLED = False  # Serve GET /history from the agent at http://HISTORY_API_HOST:HISTORY_API_PORT
+HISTORY_API_HOST = "127.0.0.1"  # Interface for the history endpoint; localhost keeps patient data off the network
+HISTORY_API_PORT = 9109
+HISTORY_CHUNK_ROWS = 500  # Rows fetched and encoded per chunk when streaming history
+
+# Runtime profile: "standard", or "lean" for boards with little RAM and a slow CPU.
+# VITALEDGE_RUNTIME_PROFILE in the environment selects it without editing this file.
+RUNTIME_PROFILE = os.environ.get("VITALEDGE_RUNTIME_PROFILE", "standard")
+
+if RUNTIME_PROFILE == "lean":
+    RUNTIME_MODE = "loop"  # One thread; no pipeline stages or queues
+    METRICS_ENABLED = False  # No HTTP server thread or http.server import
+    VECTOR_ANALYTICS_ENABLED = False  # Never load numpy
+    HTTP_POOL_SIZE = 1
+    HTTP_MAX_IN_FLIGHT = 1
+    DB_CACHE_SIZE_KB = 512
+    TREND_WINDOW_MAX_SAMPLES = 512  # Enough for a 5 minute window at 1 Hz
+    ACQUISITION_QUEUE_CAPACITY = 256
+    PIPELINE_QUEUE_CAPACITY = 64
+    BACKLOG_PAGE_SIZE = 50
+    WAVEFORM_COMPRESSION_LEVEL = 1  # Cheapest zlib level on a slow CPU
@@ -1,13 +1,48 @@
 """
 logger.py
 Adds structured logging across the application.
+
+Per-reading messages go through log_sampled, which emits at most one line per key every
+LOG_SAMPLE_INTERVAL_SECONDS and reports how many similar lines were skipped, so logging
+never costs more than the work it describes. Counts and latencies for every reading are
+recorded by src.utils.metrics instead.
 """
 import logging
+import threading
+import time
+from src.utils.config import LOG_SAMPLE_INTERVAL_SECONDS
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+_sample_lock = threading.Lock()
+_sample_state = {}  # key -> [next emit time, suppressed count]
+
 def log_info(message):
     logging.info(message)
 
 def log_error(message):
     logging.error(message)
+
+def log_sampled(key, message, interval_seconds=LOG_SAMPLE_INTERVAL_SECONDS):
+    """
+    Log an INFO message at most once per interval for the given key.
+
+    Args:
+        key (str): Groups similar messages, e.g. "record-sent".
+        message (str or callable): The message, or a function returning it so skipped
+            messages are never formatted.
+        interval_seconds (float): Minimum time between emitted messages for the key.
+    """
+    now = time.monotonic()
+    with _sample_lock:
+        state = _sample_state.setdefault(key, [0.0, 0])
+        if now < state[0]:
+            state[1] += 1
+            return
+        suppressed = state[1]
+        state[0], state[1] = now + interval_seconds, 0
+    if callable(message):
+        message = message()
+    if suppressed:
+        message = f"{message} ({suppressed} similar messages suppressed)"
+    logging.info(message)
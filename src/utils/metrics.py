@@ -0,0 +1,305 @@
+"""
+metrics.py
+In-process counters, gauges and latency histograms for the edge agent, exposed on a local
+Prometheus-style endpoint.
+
+Instruments:
+Counter, Gauge and Histogram are created through a MetricsRegistry and may carry labels;
+labels(...) returns the child for one set of label values. Updating a metric takes one
+small lock and no allocation once the child exists, so the hot path can record every
+reading. A Gauge can instead be given a function that is evaluated only when scraped,
+for values such as the backlog depth that are too costly to track on every insert.
+
+Exposition:
+MetricsServer serves the registry at GET /metrics in the Prometheus text format
+(version 0.0.4) from a daemon thread. It binds to METRICS_HOST, localhost by default, so
+the figures are available to a local scraper or `curl` without being exposed on the ward
+network. http.server is only imported when a MetricsServer is created, so agents running
+with metrics disabled do not load it.
+
+The instruments the agent records are defined at the bottom of this module.
+"""
+import bisect
+import threading
+from src.utils.config import METRICS_HOST, METRICS_PORT
+from src.utils.logger import log_info, log_error
+
+# Latency buckets in seconds, from sub-millisecond SQLite inserts to slow HTTP calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Return the child metric for one set of label values."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            children = sorted(self._children.items(), key=lambda item: item[0])
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+class _GaugeChild:
+    __slots__ = ("_lock", "value", "function")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Evaluate function() at scrape time instead of storing a value."""
+        self.function = function
+
+    def render(self, name, labelnames, values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                log_error(f"Gauge {name} could not be evaluated: {e}")
+                return []
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+class _HistogramChild:
+    __slots__ = ("_lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(labelnames, values, [("le", _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {count}")
+        return lines
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, seconds):
+        self._children[()].observe(seconds)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT, registry=None):
+        """
+        Args:
+            host (str): Interface to bind; localhost keeps the endpoint off the network.
+            port (int): Port to bind; 0 picks a free port.
+            registry (MetricsRegistry): Metrics to serve; defaults to REGISTRY.
+        """
+        # Imported here so agents with metrics disabled do not load http.server
+        from http.server import ThreadingHTTPServer
+
+        self.registry = registry or REGISTRY
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        log_info(f"Metrics available at {self.url}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are not worth a log line each
+
+        return Handler
+
+REGISTRY = MetricsRegistry()
+
+# Instruments recorded by the edge agent
+SENSOR_READ_SECONDS = REGISTRY.histogram(
+    "vitaledge_sensor_read_seconds", "Time to read a channel's sensors.")
+READINGS_TOTAL = REGISTRY.counter(
+    "vitaledge_readings_total", "Readings collected, per channel.", ("channel",))
+DB_INSERT_SECONDS = REGISTRY.histogram(
+    "vitaledge_db_insert_seconds", "Time to insert one reading into SQLite.", ("durable",))
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "vitaledge_db_commit_seconds", "Time to commit a group-commit transaction.")
+TREND_ANALYSIS_SECONDS = REGISTRY.histogram(
+    "vitaledge_trend_analysis_seconds", "Time to analyze one patient's trend window.")
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "vitaledge_http_request_seconds", "Backend request latency by endpoint and status code.",
+    ("endpoint", "status"))
+TOKEN_REFRESHES_TOTAL = REGISTRY.counter(
+    "vitaledge_token_refreshes_total", "JWT token requests by outcome.", ("outcome",))
+AUTH_ROUND_TRIPS_TOTAL = REGISTRY.counter(
+    "vitaledge_auth_round_trips_total", "JWT token requests by trigger.", ("trigger",))
+RECORDS_SENT_TOTAL = REGISTRY.counter(
+    "vitaledge_records_sent_total", "Records marked as 'sent'.")
+REPORT_DECISIONS_TOTAL = REGISTRY.counter(
+    "vitaledge_report_decisions_total", "Report filter decisions: changed, heartbeat, boosted or suppressed.",
+    ("decision",))
+BACKLOG_DEPTH = REGISTRY.gauge(
+    "vitaledge_backlog_depth", "Stored readings not yet sent to the backend.")
+ALERT_QUEUE_DEPTH = REGISTRY.gauge(
+    "vitaledge_alert_queue_depth", "Alerts waiting on the fast lane.")
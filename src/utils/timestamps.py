@@ -0,0 +1,40 @@
+"""
+timestamps.py
+Helpers for the two timestamp forms used on the device: ISO 8601 UTC text with a 'Z'
+suffix (stored and sent to the backend) and integer epoch milliseconds (indexed locally).
+"""
+from datetime import datetime, timezone
+
+def utc_now_epoch_ms():
+    """Return the current UTC time as integer epoch milliseconds."""
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+def iso_to_epoch_ms(value):
+    """
+    Parse an ISO 8601 timestamp into epoch milliseconds.
+
+    Accepts both the 'Z'-suffixed form and naive timestamps, which are treated as UTC.
+
+    Args:
+        value (str): ISO 8601 timestamp.
+
+    Returns:
+        int: Epoch milliseconds, or None if the value cannot be parsed.
+    """
+    if not value:
+        return None
+    text = value.strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def epoch_ms_to_iso(epoch_ms):
+    """Format epoch milliseconds as ISO 8601 UTC text with millisecond precision and a 'Z'."""
+    moment = datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{epoch_ms % 1000:03d}Z"
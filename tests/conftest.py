@@ -0,0 +1,20 @@
+"""
+conftest.py
+Shared pytest fixtures. Tests run against the source tree, so the repository root is put
+on sys.path the same way running main.py from it would.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_processing.database_manager import DatabaseManager  # noqa: E402
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """A DatabaseManager on a throwaway SQLite file, closed after the test."""
+    manager = DatabaseManager(db_path=str(tmp_path / "sensor_data.db"))
+    yield manager
+    manager.close()
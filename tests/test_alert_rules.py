@@ -0,0 +1,114 @@
+"""
+test_alert_rules.py
+Checks the alert rule engine's trip, hysteresis, debounce, renotify, per-patient overrides
+and condition dedupe.
+"""
+import pytest
+
+from src.data_collection.reading import Reading
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_processing.alert_rules import AlertRuleEngine
+
+PATIENT_ID = "patient-1"
+START_MS = 1_767_225_600_000
+
+HIGH_HR = {"name": "High heart rate alert", "metric": "heart_rate", "op": ">", "threshold": 100,
+           "clear_threshold": 95}
+LOW_SPO2 = {"name": "Low oxygen level alert", "metric": "oxygen_level", "op": "<", "threshold": 90,
+            "clear_threshold": 92, "debounce": 3}
+
+def make_engine(overrides=None, renotify_seconds=300):
+    return AlertRuleEngine(rules=[HIGH_HR, LOW_SPO2], overrides=overrides or {}, renotify_seconds=renotify_seconds)
+
+def feed(engine, metric, values, patient_id=PATIENT_ID, step_seconds=1):
+    """Evaluate one reading per value; returns the alerts fired by each."""
+    return [engine.evaluate(patient_id, {metric: value}, START_MS + i * step_seconds * 1000)
+            for i, value in enumerate(values)]
+
+def test_breach_trips_once():
+    engine = make_engine()
+
+    fired = feed(engine, "heart_rate", [80, 101, 110, 105])
+
+    assert fired == [[], ["High heart rate alert"], [], []]
+    assert engine.active_alerts(PATIENT_ID) == ["High heart rate alert"]
+
+def test_value_inside_the_clear_band_holds_the_alert():
+    engine = make_engine()
+
+    # 97 is back under the threshold but above the clear threshold, so 102 is the same episode
+    fired = feed(engine, "heart_rate", [101, 97, 98, 102])
+
+    assert fired == [["High heart rate alert"], [], [], []]
+    assert engine.active_alerts(PATIENT_ID) == ["High heart rate alert"]
+
+def test_crossing_the_clear_threshold_re_arms():
+    engine = make_engine()
+
+    fired = feed(engine, "heart_rate", [101, 95, 101])
+
+    assert fired == [["High heart rate alert"], [], ["High heart rate alert"]]
+
+def test_debounce_needs_consecutive_breaches():
+    engine = make_engine()
+
+    fired = feed(engine, "oxygen_level", [89, 88, 95, 89, 88, 87, 86])
+
+    assert fired == [[], [], [], [], [], ["Low oxygen level alert"], []]
+
+def test_still_active_alert_renotifies():
+    engine = make_engine(renotify_seconds=60)
+
+    fired = feed(engine, "heart_rate", [101] * 7, step_seconds=20)
+
+    # Fires at 0 s, then again once 60 s have passed since the last notification
+    assert [i for i, names in enumerate(fired) if names] == [0, 3, 6]
+
+def test_no_renotify_when_disabled():
+    engine = make_engine(renotify_seconds=None)
+
+    fired = feed(engine, "heart_rate", [101] * 10, step_seconds=600)
+
+    assert sum(map(len, fired)) == 1
+
+def test_per_patient_override():
+    engine = make_engine(overrides={"patient-2": {"High heart rate alert": {"threshold": 120, "clear_threshold": 110}}})
+
+    assert feed(engine, "heart_rate", [115], patient_id=PATIENT_ID) == [["High heart rate alert"]]
+    assert feed(engine, "heart_rate", [115, 121], patient_id="patient-2") == [[], ["High heart rate alert"]]
+
+def test_evaluate_batch_matches_reading_by_reading():
+    values = [80, 101, 97, 94, 102, 103]
+    batch = ReadingBatch([Reading(ts=START_MS + i * 1000, heart_rate=value) for i, value in enumerate(values)])
+
+    fired = make_engine().evaluate_batch(PATIENT_ID, batch)
+
+    assert fired == [(1, "High heart rate alert"), (4, "High heart rate alert")]
+
+def test_condition_fires_once_and_re_arms_after_clearing():
+    engine = make_engine()
+    report = {"hr-rising": "Heart rate rising"}
+
+    assert engine.evaluate_conditions(PATIENT_ID, "trend", report, START_MS) == ["Heart rate rising"]
+    assert engine.evaluate_conditions(PATIENT_ID, "trend", report, START_MS + 1000) == []
+    assert engine.evaluate_conditions(PATIENT_ID, "trend", {}, START_MS + 2000) == []
+    assert engine.evaluate_conditions(PATIENT_ID, "trend", report, START_MS + 3000) == ["Heart rate rising"]
+
+@pytest.mark.parametrize("renotify_seconds, expected", [(60, 2), (None, 1)])
+def test_condition_renotifies_while_it_holds(renotify_seconds, expected):
+    engine = make_engine(renotify_seconds=renotify_seconds)
+
+    fired = [engine.evaluate_conditions(PATIENT_ID, "vector", {"z": "Spike"}, START_MS + s * 1000)
+             for s in range(0, 90, 10)]
+
+    assert sum(map(len, fired)) == expected
+
+def test_cleared_conditions_are_pruned():
+    engine = make_engine()
+
+    for i in range(100):
+        engine.evaluate_conditions(PATIENT_ID, "vector", {f"condition-{i}": "message"}, START_MS + i * 1000)
+    engine.evaluate_conditions(PATIENT_ID, "vector", {}, START_MS + 100_000)
+
+    assert engine._conditions == {}
+    assert engine._states == {}
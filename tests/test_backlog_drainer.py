@@ -0,0 +1,102 @@
+"""
+test_backlog_drainer.py
+Drains a real SQLite backlog through a fake send function and checks ordering, budgets,
+resumption and backoff.
+"""
+import json
+
+import pytest
+
+from src.data_transmission import backlog_drainer
+from src.data_transmission.backlog_drainer import BacklogDrainer
+
+ROUTINE = {"heart_rate": 72, "temperature": 36.6, "oxygen_level": 98}
+ALERT = {"heart_rate": 130, "temperature": 36.6, "oxygen_level": 98}
+
+class FakeSend:
+    """Stands in for Transmitter.send_claimed: acks on success, releases the claim on failure."""
+    def __init__(self, db_manager, failures=0):
+        self.db_manager = db_manager
+        self.failures = failures
+        self.sent = []
+
+    def __call__(self, backend_data, patient_id, record_id, deadline=None):
+        if self.failures:
+            self.failures -= 1
+            self.db_manager.release_claims([record_id])
+            return False
+        self.sent.append(record_id)
+        self.db_manager.mark_acked([record_id])
+        return True
+
+def save(db_manager, readings):
+    return [db_manager.save_data("device-1", "patient-1", {"timestamp": f"2026-01-01T00:00:{i:02d}Z", **reading})
+            for i, reading in enumerate(readings)]
+
+def statuses(db_manager):
+    return dict(db_manager.conn.execute("SELECT id, transmit_status FROM sensor_data"))
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.monotonic for the drainer, advanced by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(backlog_drainer.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(backlog_drainer.random, "uniform", lambda low, high: high)
+    return now
+
+def test_alert_records_are_drained_first(db_manager):
+    record_ids = save(db_manager, [ROUTINE, ALERT, ROUTINE, ROUTINE, ALERT, ROUTINE])
+    send = FakeSend(db_manager)
+
+    sent = BacklogDrainer(db_manager, send, page_size=2).drain()
+
+    alert_ids = [record_ids[1], record_ids[4]]
+    assert sent == 6
+    assert send.sent == alert_ids + [rid for rid in record_ids if rid not in alert_ids]
+    assert set(statuses(db_manager).values()) == {"sent"}
+
+def test_byte_budget_ends_the_tick_and_the_next_tick_resumes(db_manager):
+    record_ids = save(db_manager, [ROUTINE] * 10)
+    send = FakeSend(db_manager)
+    # Two records stay under the budget, the third reaches it
+    record_bytes = len(json.dumps(BacklogDrainer(db_manager, send)._to_backend_record(
+        db_manager.fetch_unsent_page(limit=1)[0])[2]))
+    drainer = BacklogDrainer(db_manager, send, page_size=100, byte_budget=int(record_bytes * 2.5))
+
+    assert drainer.drain() == 3
+    assert send.sent == record_ids[:3]
+    assert [status for _, status in sorted(statuses(db_manager).items())] == ["sent"] * 3 + ["unsent"] * 7
+
+    assert drainer.drain() == 3
+    assert drainer.drain() == 3
+    assert drainer.drain() == 1
+    assert send.sent == record_ids
+
+def test_failure_backs_off_exponentially(db_manager, clock):
+    record_ids = save(db_manager, [ROUTINE] * 3)
+    send = FakeSend(db_manager, failures=2)
+    drainer = BacklogDrainer(db_manager, send, backoff_base_seconds=5, backoff_max_seconds=60)
+
+    assert drainer.drain() == 0
+    assert statuses(db_manager)[record_ids[0]] == "unsent"
+    clock[0] += 4.9
+    assert drainer.drain() == 0 and send.failures == 1  # Still backing off; nothing was tried
+
+    clock[0] += 0.1
+    assert drainer.drain() == 0 and send.failures == 0  # Second failure doubles the delay
+    clock[0] += 9.9
+    assert drainer.drain() == 0 and send.sent == []
+
+    clock[0] += 0.1
+    assert drainer.drain() == 3
+    assert send.sent == record_ids
+    assert set(statuses(db_manager).values()) == {"sent"}
+
+def test_records_claimed_elsewhere_are_skipped(db_manager):
+    record_ids = save(db_manager, [ROUTINE] * 4)
+    db_manager.claim_for_send(record_ids[1:2])
+    send = FakeSend(db_manager)
+
+    assert BacklogDrainer(db_manager, send).drain() == 3
+    assert send.sent == [record_ids[0], record_ids[2], record_ids[3]]
+    assert statuses(db_manager)[record_ids[1]] == "in_flight"
@@ -0,0 +1,118 @@
+"""
+test_database_manager.py
+Checks the transmission ledger's state changes, that its updates ride the group commit, and
+what other connections see.
+"""
+import sqlite3
+
+from src.data_processing.database_manager import DatabaseManager
+from src.data_processing.history_query import HistoryQuery
+
+READING = {"timestamp": "2026-01-01T00:00:00Z", "heart_rate": 72, "temperature": 36.6, "oxygen_level": 98}
+
+def committed_statuses(db_path):
+    """Read transmit_status through a second connection, which only sees committed rows."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT transmit_status FROM sensor_data ORDER BY id")]
+    finally:
+        conn.close()
+
+def test_ledger_updates_join_the_group_commit(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sensor_data.db")
+    db_manager = DatabaseManager(db_path=db_path, group_commit_rows=100, group_commit_ms=0)
+    try:
+        commits = []
+        commit = db_manager._commit
+        monkeypatch.setattr(db_manager, "_commit", lambda: commits.append(1) or commit())
+
+        record_ids = [db_manager.save_data("device-1", "patient-1", READING) for _ in range(3)]
+        db_manager.claim_for_send(record_ids)
+        db_manager.mark_acked(record_ids[:1])
+        db_manager.release_claims(record_ids[1:2])
+        db_manager.mark_suppressed(record_ids[1:2])
+        db_manager.update_tx_status(record_ids[2], "unsent")
+
+        assert commits == []
+        assert committed_statuses(db_path) == []
+        db_manager.flush()
+        assert commits == [1]
+        assert committed_statuses(db_path) == ["sent", "suppressed", "unsent"]
+    finally:
+        db_manager.close()
+
+def test_history_query_flushes_pending_rows(tmp_path):
+    db_path = str(tmp_path / "sensor_data.db")
+    db_manager = DatabaseManager(db_path=db_path, group_commit_rows=100, group_commit_ms=0)
+    try:
+        db_manager.save_data("device-1", "patient-1", READING)
+
+        assert HistoryQuery(db_path).patient_ids() == []
+        assert HistoryQuery(db_path, flush=db_manager.flush).patient_ids() == ["patient-1"]
+    finally:
+        db_manager.close()
+
+def statuses(db_manager):
+    return [row[0] for row in db_manager.conn.execute("SELECT transmit_status FROM sensor_data ORDER BY id")]
+
+def test_claim_skips_records_already_claimed_or_sent(db_manager):
+    record_ids = [db_manager.save_data("device-1", "patient-1", READING) for _ in range(3)]
+
+    assert db_manager.claim_for_send(record_ids[:2]) == record_ids[:2]
+    db_manager.mark_acked(record_ids[:1])
+
+    assert db_manager.claim_for_send(list(reversed(record_ids))) == [record_ids[2]]
+    assert db_manager.claim_for_send(record_ids) == []
+    assert statuses(db_manager) == ["sent", "in_flight", "in_flight"]
+
+def test_mark_acked_counts_only_new_acknowledgements(db_manager):
+    record_ids = [db_manager.save_data("device-1", "patient-1", READING) for _ in range(2)]
+    db_manager.claim_for_send(record_ids)
+
+    assert db_manager.mark_acked(record_ids) == 2
+    assert db_manager.mark_acked(record_ids) == 0
+    assert db_manager.count_unsent() == 0
+
+def test_release_returns_only_claimed_records(db_manager):
+    record_ids = [db_manager.save_data("device-1", "patient-1", READING) for _ in range(3)]
+    db_manager.claim_for_send(record_ids[:2])
+    db_manager.mark_acked(record_ids[:1])
+
+    db_manager.release_claims(record_ids)
+
+    assert statuses(db_manager) == ["sent", "unsent", "unsent"]
+    assert db_manager.claim_for_send(record_ids) == record_ids[1:]
+
+def test_stale_claim_is_requeued_and_a_late_ack_still_lands(db_manager):
+    record_ids = [db_manager.save_data("device-1", "patient-1", READING) for _ in range(2)]
+    db_manager.claim_for_send(record_ids[:1], now_ms=1_000)
+    db_manager.claim_for_send(record_ids[1:], now_ms=9_000)
+
+    assert db_manager.requeue_in_flight(claimed_before_ms=5_000) == 1
+    assert statuses(db_manager) == ["unsent", "in_flight"]
+
+    # The backend acknowledges the first send after the sweep gave up on it
+    assert db_manager.mark_acked(record_ids[:1]) == 1
+    assert statuses(db_manager) == ["sent", "in_flight"]
+    assert db_manager.claim_for_send(record_ids[:1]) == []
+    assert [row[0] for row in db_manager.fetch_unsent_page()] == []
+
+def test_requeue_without_cutoff_returns_every_claim(db_manager):
+    record_ids = [db_manager.save_data("device-1", "patient-1", READING) for _ in range(3)]
+    db_manager.claim_for_send(record_ids)
+    db_manager.mark_acked(record_ids[:1])
+
+    assert db_manager.requeue_in_flight() == 2
+    assert statuses(db_manager) == ["sent", "unsent", "unsent"]
+    attempts = [row[0] for row in db_manager.conn.execute("SELECT tx_attempts FROM sensor_data ORDER BY id")]
+    assert attempts == [1, 1, 1]
+
+def test_late_ack_for_a_requeued_record_that_was_claimed_again(db_manager):
+    record_id = db_manager.save_data("device-1", "patient-1", READING)
+    db_manager.claim_for_send([record_id], now_ms=1_000)
+    db_manager.requeue_in_flight(claimed_before_ms=5_000)
+    assert db_manager.claim_for_send([record_id]) == [record_id]
+
+    assert db_manager.mark_acked([record_id]) == 1  # Ack of the first send
+    assert db_manager.mark_acked([record_id]) == 0  # Ack of the retry changes nothing
+    assert statuses(db_manager) == ["sent"]
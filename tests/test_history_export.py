@@ -0,0 +1,35 @@
+"""
+test_history_export.py
+Checks duration parsing and that the history endpoint answers bad arguments with a 400.
+"""
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from src.data_processing.history_export import HistoryServer
+from src.data_processing.history_query import parse_duration_ms
+
+@pytest.mark.parametrize("value, expected", [
+    ("90", 90_000), ("90s", 90_000), ("1.5m", 90_000), ("24h", 86_400_000), ("7d", 604_800_000), ("1ms", 1),
+])
+def test_parse_duration_ms(value, expected):
+    assert parse_duration_ms(value) == expected
+
+@pytest.mark.parametrize("value", ["0", "0s", "0.4ms", "0.0001s", "-5m", "5w", ""])
+def test_parse_duration_ms_rejects_durations_under_a_millisecond(value):
+    with pytest.raises(ValueError):
+        parse_duration_ms(value)
+
+@pytest.fixture
+def history_server(db_manager):
+    server = HistoryServer(port=0, db_path=db_manager.db_path, flush=db_manager.flush).start()
+    yield server
+    server.stop()
+
+@pytest.mark.parametrize("query", ["last=1h&interval=0.4ms", "last=0.4ms", "last=1h&format=xml"])
+def test_invalid_arguments_are_a_bad_request(history_server, query):
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{history_server.url}?{query}", timeout=5)
+
+    assert error.value.code == 400
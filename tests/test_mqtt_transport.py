@@ -0,0 +1,141 @@
+"""
+test_mqtt_transport.py
+Exercises MqttTransport and its ledger wiring against the in-process mock broker.
+"""
+import json
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("paho.mqtt")
+
+from benchmarks.mock_broker import MockBroker  # noqa: E402
+from src.data_transmission.mqtt_transport import MqttTransport  # noqa: E402
+from src.data_transmission.transmitter import Transmitter  # noqa: E402
+
+PATIENT_ID = "patient-1"
+# Nothing listens here, so the transmitter's token refresher fails fast and stays out of the way
+UNREACHABLE_URL = "http://127.0.0.1:9"
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition until it is true or timeout seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+def store_reading(db_manager):
+    """Store one reading and return its record ID and backend payload."""
+    record_id = db_manager.save_data("device-1", PATIENT_ID, {
+        "timestamp": "2026-01-01T00:00:00Z", "heart_rate": 72, "temperature": 36.6, "oxygen_level": 98,
+    })
+    return record_id, {"deviceId": "device-1", "heartRate": 72, "idempotencyKey": f"device-1-{record_id}"}
+
+def tx_status(db_manager, record_id):
+    return db_manager.conn.execute("SELECT transmit_status FROM sensor_data WHERE id = ?", (record_id,)).fetchone()[0]
+
+@pytest.fixture
+def broker_factory():
+    brokers = []
+
+    def start(**kwargs):
+        brokers.append(MockBroker(**kwargs).start())
+        return brokers[-1]
+
+    yield start
+    for broker in brokers:
+        broker.stop()
+
+@pytest.fixture
+def transmitter_factory(db_manager):
+    transmitters = []
+
+    def start(broker):
+        host, port = broker.address
+        transport = MqttTransport(host=host, port=port, client_id=f"test-{len(transmitters)}",
+                                  username=None, compression="identity")
+        transmitters.append(Transmitter(backend_url=UNREACHABLE_URL, auth_endpoint=UNREACHABLE_URL,
+                                        db_manager=db_manager, transport=transport, token_cache_path=None))
+        return transmitters[-1]
+
+    yield start
+    for transmitter in transmitters:
+        transmitter.close()
+
+def test_publish_reaches_patient_topic(broker_factory, transmitter_factory, db_manager):
+    broker = broker_factory()
+    transmitter = transmitter_factory(broker)
+    record_id, data = store_reading(db_manager)
+
+    assert transmitter.send_data(data, PATIENT_ID, record_id)
+
+    assert wait_for(lambda: broker.messages)
+    topic, payload, qos = broker.messages[0]
+    assert topic == transmitter.transport.topic_for(PATIENT_ID)
+    assert json.loads(payload) == data
+    assert qos == 1
+
+def test_puback_marks_record_acked(broker_factory, transmitter_factory, db_manager, monkeypatch):
+    broker = broker_factory()
+    transmitter = transmitter_factory(broker)
+    record_id, data = store_reading(db_manager)
+    acked = []
+    mark_acked = db_manager.mark_acked
+    monkeypatch.setattr(db_manager, "mark_acked", lambda record_ids: acked.append(list(record_ids)) or mark_acked(record_ids))
+
+    assert transmitter.send_data(data, PATIENT_ID, record_id)
+
+    assert wait_for(lambda: acked)
+    assert acked == [[record_id]]
+    assert tx_status(db_manager, record_id) == "sent"
+    assert transmitter.transport.pending() == 0
+
+def test_unacked_record_is_requeued(broker_factory, transmitter_factory, db_manager):
+    broker = broker_factory(drop_pubacks=True)
+    transmitter = transmitter_factory(broker)
+    record_id, data = store_reading(db_manager)
+
+    assert transmitter.send_data(data, PATIENT_ID, record_id)
+    assert wait_for(lambda: broker.messages)
+    assert tx_status(db_manager, record_id) == "in_flight"
+    assert transmitter.transport.pending() == 1
+
+    # A full drain pass requeues claims older than the in-flight timeout
+    transmitter.backlog_drainer.in_flight_timeout_seconds = 0
+    time.sleep(0.01)
+    transmitter.backlog_drainer.drain()
+
+    assert tx_status(db_manager, record_id) == "unsent"
+
+def test_record_published_while_disconnected_is_sent_once_after_reconnect(db_manager):
+    # Reserve a port with no broker behind it yet
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        host, port = probe.getsockname()
+    transport = MqttTransport(host=host, port=port, client_id="test-offline", username=None, compression="identity")
+    transmitter = Transmitter(backend_url=UNREACHABLE_URL, auth_endpoint=UNREACHABLE_URL, db_manager=db_manager,
+                              transport=transport, token_cache_path=None)
+    broker = None
+    try:
+        record_id, data = store_reading(db_manager)
+
+        # paho queues the message while offline, so the record is accepted and stays claimed
+        assert transmitter.send_data(data, PATIENT_ID, record_id)
+        assert tx_status(db_manager, record_id) == "in_flight"
+        assert transport.pending() == 1
+        # The drainer must not publish a second copy of the claimed record
+        transmitter.retry_unsent_data()
+        assert transport.pending() == 1
+
+        broker = MockBroker(host=host, port=port).start()
+        assert wait_for(lambda: tx_status(db_manager, record_id) == "sent", timeout=10.0)
+        assert len(broker.messages) == 1
+        assert json.loads(broker.messages[0][1]) == data
+        assert transport.pending() == 0
+    finally:
+        transmitter.close()
+        if broker is not None:
+            broker.stop()
@@ -0,0 +1,77 @@
+"""
+test_payload_codec.py
+Round-trips upload bodies through encode_payload and decode_payload and checks the headers
+that tell the backend how to read them.
+"""
+import json
+
+import pytest
+
+from src.data_processing.data_converter import backend_record
+from src.data_transmission import payload_codec
+from src.data_transmission.payload_codec import (
+    COLUMNAR_CONTENT_TYPE, JSON_CONTENT_TYPE, decode_payload, encode_payload
+)
+
+needs_zstd = pytest.mark.skipif(payload_codec.zstandard is None, reason="zstandard is not installed")
+needs_msgpack = pytest.mark.skipif(payload_codec.msgpack is None, reason="msgpack is not installed")
+
+RECORD = backend_record("device-1", "patient-1", 1767225600000, heart_rate=72, oxygen_level=98, record_id=1)
+BATCH = [RECORD, backend_record("device-1", "patient-1", 1767225601000, temperature=36.6, record_id=2)]
+
+def without_nulls(record):
+    return {key: value for key, value in record.items() if value is not None}
+
+def test_default_json_keeps_null_fields():
+    body, headers = encode_payload(RECORD)
+
+    assert headers == {"Content-Type": JSON_CONTENT_TYPE}
+    assert json.loads(body) == RECORD
+    assert json.loads(body)["temperature"] is None
+
+def test_json_batch_keeps_null_fields():
+    body, headers = encode_payload(BATCH)
+
+    assert headers == {"Content-Type": JSON_CONTENT_TYPE}
+    assert decode_payload(body, headers) == BATCH
+
+@pytest.mark.parametrize("payload", [RECORD, BATCH])
+def test_gzip_round_trip(payload):
+    body, headers = encode_payload(payload, compression="gzip")
+
+    assert headers == {"Content-Type": JSON_CONTENT_TYPE, "Content-Encoding": "gzip"}
+    assert body[:2] == b"\x1f\x8b"
+    assert decode_payload(body, headers) == payload
+
+@needs_zstd
+@pytest.mark.parametrize("payload", [RECORD, BATCH])
+def test_zstd_round_trip(payload):
+    body, headers = encode_payload(payload, compression="zstd")
+
+    assert headers == {"Content-Type": JSON_CONTENT_TYPE, "Content-Encoding": "zstd"}
+    assert decode_payload(body, headers) == payload
+
+@needs_msgpack
+@pytest.mark.parametrize("compression", ["identity", "gzip"])
+def test_columnar_round_trip_drops_only_null_fields(compression):
+    body, headers = encode_payload(BATCH, encoding="columnar", compression=compression)
+
+    assert headers["Content-Type"] == COLUMNAR_CONTENT_TYPE
+    assert headers.get("Content-Encoding") == (None if compression == "identity" else compression)
+    assert decode_payload(body, headers) == [without_nulls(record) for record in BATCH]
+
+def test_columnar_single_record_stays_json():
+    body, headers = encode_payload(RECORD, encoding="columnar")
+
+    assert headers == {"Content-Type": JSON_CONTENT_TYPE}
+    assert json.loads(body) == RECORD
+
+@pytest.mark.skipif(payload_codec.zstandard is not None, reason="zstandard is installed")
+def test_missing_zstd_raises_value_error():
+    with pytest.raises(ValueError):
+        encode_payload(RECORD, compression="zstd")
+
+@pytest.mark.skipif(payload_codec.msgpack is not None, reason="msgpack is installed")
+def test_missing_msgpack_raises_value_error():
+    with pytest.raises(ValueError):
+        encode_payload(BATCH, encoding="columnar")
@@ -0,0 +1,95 @@
+"""
+test_report_filter.py
+Checks the send-on-change filter's dead-bands, heartbeat and boost, and the suppressed marks.
+"""
+import pytest
+
+from src.data_collection.reading import Reading
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_processing.report_filter import ReportFilter
+
+PATIENT_ID = "patient-1"
+START_MS = 1_767_225_600_000
+
+@pytest.fixture
+def report_filter():
+    return ReportFilter(deadbands={"heart_rate": 2, "temperature": 0.1}, heartbeat_seconds=60, boost_seconds=30)
+
+def reading(second, heart_rate=72.0, temperature=36.6):
+    return Reading(ts=START_MS + second * 1000, heart_rate=heart_rate, temperature=temperature)
+
+def test_first_reading_is_sent(report_filter):
+    assert report_filter.should_send(PATIENT_ID, reading(0))
+
+def test_change_inside_the_dead_band_is_suppressed(report_filter):
+    report_filter.should_send(PATIENT_ID, reading(0))
+
+    assert not report_filter.should_send(PATIENT_ID, reading(1, heart_rate=73.5))
+    assert not report_filter.should_send(PATIENT_ID, reading(2, temperature=36.65))
+    assert report_filter.should_send(PATIENT_ID, reading(3, heart_rate=74.5))
+
+def test_slow_drift_is_measured_from_the_last_sent_value(report_filter):
+    report_filter.should_send(PATIENT_ID, reading(0))
+
+    sent = [report_filter.should_send(PATIENT_ID, reading(second, heart_rate=72.0 + second * 0.5))
+            for second in range(1, 6)]
+
+    # 72.5 .. 74.0 stay within 2 of 72; 74.5 is the first to move past it
+    assert sent == [False, False, False, False, True]
+
+def test_missing_metric_never_triggers_a_send(report_filter):
+    report_filter.should_send(PATIENT_ID, reading(0))
+
+    assert not report_filter.should_send(PATIENT_ID, reading(1, heart_rate=None, temperature=None))
+
+def test_heartbeat_sends_a_stable_patient(report_filter):
+    report_filter.should_send(PATIENT_ID, reading(0))
+
+    assert not report_filter.should_send(PATIENT_ID, reading(59))
+    assert report_filter.should_send(PATIENT_ID, reading(60))
+    assert not report_filter.should_send(PATIENT_ID, reading(61))
+    assert report_filter.stats.heartbeat == 1
+
+def test_escalate_sends_every_reading_until_the_boost_ends(report_filter):
+    report_filter.should_send(PATIENT_ID, reading(0))
+    report_filter.escalate(PATIENT_ID, START_MS + 10_000)
+
+    assert all(report_filter.should_send(PATIENT_ID, reading(second)) for second in range(10, 40))
+    assert not report_filter.should_send(PATIENT_ID, reading(40))
+    assert report_filter.stats.boosted == 30
+
+def test_patients_are_filtered_independently(report_filter):
+    report_filter.should_send(PATIENT_ID, reading(0))
+
+    assert report_filter.should_send("patient-2", reading(1))
+    assert not report_filter.should_send(PATIENT_ID, reading(1))
+
+def test_filter_stored_batch_marks_unsent_readings_suppressed(report_filter, db_manager):
+    batch = ReadingBatch([reading(0), reading(1), reading(2, heart_rate=90.0), reading(3, heart_rate=90.5)])
+    record_ids = db_manager.save_batch("device-1", PATIENT_ID, batch)
+
+    indexes = report_filter.filter_stored_batch(db_manager, PATIENT_ID, batch, record_ids)
+
+    assert indexes == [0, 2]
+    statuses = [row[0] for row in db_manager.conn.execute("SELECT transmit_status FROM sensor_data ORDER BY id")]
+    assert statuses == ["unsent", "suppressed", "unsent", "suppressed"]
+    assert report_filter.stats.as_dict()["reduction_ratio"] == 0.5
+
+def test_flagged_reading_sends_the_whole_batch(report_filter, db_manager):
+    batch = ReadingBatch([reading(second) for second in range(5)])
+    record_ids = db_manager.save_batch("device-1", PATIENT_ID, batch)
+
+    indexes = report_filter.filter_stored_batch(db_manager, PATIENT_ID, batch, record_ids, flagged=[2])
+
+    assert indexes == [0, 1, 2, 3, 4]
+
+def test_still_flagged_patient_stays_at_full_rate(report_filter, db_manager):
+    first = ReadingBatch([reading(second) for second in range(3)])
+    report_filter.filter_stored_batch(db_manager, PATIENT_ID, first, db_manager.save_batch("device-1", PATIENT_ID, first),
+                                      still_flagged=True)
+    second = ReadingBatch([reading(second) for second in range(3, 6)])
+
+    indexes = report_filter.filter_stored_batch(db_manager, PATIENT_ID, second,
+                                                db_manager.save_batch("device-1", PATIENT_ID, second))
+
+    assert indexes == [0, 1, 2]
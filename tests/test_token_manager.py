@@ -0,0 +1,148 @@
+"""
+test_token_manager.py
+Checks JWT expiry parsing, proactive and single-flight refreshes, and the 0600 token cache
+against a stubbed auth endpoint.
+"""
+import base64
+import json
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from src.data_transmission.token_manager import TokenManager, token_expiry
+
+def make_jwt(exp=None, subject="device-1"):
+    def part(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    claims = {"sub": subject} if exp is None else {"sub": subject, "exp": exp}
+    return f"{part({'alg': 'HS256'})}.{part(claims)}.signature"
+
+class AuthEndpoint:
+    """Stub for the auth round trip: issues numbered tokens that live ttl seconds."""
+    def __init__(self, ttl=3600, delay=0.0):
+        self.ttl = ttl
+        self.delay = delay
+        self.up = True
+        self.calls = []
+
+    def __call__(self):
+        self.calls.append(time.time())
+        time.sleep(self.delay)
+        if not self.up:
+            return None
+        return make_jwt(time.time() + self.ttl, subject=f"token-{len(self.calls)}")
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "jwt_token.json")
+
+def test_token_expiry_reads_the_exp_claim():
+    assert token_expiry(make_jwt(1767225600)) == 1767225600.0
+    assert token_expiry(make_jwt()) is None
+    assert token_expiry("not-a-jwt") is None
+    assert token_expiry("a.!!!.c") is None
+
+def test_token_without_exp_uses_the_fallback_ttl():
+    manager = TokenManager(lambda: make_jwt(), cache_path=None, fallback_ttl_seconds=600)
+
+    manager.get()
+
+    assert manager.stats()["expires_in_seconds"] == pytest.approx(600, abs=1)
+
+def test_refresh_is_scheduled_the_margin_before_expiry():
+    auth = AuthEndpoint(ttl=3600)
+    manager = TokenManager(auth, cache_path=None, refresh_margin_seconds=120)
+
+    manager.get()
+
+    token, expires_at, refresh_at = manager._current
+    assert token_expiry(token) == expires_at
+    assert expires_at - refresh_at == pytest.approx(120, abs=0.1)
+
+def test_background_refresh_replaces_the_token_before_it_expires():
+    auth = AuthEndpoint(ttl=2)
+    manager = TokenManager(auth, cache_path=None, refresh_margin_seconds=1).start()
+    try:
+        deadline = time.time() + 5
+        while len(auth.calls) < 2 and time.time() < deadline:
+            if manager.token:
+                assert manager.current() is not None  # Never seen expired
+            time.sleep(0.02)
+    finally:
+        manager.stop(timeout=1)
+
+    assert len(auth.calls) >= 2
+    assert auth.calls[1] < auth.calls[0] + auth.ttl
+    assert manager.stats()["round_trips"]["startup"] == 1
+    assert manager.stats()["round_trips"]["proactive"] >= 1
+
+def test_concurrent_401s_cost_one_round_trip():
+    auth = AuthEndpoint(delay=0.1)
+    manager = TokenManager(auth, cache_path=None)
+    stale = manager.get()
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(manager.refresh(stale))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(auth.calls) == 2
+    assert len(set(results)) == 1 and results[0] != stale
+    assert manager.stats()["round_trips"] == {"missing": 1, "unauthorized": 1}
+
+def test_failed_authentication_backs_off():
+    auth = AuthEndpoint()
+    auth.up = False
+    manager = TokenManager(auth, cache_path=None, retry_seconds=60)
+
+    assert manager.get() is None
+    assert manager.get() is None
+    assert len(auth.calls) == 1
+    assert manager.stats()["failures"] == 1
+
+def test_token_is_cached_with_mode_0600(cache_path):
+    manager = TokenManager(AuthEndpoint(), cache_path=cache_path, cache_key="http://auth|device-user")
+
+    token = manager.get()
+
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    with open(cache_path, encoding="utf-8") as f:
+        cached = json.load(f)
+    assert cached == {"key": "http://auth|device-user", "token": token, "expires_at": token_expiry(token)}
+    assert not os.path.exists(f"{cache_path}.tmp")
+
+def test_leftover_temp_file_is_tightened_to_0600(cache_path):
+    with open(f"{cache_path}.tmp", "w", encoding="utf-8") as f:
+        f.write("partial")
+    os.chmod(f"{cache_path}.tmp", 0o644)
+
+    TokenManager(AuthEndpoint(), cache_path=cache_path).get()
+
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+
+def test_restart_reuses_a_valid_cached_token(cache_path):
+    token = TokenManager(AuthEndpoint(), cache_path=cache_path, cache_key="key").get()
+    auth = AuthEndpoint()
+
+    manager = TokenManager(auth, cache_path=cache_path, cache_key="key").start()
+    try:
+        assert manager.get() == token
+        assert auth.calls == []
+        assert manager.stats()["cache_hits"] == 1
+    finally:
+        manager.stop(timeout=1)
+
+@pytest.mark.parametrize("cache_key, ttl", [("other-key", 3600), ("key", -10)])
+def test_cached_token_for_another_account_or_already_expired_is_ignored(cache_path, cache_key, ttl):
+    TokenManager(AuthEndpoint(ttl=ttl), cache_path=cache_path, cache_key="key").get()
+    auth = AuthEndpoint()
+    manager = TokenManager(auth, cache_path=cache_path, cache_key=cache_key)
+
+    assert not manager._load_cache()
+    assert manager.get() is not None
+    assert len(auth.calls) == 1
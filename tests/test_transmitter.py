@@ -0,0 +1,72 @@
+"""
+test_transmitter.py
+Checks batch mode against the mock backend: buffered records go out as one bulk upload and
+are never picked up by the backlog drainer while they wait.
+"""
+import pytest
+
+from benchmarks.mock_backend import MockBackend
+from src.data_processing.data_converter import convert_to_backend_format
+from src.data_transmission.transmitter import Transmitter
+
+PATIENT_ID = "patient-1"
+
+@pytest.fixture
+def backend():
+    backend = MockBackend().start()
+    yield backend
+    backend.stop()
+
+@pytest.fixture
+def transmitter(backend, db_manager):
+    transmitter = Transmitter(backend_url=backend.url, auth_endpoint=f"{backend.url}/authenticate",
+                              db_manager=db_manager, token_cache_path=None)
+    yield transmitter
+    transmitter.close()
+
+def queue_readings(transmitter, db_manager, count):
+    """Store count readings and queue each for the next batch; returns their record IDs."""
+    record_ids = []
+    for index in range(count):
+        reading = {"timestamp": f"2026-01-01T00:00:{index:02d}Z", "heart_rate": 70 + index}
+        record_id = db_manager.save_data("device-1", PATIENT_ID, reading)
+        transmitter.queue_for_batch(convert_to_backend_format(reading, "device-1", PATIENT_ID, record_id),
+                                    PATIENT_ID, record_id)
+        record_ids.append(record_id)
+    return record_ids
+
+def statuses(db_manager, record_ids):
+    placeholders = ", ".join("?" * len(record_ids))
+    return {row[0] for row in db_manager.conn.execute(
+        f"SELECT transmit_status FROM sensor_data WHERE id IN ({placeholders})", record_ids
+    )}
+
+def test_buffered_records_go_out_as_one_batch(backend, transmitter, db_manager):
+    record_ids = queue_readings(transmitter, db_manager, 10)
+
+    # The drain that follows every tick must leave the buffered records to the batch
+    assert transmitter.retry_unsent_data() == 0
+    assert statuses(db_manager, record_ids) == {"in_flight"}
+    assert transmitter.flush_batch() == 10
+
+    counters = backend.snapshot()
+    assert counters["batch_requests"] == 1
+    assert counters["requests"] == 1
+    assert counters["records"] == 10
+    assert statuses(db_manager, record_ids) == {"sent"}
+
+def test_close_flushes_the_batch_buffer(backend, transmitter, db_manager):
+    record_ids = queue_readings(transmitter, db_manager, 3)
+
+    transmitter.close()
+
+    assert backend.snapshot()["batch_requests"] == 1
+    assert statuses(db_manager, record_ids) == {"sent"}
+
+def test_failed_batch_is_released_to_the_backlog(backend, transmitter, db_manager):
+    record_ids = queue_readings(transmitter, db_manager, 3)
+    backend.failure_rate = 1.0
+
+    assert transmitter.flush_batch() == 0
+
+    assert statuses(db_manager, record_ids) == {"unsent"}
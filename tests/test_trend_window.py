@@ -0,0 +1,119 @@
+"""
+test_trend_window.py
+Checks the sliding trend windows' running aggregates against a brute-force pass over the
+samples that should still be in the window.
+"""
+import math
+import random
+
+import pytest
+
+from src.data_collection.reading import Reading
+from src.data_collection.reading_batch import ReadingBatch
+from src.data_processing.trend_window import MetricWindow, TrendWindow
+
+PATIENT_ID = "patient-1"
+START_MS = 1_767_225_600_000
+WINDOW_MINUTES = 5
+WINDOW_MS = WINDOW_MINUTES * 60 * 1000
+
+def expected_window(samples, now_ms, max_samples):
+    """Samples the window should hold: the last max_samples pushed, minus the expired ones."""
+    return [(ts, value) for ts, value in samples[-max_samples:] if ts >= now_ms - WINDOW_MS]
+
+def assert_matches(window, expected):
+    assert len(window) == len(expected)
+    ts_column, value_column = window.columns()
+    assert list(ts_column) == [ts for ts, _ in expected]
+    assert list(value_column) == [value for _, value in expected]
+    if not expected:
+        assert window.mean() is None
+        return
+    values = [value for _, value in expected]
+    mean = sum(values) / len(values)
+    assert window.mean() == pytest.approx(mean)
+    assert window.variance() == pytest.approx(sum((v - mean) ** 2 for v in values) / len(values), abs=1e-6)
+    rising = len(values) >= 3 and all(b > a for a, b in zip(values, values[1:]))
+    assert window.is_increasing() == rising
+
+@pytest.mark.parametrize("max_samples", [4096, 64])
+def test_window_matches_brute_force_over_irregular_samples(max_samples):
+    rng = random.Random(7)
+    window = MetricWindow(WINDOW_MS, max_samples)
+    samples = []
+    ts = START_MS
+    for _ in range(3000):
+        # Mostly 1 Hz with the occasional gap longer than the window
+        ts += rng.choice([1000] * 50 + [400_000])
+        value = 70 + rng.gauss(0, 5)
+        window.push(ts, value)
+        samples.append((ts, value))
+        if len(samples) % 97 == 0:
+            assert_matches(window, expected_window(samples, ts, max_samples))
+    assert_matches(window, expected_window(samples, ts, max_samples))
+
+def test_ring_wraps_at_max_samples():
+    window = MetricWindow(WINDOW_MS, max_samples=8)
+
+    for i in range(20):
+        window.push(START_MS + i * 1000, float(i))
+
+    assert list(window.columns()[1]) == [float(i) for i in range(12, 20)]
+    assert window.mean() == pytest.approx(15.5)
+    assert window.is_increasing()
+
+def test_eviction_follows_the_clock():
+    window = MetricWindow(WINDOW_MS, 4096)
+    for i in range(10):
+        window.push(START_MS + i * 60_000, 80.0 + i)
+
+    window.evict(START_MS + 9 * 60_000 + 30_000)
+
+    assert list(window.columns()[1]) == [85.0, 86.0, 87.0, 88.0, 89.0]
+    window.evict(START_MS + 60 * 60_000)
+    assert len(window) == 0 and window.mean() is None
+
+def test_push_batch_skips_missing_samples():
+    trend = TrendWindow(WINDOW_MINUTES, clock=lambda: START_MS + 10_000)
+    readings = [Reading(ts=START_MS + i * 1000, heart_rate=None if i % 3 == 0 else 70.0 + i, temperature=36.6)
+                for i in range(10)]
+
+    trend.push_batch(PATIENT_ID, ReadingBatch(readings))
+
+    heart_rates = trend.metric(PATIENT_ID, "heart_rate")
+    expected = [70.0 + i for i in range(10) if i % 3]
+    assert list(heart_rates.columns()[1]) == expected
+    assert heart_rates.mean() == pytest.approx(sum(expected) / len(expected))
+    assert not any(math.isnan(value) for value in heart_rates.columns()[1])
+    assert len(trend.metric(PATIENT_ID, "temperature")) == 10
+    assert len(trend.metric(PATIENT_ID, "oxygen_level")) == 0
+
+def test_push_batch_matches_pushing_readings_one_by_one():
+    now_ms = START_MS + 600_000
+    readings = [Reading(ts=START_MS + i * 1000, heart_rate=60.0 + (i % 17), oxygen_level=97.0)
+                for i in range(600)]
+    batched = TrendWindow(WINDOW_MINUTES, max_samples=256, clock=lambda: now_ms)
+    single = TrendWindow(WINDOW_MINUTES, max_samples=256, clock=lambda: now_ms)
+
+    batched.push_batch(PATIENT_ID, ReadingBatch(readings))
+    for reading in readings:
+        single.push(PATIENT_ID, reading, reading.ts)
+
+    for metric in ("heart_rate", "temperature", "oxygen_level"):
+        assert batched.metric(PATIENT_ID, metric).columns() == single.metric(PATIENT_ID, metric).columns()
+    assert batched.analyze(PATIENT_ID) == single.analyze(PATIENT_ID)
+
+def test_rebuild_from_db_loads_only_the_window(db_manager):
+    now_ms = START_MS + 20 * 60_000
+    readings = [Reading(ts=START_MS + i * 30_000, heart_rate=70.0 + i, temperature=36.5) for i in range(40)]
+    db_manager.save_batch("device-1", PATIENT_ID, ReadingBatch(readings))
+    trend = TrendWindow(WINDOW_MINUTES, clock=lambda: now_ms)
+
+    loaded = trend.rebuild_from_db(db_manager)
+
+    in_window = [r for r in readings if r.ts >= now_ms - WINDOW_MS]
+    assert loaded == len(in_window)
+    heart_rates = trend.metric(PATIENT_ID, "heart_rate")
+    assert list(heart_rates.columns()[1]) == [r.get("heart_rate") for r in in_window]
+    assert heart_rates.mean() == pytest.approx(sum(r.get("heart_rate") for r in in_window) / len(in_window))
+    assert trend.analyze(PATIENT_ID) == "Rising trend in heart rate detected - potential concern."
@@ -0,0 +1,59 @@
+"""
+test_vector_analytics.py
+Checks the NumPy window builders and the rolling z-score detector against plain reference values.
+"""
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.data_processing.trend_window import TrendWindow  # noqa: E402
+from src.data_processing.vector_analytics import (  # noqa: E402
+    VectorAnalyzer, columns_from_db, rolling_zscores
+)
+from src.utils.config import ZSCORE_WINDOW_SAMPLES  # noqa: E402
+
+def brute_force_zscore(values, index, window):
+    previous = values[index - window:index]
+    std = previous.std()
+    return 0.0 if std <= 1e-9 else (values[index] - previous.mean()) / std
+
+def test_rolling_zscores_match_each_trailing_window():
+    values = np.random.default_rng(7).normal(70.0, 3.0, 50)
+
+    scores = rolling_zscores(values, 10)
+
+    assert len(scores) == 40
+    assert scores == pytest.approx([brute_force_zscore(values, index, 10) for index in range(10, 50)])
+    assert rolling_zscores(values, 10, start=45) == pytest.approx(scores[-5:])
+    assert len(rolling_zscores(values[:10], 10)) == 0
+    assert list(rolling_zscores(np.full(12, 70.0), 10)) == [0.0, 0.0]
+
+def test_spike_between_runs_is_still_scored():
+    trend_window = TrendWindow(clock=lambda: 1_000_000)
+    analyzer = VectorAnalyzer(interval_seconds=0)
+    noise = np.random.default_rng(3).normal(0.0, 1.0, 2 * ZSCORE_WINDOW_SAMPLES)
+    ts = 1_000_000 - 120_000
+    for offset in noise[:ZSCORE_WINDOW_SAMPLES + 5]:
+        trend_window.push("patient-1", {"heart_rate": 70.0 + offset}, ts)
+        ts += 1000
+    assert "zscore:heart_rate" not in analyzer.run_if_due(trend_window, "patient-1")
+
+    # The spike is followed by normal readings, so it is not the newest sample at the next run
+    for index, offset in enumerate(noise[ZSCORE_WINDOW_SAMPLES + 5:ZSCORE_WINDOW_SAMPLES + 15]):
+        trend_window.push("patient-1", {"heart_rate": 120.0 if index == 3 else 70.0 + offset}, ts)
+        ts += 1000
+    detected = analyzer.run_if_due(trend_window, "patient-1")
+
+    assert "zscore:heart_rate" in detected
+
+def test_columns_from_db_keeps_missing_metrics_as_nan(db_manager):
+    db_manager.save_data("device-1", "patient-1", {"timestamp": "2026-01-01T00:00:00Z", "heart_rate": 72})
+    db_manager.save_data("device-1", "patient-1", {"timestamp": "2026-01-01T00:00:01Z", "oxygen_level": 97})
+
+    window = columns_from_db(db_manager, 0, "patient-1")
+
+    assert list(window["ts"]) == [1767225600000.0, 1767225601000.0]
+    assert window["heart_rate"][0] == 72.0 and math.isnan(window["heart_rate"][1])
+    assert math.isnan(window["oxygen_level"][0]) and window["oxygen_level"][1] == 97.0
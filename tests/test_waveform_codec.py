@@ -0,0 +1,46 @@
+"""
+test_waveform_codec.py
+Round-trips waveform samples through the delta-zlib codec and the waveform_chunks table.
+"""
+import math
+
+import pytest
+
+from src.data_collection.waveform import WaveformBlock
+from src.data_processing.waveform_codec import decode_samples, encode_samples
+
+START_MS = 1_767_225_600_000
+
+def test_round_trip_keeps_samples_within_half_a_resolution_step():
+    samples = [math.sin(i / 10) * 1.5 for i in range(500)]
+
+    decoded = decode_samples(encode_samples(samples, 0.005), 0.005)
+
+    assert len(decoded) == len(samples)
+    assert max(abs(a - b) for a, b in zip(decoded, samples)) <= 0.0025 + 1e-12
+
+def test_negative_values_and_deltas_round_trip_exactly():
+    samples = [0, -3, -10, 7, -2**40, 2**40, 5]
+
+    assert list(decode_samples(encode_samples(samples, 1), 1)) == samples
+
+def test_empty_block_round_trips():
+    assert list(decode_samples(encode_samples([], 0.01), 0.01)) == []
+
+def test_single_sample_round_trips():
+    assert list(decode_samples(encode_samples([-4.25], 0.25), 0.25)) == [-4.25]
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        decode_samples(encode_samples([1, 2], 1), 1, encoding="raw")
+
+def test_saved_waveform_reads_back(db_manager):
+    samples = [round(math.sin(i / 7) * 200) / 100 for i in range(2000)]
+    block = WaveformBlock("ecg", START_MS, 250, samples, resolution=0.01)
+
+    chunks = db_manager.save_waveform("device-1", "patient-1", block)
+    blocks = db_manager.fetch_waveform("patient-1", "ecg", START_MS, block.end_ts)
+
+    assert chunks >= 1
+    assert [b.start_ts for b in blocks] == [START_MS]
+    assert list(blocks[0].samples) == pytest.approx(samples, abs=0.005)